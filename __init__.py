@@ -3,7 +3,11 @@ from flask_login import LoginManager
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
+import logging
+import sqlite3
 import os
 
 # Load environment variables from .env file
@@ -33,6 +37,35 @@ app.config['SECRET_KEY'] = SECRET_KEY
 app.config['SESSION_COOKIE_NAME'] = SESSION_COOKIE_NAME 
 app.config['JWT_TOKEN_NAME'] = JWT_TOKEN_NAME 
 
+# Startup settings
+app.config['LAZY_BLUEPRINTS'] = (os.environ.get('LAZY_BLUEPRINTS') or '0') == '1'  # import APIs on first request
+
+# Instrumentation settings
+app.config['METRICS_ENABLED'] = (os.environ.get('METRICS_ENABLED') or '1') == '1'  # request metrics and Server-Timing
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None  # bearer token for /metrics, which is off without one
+app.config['SERVER_TIMING_HEADER'] = (os.environ.get('SERVER_TIMING_HEADER') or '1') == '1'
+app.config['QUERY_COUNT_THRESHOLD'] = int(os.environ.get('QUERY_COUNT_THRESHOLD') or 20)  # log requests over this, 0 disables
+
+# JSON settings, see api/json_provider.py
+app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND') or 'auto'  # auto (orjson when installed), orjson or stdlib
+
+# HTTP caching settings, see api/http_cache.py
+app.config['HTTP_ETAGS'] = (os.environ.get('HTTP_ETAGS') or '1') == '1'  # weak ETags and 304s on GET
+app.config['HTTP_COMPRESSION'] = (os.environ.get('HTTP_COMPRESSION') or '1') == '1'  # brotli or gzip
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES') or 1024)  # smaller bodies are sent as they are
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL') or 6)  # gzip, 1 to 9
+app.config['BROTLI_QUALITY'] = int(os.environ.get('BROTLI_QUALITY') or 5)  # brotli, 0 to 11
+app.config['PUBLIC_CACHE_SECONDS'] = int(os.environ.get('PUBLIC_CACHE_SECONDS') or 30)  # max-age of GET listings that are the same for everyone
+
+# Shared cache settings, see model/cache.py
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND') or 'sqlite'  # 'sqlite' (one host), 'redis' or 'none'
+app.config['CACHE_PATH'] = os.environ.get('CACHE_PATH') or os.path.join(app.instance_path, 'cache.db')  # 'sqlite' backend
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES') or 10000)  # 'sqlite' backend, least recently used beyond are evicted
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES') or 64 * 1024 * 1024)  # 'sqlite' backend, likewise
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL') or 300)  # seconds, bounds staleness if an invalidation is missed
+app.config['REDIS_URL'] = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'  # 'redis' backend
+app.config['CACHE_PREFIX'] = os.environ.get('CACHE_PREFIX') or 'flocker:'  # 'redis' backend, keys are <prefix><key>
+
 # Database settings 
 dbName = 'user_management'
 DB_ENDPOINT = os.environ.get('DB_ENDPOINT') or None
@@ -57,18 +90,65 @@ app.config['DB_USERNAME'] = DB_USERNAME
 app.config['DB_PASSWORD'] = DB_PASSWORD
 app.config['SQLALCHEMY_DATABASE_NAME'] = dbName
 app.config['SQLALCHEMY_DATABASE_STRING'] = dbString
-app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI') or dbURI  # override for benchmarks and scratch databases
 app.config['SQLALCHEMY_BACKUP_URI'] = backupURI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_RAISELOAD'] = (os.environ.get('SQLALCHEMY_RAISELOAD') or '0') == '1'  # listings raise on lazy loads, for development
+# Connection pool settings, sized by gunicorn_config.py for threaded and gevent workers
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+if DB_ENDPOINT and DB_USERNAME and DB_PASSWORD:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_POOL_SIZE,
+        'pool_pre_ping': True,  # drop connections closed by RDS while idle
+        'pool_recycle': 1800,
+    }
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_POOL_SIZE,
+        'connect_args': {'check_same_thread': False, 'timeout': 15},  # wait on locks instead of failing
+    }
 db = SQLAlchemy(app)
+# Registered in every mode, `flask db` needs it in the production image too
 migrate = Migrate(app, db)
 
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """Use write-ahead logging so concurrent readers do not block on a writer in threaded workers."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 # Image upload settings 
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # maximum size of uploaded content
-app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif']  # supported file types
+app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif', '.webp']  # supported file types, checked against the content
 app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
+app.config['BLOB_FOLDER'] = os.environ.get('BLOB_FOLDER') or os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')  # content-addressed images
+app.config['IMAGE_MAX_DIMENSION'] = int(os.environ.get('IMAGE_MAX_DIMENSION') or 1024)  # uploads are shrunk to fit, pixels
+app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS') or 40_000_000)  # larger uploads are refused, decompression bomb guard
+app.config['IMAGE_MAX_BYTES'] = int(os.environ.get('IMAGE_MAX_BYTES') or 300 * 1024)  # stored images are re-encoded smaller until they fit
+app.config['IMAGE_FORMAT'] = os.environ.get('IMAGE_FORMAT') or 'auto'  # 'auto' (PNG with transparency, else JPEG), 'webp', 'png' or 'jpeg'
+app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY') or 85)  # JPEG and WebP
+app.config['IMAGE_POOL_SIZE'] = int(os.environ.get('IMAGE_POOL_SIZE') or 2)  # image processes per worker, 0 to process in the caller
+app.config['IMAGE_TIMEOUT_SECONDS'] = float(os.environ.get('IMAGE_TIMEOUT_SECONDS') or 20)
+app.config['AVATAR_THUMBNAIL_SIZE'] = int(os.environ.get('AVATAR_THUMBNAIL_SIZE') or 64)  # inline avatar thumbnails, pixels
+app.config['AVATAR_CACHE_ENTRIES'] = int(os.environ.get('AVATAR_CACHE_ENTRIES') or 2000)  # thumbnails kept in memory per worker
+app.config['BLOB_GC_GRACE_SECONDS'] = int(os.environ.get('BLOB_GC_GRACE_SECONDS') or 3600)  # unreferenced blobs kept this long
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Upload storage settings, see model/storage.py
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND') or 'filesystem'  # 'filesystem' or 's3'
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET') or None
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX') or ''  # e.g. 'flocker/', keys are <prefix><namespace>/<key>
+app.config['S3_REGION'] = os.environ.get('S3_REGION') or 'us-east-2'
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL') or None  # MinIO or moto, None for AWS
+app.config['S3_PRESIGN_SECONDS'] = int(os.environ.get('S3_PRESIGN_SECONDS') or 3600)  # lifetime of redirect URLs
+app.config['S3_MAX_POOL_CONNECTIONS'] = int(os.environ.get('S3_MAX_POOL_CONNECTIONS') or 10)  # per process
+app.config['S3_MULTIPART_THRESHOLD'] = int(os.environ.get('S3_MULTIPART_THRESHOLD') or 8 * 1024 * 1024)  # bytes, also the part size
+
 # GITHUB settings
 app.config['GITHUB_API_URL'] = 'https://api.github.com'
 app.config['GITHUB_TOKEN'] = os.environ.get('GITHUB_TOKEN') or None
@@ -80,5 +160,37 @@ app.config['KASM_SERVER'] = os.environ.get('KASM_SERVER') or 'https://kasm.night
 app.config['KASM_API_KEY'] = os.environ.get('KASM_API_KEY') or None
 app.config['KASM_API_KEY_SECRET'] = os.environ.get('KASM_API_KEY_SECRET') or None
 
+# Trivia settings
+app.config['TRIVIA_API_KEY'] = os.environ.get('TRIVIA_API_KEY') or None  # api-ninjas key, only from the environment
+app.config['TRIVIA_PROVIDER'] = os.environ.get('TRIVIA_PROVIDER') or 'api-ninjas'  # 'api-ninjas', or 'stub' for tests and offline development
+app.config['TRIVIA_API_URL'] = os.environ.get('TRIVIA_API_URL') or 'https://api.api-ninjas.com/v1/trivia?category={}'
+app.config['TRIVIA_CONNECT_TIMEOUT'] = float(os.environ.get('TRIVIA_CONNECT_TIMEOUT') or 2)  # seconds
+app.config['TRIVIA_READ_TIMEOUT'] = float(os.environ.get('TRIVIA_READ_TIMEOUT') or 3)  # seconds
+app.config['TRIVIA_PREFETCH_SIZE'] = int(os.environ.get('TRIVIA_PREFETCH_SIZE') or 5)  # questions buffered per topic
+app.config['TRIVIA_REFILL_INTERVAL'] = float(os.environ.get('TRIVIA_REFILL_INTERVAL') or 30)  # seconds between refills
+app.config['TRIVIA_MAX_TOPICS'] = int(os.environ.get('TRIVIA_MAX_TOPICS') or 32)  # topics kept warm
+if app.config['TRIVIA_PROVIDER'] == 'api-ninjas' and not app.config['TRIVIA_API_KEY']:
+    logging.warning("TRIVIA_API_KEY is not set, /api/trivia will answer 503")
+
+# Search settings
+app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND') or 'auto'  # 'auto', 'fts5', 'mysql', 'inverted' or 'none'
+app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get('SEARCH_PAGE_SIZE') or 20)  # results per page, at most 50
+app.config['SEARCH_INDEX_PATH'] = os.environ.get('SEARCH_INDEX_PATH') or os.path.join(app.instance_path, 'search_index.bin')  # 'inverted' backend
+
+# Leaderboard settings
+app.config['LEADERBOARD_MAX_POINTS'] = int(os.environ.get('LEADERBOARD_MAX_POINTS') or 10000)  # scores above share one rank bucket
+app.config['RIDDLE_FLUSH_SECONDS'] = float(os.environ.get('RIDDLE_FLUSH_SECONDS') or 2)  # answers are scored in batches this often
+app.config['LEADERBOARD_REFRESH_SECONDS'] = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS') or 5)  # reload ranks from other workers
 
+# Scheduler settings
+app.config['SCHEDULER_ENABLED'] = (os.environ.get('SCHEDULER_ENABLED') or '1') == '1'  # periodic jobs, e.g. riddle of the day
+app.config['SCHEDULER_TICK_SECONDS'] = float(os.environ.get('SCHEDULER_TICK_SECONDS') or 15)  # leader lease lasts 3 ticks
 
+# Job queue settings
+app.config['JOB_QUEUE_MODE'] = os.environ.get('JOB_QUEUE_MODE') or 'thread'  # 'thread', 'worker' (flask custom jobs_worker) or 'inline'
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)  # runs before a job fails
+app.config['JOB_RETRY_SECONDS'] = float(os.environ.get('JOB_RETRY_SECONDS') or 2)  # first retry delay, doubles each attempt
+app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS') or 1)  # idle workers check for due jobs this often
+app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS') or 300)  # running jobs not renewed for this long are retried
+app.config['BULK_USERS_MAX'] = int(os.environ.get('BULK_USERS_MAX') or 200)  # users per POST /api/users, a password hash each
+app.config['JOB_RETENTION_HOURS'] = float(os.environ.get('JOB_RETENTION_HOURS') or 24)  # finished jobs are deleted after
@@ -1,8 +1,13 @@
 from flask import Blueprint, g, request
 from flask_restful import Api, Resource
 from api.jwt_authorize import token_required
-from model.user import User
-from model.carPhoto import car_base64_decode, car_base64_upload, car_file_delete, default_car_decode
+from model.user import User, stage_upload
+from model.carPhoto import car_base64_decode, car_file_delete, default_car_decode
+from model.blobstore import blob_url, is_blob_ref
+from model.assets import get_asset
+from model.jobs import enqueue
+from model.imaging import ImageError, check_base64_format
+from api.jobs import accepted, idempotency_key
 
 car_api = Blueprint('car_photo_api', __name__, url_prefix='/api/id')
 api = Api(car_api)
@@ -24,21 +29,24 @@ class _CarPhoto(Resource):
     Returns:
     - A JSON object containing the base64 encoded string of the Car picture under the key 'car' if the operation is successful.
     - HTTP status code 200 if the Car picture is successfully retrieved.
-    - HTTP status code 404 if the Car picture is not set for the current user.
+    - HTTP status code 200 with the default picture, its /assets/ url and 'default': True if the Car picture is not set.
     - HTTP status code 500 if an error occurs while reading the Car picture from the server.
     """
     @token_required()
     def get(self):
         current_user = g.current_user
         if not current_user.car or current_user.car == "":
-            return {"message": "Car picture is not set.",
-                    "car": default_car_decode()}, 404
+            # Not an error, the client shows the default picture, preferably from its cacheable url
+            return {"message": "Car picture is not set.", "car": default_car_decode(),
+                    "url": get_asset('car').url, "default": True}, 200
         
         base64_encode = car_base64_decode(current_user.uid, current_user.car)
 
         if not base64_encode:
             return {'message': 'An error occurred while reading the car picture.'}, 500
         
+        if is_blob_ref(current_user.car):
+            return {'car': base64_encode, 'url': blob_url(current_user.car)}, 200
         return {'car': base64_encode}, 200
 
     @token_required()
@@ -97,8 +105,9 @@ class _CarPhoto(Resource):
         Updates the user's Car picture with a new image provided as base64 encoded data.
 
         This endpoint allows users to update their Car picture by sending a PUT request with base64 encoded image data.
-        The image is decoded and saved to a secure location on the server, and the user's profile information is updated
-        to reference the new image file.
+        The image is decoded and saved to a secure location on the server by a background job, which then updates the
+        user's profile information to reference the new image file.  Poll GET /api/jobs/<id> for the outcome.  An
+        Idempotency-Key header makes a retried request return the job of the first one.
 
         The function requires a valid authentication token and expects the base64 image data to be included in the request's JSON body
         under the key 'car'. If the image data is not provided, or if any error occurs during the upload process or while updating
@@ -106,28 +115,24 @@ class _CarPhoto(Resource):
 
         Returns:
         - A JSON object with a message indicating the success or failure of the operation.
-        - HTTP status code 200 if the Car picture was updated successfully.
+        - HTTP status code 202 with the job if the update was queued, with a Location header to its status.
         - HTTP status code 400 if the base64 image data is missing from the request.
-        - HTTP status code 500 if an error occurs during the upload process or while updating the database.
+        - HTTP status code 415 if the data is not one of the image types in UPLOAD_EXTENSIONS.
         """
         current_user = g.current_user
 
         # Obtain the base64 image data from the request
         if 'car' not in request.json:
             return {'message': 'Base64 image data required.'}, 400
-        base64_image = request.json['car']
-       
-        # Make an image file from the base64 data 
-        filename = car_base64_upload(base64_image, current_user.uid)
-        if not filename:
-            return {'message': 'An error occurred while uploading the Car picture'}, 500
-        
-        # Update the user's Car picture to the uploaded file
         try:
-            # write the filename reference to the database
-            current_user.update({"car": filename})
-            return {'message': 'Car picture updated successfully'}, 200
-        except Exception as e:
-            return {'message': f'A database error occurred while assigning Car picture: {str(e)}'}, 500
+            check_base64_format(request.json['car'])
+            upload = stage_upload(request.json['car'])
+        except ImageError as e:
+            return {'message': str(e)}, 415
+
+        # Re-encoding the image happens in a background job, queued with the stored upload's hash
+        job = enqueue('user.save_car', {'user_id': current_user.id, 'upload': upload},
+                      idempotency_key=idempotency_key(f'car:{current_user.id}'), user_id=current_user.id)
+        return accepted(job, 'Car picture update queued')
         
 api.add_resource(_CarPhoto, '/car')
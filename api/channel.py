@@ -7,6 +7,9 @@ from api.jwt_authorize import token_required
 from model.channel import Channel
 from model.group import Group
 from model.user import User
+from model.readers import read_channels
+from api.streaming import stream_json
+from api.http_cache import cache_control
 
 """
 This Blueprint object is used to define APIs for the Channel model.
@@ -140,19 +143,22 @@ class ChannelAPI:
             # Return the results of the bulk creation process
             return jsonify(results)
         
+        @cache_control(public=True)
         def get(self):
             """
-            Retrieve all channels.
-            """
-            # Find all the channels
-            channels = Channel.query.all()
-            # Prepare a JSON list of all the channels, using list comprehension
-            json_ready = []
-            for channel in channels:
-                channel_data = channel.read()
-                json_ready.append(channel_data)
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            Retrieve all channels, or with ?group_name= the channels of a group, the cacheable form of
+            POST /channels/filter.  Cacheable for PUBLIC_CACHE_SECONDS.
+            """
+            group_name = request.args.get('group_name')
+            if group_name is not None:
+                group = Group.query.filter_by(_name=group_name).first()
+                if group is None:
+                    return {'message': 'Group not found'}, 404
+                return stream_json(read_channels(Channel._group_id == group.id))
+            # Read the channel columns, without loading Channel objects
+            channels = read_channels()
+            # Return a JSON list, encoded as the rows are read
+            return stream_json(channels)
 
     class _BULK_FILTER(Resource):
         @token_required()
@@ -173,11 +179,22 @@ class ChannelAPI:
                 return {'message': 'Group not found'}, 404
             
             # Find all channels under the group
-            channels = Channel.query.filter_by(_group_id=group.id).all()
-            # Prepare a JSON list of all the channels, using list comprehension
-            json_ready = [channel.read() for channel in channels]
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            channels = read_channels(Channel._group_id == group.id)
+            # Return a JSON list, encoded as the rows are read
+            return stream_json(channels)
+
+    class _ITEM(Resource):
+        @token_required()
+        @cache_control()
+        def get(self, channel_id):
+            """
+            Retrieve a single channel by ID from the path, the cacheable form of GET /channel with a JSON body.
+            The browser revalidates it with its ETag.
+            """
+            channel = Channel.query.get(channel_id)
+            if channel is None:
+                return {'message': 'Channel not found'}, 404
+            return jsonify(channel.read())
 
     class _FILTER(Resource):
         @token_required()
@@ -210,14 +227,16 @@ class ChannelAPI:
             return jsonify(json_ready)
 
     """
-    Map the _CRUD, _BULK_CRUD, _BULK_FILTER, and _FILTER classes to the API endpoints for /channel, /channels, /channels/filter, and /channel/filter.
+    Map the _CRUD, _ITEM, _BULK_CRUD, _BULK_FILTER, and _FILTER classes to the API endpoints for /channel, /channel/<id>, /channels, /channels/filter, and /channel/filter.
     - The API resource class inherits from flask_restful.Resource.
     - The _CRUD class defines the HTTP methods for the API.
+    - The _ITEM class defines the endpoint for reading a channel by ID in the path.
     - The _BULK_CRUD class defines the bulk operations for the API.
     - The _BULK_FILTER class defines the endpoints for filtering channels by group name.
     - The _FILTER class defines the endpoints for filtering a specific channel by group name and channel name.
     """
     api.add_resource(_CRUD, '/channel')
+    api.add_resource(_ITEM, '/channel/<int:channel_id>')
     api.add_resource(_BULK_CRUD, '/channels')
     api.add_resource(_BULK_FILTER, '/channels/filter')
     api.add_resource(_FILTER, '/channel/filter')
\ No newline at end of file
@@ -1,12 +1,16 @@
 import jwt
 from flask import Blueprint, request, jsonify, current_app, Response, g
 from flask_restful import Api, Resource  # used for REST API building
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 from __init__ import app
 from api.jwt_authorize import token_required
 from model.group import Group
 from model.user import User
 from model.section import Section
+from model.loading import listing_options
+from model.readers import read_objects
+from api.streaming import stream_json
 
 """
 This Blueprint object is used to define APIs for the Group model.
@@ -137,15 +141,10 @@ class GroupAPI:
             """
             Retrieve all groups.
             """
-            # Find all the groups
-            groups = Group.query.all()
-            # Prepare a JSON list of all the groups, using list comprehension
-            json_ready = []
-            for group in groups:
-                group_data = group.read()
-                json_ready.append(group_data)
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            # Find all the groups, read from the cursor in chunks with their moderators
+            groups = read_objects(Group.query.options(*listing_options(selectinload(Group.moderators))))
+            # Return a JSON list, encoded as the groups are read
+            return stream_json(groups)
 
     class _MODERATOR(Resource):
         @token_required()
@@ -211,7 +210,8 @@ class GroupAPI:
                 return {'message': 'Section not found'}, 404
             
             # Find all groups under the section
-            groups = Group.query.filter_by(_section_id=section.id).all()
+            groups = Group.query.options(*listing_options(selectinload(Group.moderators))) \
+                .filter_by(_section_id=section.id).all()
             # Prepare a JSON list of all the groups, using list comprehension
             json_ready = [group.read() for group in groups]
             # Return a JSON list, converting Python dictionaries to JSON format
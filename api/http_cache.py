@@ -0,0 +1,169 @@
+import functools
+import hashlib
+import zlib
+from flask import current_app, g, request
+from flask.sessions import SecureCookieSessionInterface
+
+"""
+Response compression and conditional GET for every endpoint, as after_request hooks.
+
+- ETags: a 200 GET response without a validator gets a weak ETag, a hash of its body, and a request whose
+  If-None-Match matches it gets a 304 with no body.  Weak, because the same body is sent under different
+  Content-Encodings.  Streamed responses of @cache_control views are buffered for it, others have none.
+- Compression: text and JSON bodies of at least COMPRESS_MIN_BYTES are sent with brotli when the client
+  accepts it and the brotli package is installed, gzip otherwise.  Streamed responses are compressed as they
+  are sent.
+- Vary: compressed responses vary on Accept-Encoding.  Responses to a request carrying the JWT or session
+  cookie vary on Cookie, and are private unless the endpoint set its own Cache-Control, so a shared cache
+  never hands one user's response to another.
+
+GET views declare how long their answers may be reused with the @cache_control decorator.
+"""
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                      'image/svg+xml')
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, gzip only without it
+    brotli = None
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compressor(encoding):
+    """Returns (compress, flush) functions of a streaming compressor."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=current_app.config['BROTLI_QUALITY'])
+        return compressor.process, compressor.finish
+    # wbits 31 writes a gzip header and trailer
+    compressor = zlib.compressobj(current_app.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def _compress_stream(chunks, compress, flush):
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield flush()
+    finally:
+        # Closes e.g. a stream_with_context generator, which ends its request context
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def _authenticated():
+    return current_app.config['JWT_TOKEN_NAME'] in request.cookies or \
+        current_app.config['SESSION_COOKIE_NAME'] in request.cookies
+
+def _add_etag(response):
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    if response.direct_passthrough or response.get_etag()[0]:
+        return response  # a file, or the endpoint set its own
+    if response.is_streamed:
+        if 'cache_control' not in g:
+            return response  # no body to hash yet
+        # A listing the view declared cacheable is read whole, a validator is worth more to it than streaming
+        response.make_sequence()
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(), weak=True)
+    return response.make_conditional(request)
+
+def _compress(response):
+    if response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    if response.direct_passthrough or not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        # The compressor is made here, the stream runs after this request's app context may be gone
+        response.response = _compress_stream(response.response, *_compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_BYTES']:
+            return response
+        compress, flush = _compressor(encoding)
+        response.set_data(compress(data) + flush())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def cache_control(max_age=None, public=False):
+    """
+    Decorator for GET views, the Cache-Control of their 200 responses.
+
+    Args:
+        max_age (int): Seconds a cache may reuse the response without asking, 0 to revalidate with the ETag
+            every time.  Defaults to PUBLIC_CACHE_SECONDS for public responses, 0 for private ones.
+        public (bool): Shared caches such as nginx may keep it, only for responses that are the same for
+            every user.  Otherwise only the browser may.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            g.cache_control = (max_age, public)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _apply_cache_control(response):
+    max_age, public = g.cache_control
+    if max_age is None:
+        max_age = current_app.config['PUBLIC_CACHE_SECONDS'] if public else 0
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if not max_age:
+        response.cache_control.must_revalidate = True
+
+def _finish_response(response):
+    if 'cache_control' in g and response.status_code == 200 and 'Cache-Control' not in response.headers:
+        _apply_cache_control(response)
+    if _authenticated() and not response.cache_control.public:
+        response.vary.add('Cookie')
+        if 'Cache-Control' not in response.headers:
+            # The browser may keep it, and revalidates with the ETag before using it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+    if current_app.config['HTTP_ETAGS']:
+        response = _add_etag(response)
+    if current_app.config['HTTP_COMPRESSION']:
+        response = _compress(response)
+    return response
+
+class PublicSessionInterface(SecureCookieSessionInterface):
+    """
+    Flask adds Vary: Cookie to any response whose request read the session, and Flask-Login reads it on every
+    request.  A response a view declared public is the same for every user, so it does not vary on Cookie
+    unless the session changed, which sends Set-Cookie anyway.
+    """
+    def save_session(self, app, session, response):
+        super().save_session(app, session, response)
+        if response.cache_control.public and not session.modified:
+            response.vary.discard('cookie')  # lower case, HeaderSet.remove matches it as given
+
+def init_http_cache(app):
+    """
+    Installs the compression and conditional GET hook, and the session interface for public responses.
+
+    Args:
+        app (Flask): The application.
+    """
+    app.after_request(_finish_response)
+    if type(app.session_interface) is SecureCookieSessionInterface:
+        app.session_interface = PublicSessionInterface()
@@ -0,0 +1,224 @@
+import hmac
+import logging
+import threading
+import time
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+"""
+Request instrumentation for every API endpoint.
+- Counts SQL statements and database time per request using SQLAlchemy cursor events.
+- Records per-route latency, query count and database time histograms in this worker.
+- Adds a Server-Timing header so browser dev tools show app and db time per request.  Streamed responses are
+  recorded when their body has been sent and go without it.
+- Logs requests that run more than QUERY_COUNT_THRESHOLD statements, the usual sign of an N+1 loop.
+The histograms are exposed in Prometheus text format at /metrics, only when METRICS_TOKEN is set and only
+to requests carrying it as `Authorization: Bearer <token>`. Each gunicorn worker keeps its own numbers, so
+scrape every worker or sum them in the dashboard.
+"""
+metrics_api = Blueprint('metrics_api', __name__)
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500)  # statements per request
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the shape Prometheus expects.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    """
+    Per (method, route) request metrics for this worker process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, method, route, status, seconds, queries, db_seconds):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = {
+                    'latency': Histogram(LATENCY_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                    'db_seconds': 0.0,
+                    'statuses': {},
+                }
+            metrics['latency'].observe(seconds)
+            metrics['queries'].observe(queries)
+            metrics['db_seconds'] += db_seconds
+            metrics['statuses'][status] = metrics['statuses'].get(status, 0) + 1
+
+    def snapshot(self):
+        """
+        Returns a copy of the metrics, keyed by (method, route).
+        """
+        with self._lock:
+            return {key: {
+                'latency': (list(m['latency'].counts), m['latency'].sum, m['latency'].count),
+                'queries': (list(m['queries'].counts), m['queries'].sum, m['queries'].count),
+                'db_seconds': m['db_seconds'],
+                'statuses': dict(m['statuses']),
+            } for key, m in self._routes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+route_metrics = RouteMetrics()
+
+
+""" SQL statement counting """
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    # Statements run by background threads and CLI commands are not part of a request
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+
+
+""" Request hooks """
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+
+def _record(method, route, path, status, seconds, queries, db_seconds, config):
+    route_metrics.observe(method, route, status, seconds, queries, db_seconds)
+    threshold = config['QUERY_COUNT_THRESHOLD']
+    if threshold and queries > threshold:
+        logging.warning(f"{method} {path} ran {queries} SQL statements "
+                        f"({db_seconds * 1000:.1f} ms), over the threshold of {threshold}")
+
+def _finish_request(response):
+    if 'request_start' not in g:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if route == '/metrics':
+        return response
+    config = current_app.config
+
+    if response.is_streamed:
+        # The body is read after this hook, its statements run then, so record the request when it closes.
+        # Server-Timing is left out, it would have to go out in the headers before the numbers exist.
+        request_g = g._get_current_object()
+        method, path, status = request.method, request.path, response.status_code
+
+        def record_streamed():
+            _record(method, route, path, 500 if request_g.get('stream_failed') else status,
+                    time.perf_counter() - request_g.request_start, request_g.sql_count, request_g.sql_seconds,
+                    config)
+        response.call_on_close(record_streamed)
+        return response
+
+    seconds = time.perf_counter() - g.request_start
+    _record(request.method, route, request.path, response.status_code, seconds, g.sql_count, g.sql_seconds, config)
+    if config['SERVER_TIMING_HEADER']:
+        response.headers.add('Server-Timing',
+                             f'app;dur={seconds * 1000:.1f}, db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries"')
+    return response
+
+def init_instrumentation(app):
+    """
+    Installs the request hooks and the /metrics endpoint on the app.
+
+    Args:
+        app (Flask): The application.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.register_blueprint(metrics_api)
+
+
+""" Prometheus text endpoint """
+
+def _labels(**labels):
+    return ','.join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels.items())
+
+def _histogram_lines(name, labels, buckets, counts, total, count):
+    lines = []
+    for bound, bucket_count in zip(buckets, counts):
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+    return lines
+
+def render_metrics():
+    """
+    Renders the route metrics in Prometheus text exposition format.
+
+    Returns:
+        str: The metrics text.
+    """
+    snapshot = route_metrics.snapshot()
+    lines = [
+        '# HELP flask_request_duration_seconds Request latency by route.',
+        '# TYPE flask_request_duration_seconds histogram',
+    ]
+    for (method, route), m in sorted(snapshot.items()):
+        lines += _histogram_lines('flask_request_duration_seconds', _labels(method=method, route=route),
+                                  LATENCY_BUCKETS, *m['latency'])
+    lines += [
+        '# HELP flask_request_queries SQL statements executed per request by route.',
+        '# TYPE flask_request_queries histogram',
+    ]
+    for (method, route), m in sorted(snapshot.items()):
+        lines += _histogram_lines('flask_request_queries', _labels(method=method, route=route),
+                                  QUERY_BUCKETS, *m['queries'])
+    lines += [
+        '# HELP flask_request_db_seconds_total Time spent in SQL statements by route.',
+        '# TYPE flask_request_db_seconds_total counter',
+    ]
+    for (method, route), m in sorted(snapshot.items()):
+        lines.append(f'flask_request_db_seconds_total{{{_labels(method=method, route=route)}}} {m["db_seconds"]}')
+    lines += [
+        '# HELP flask_requests_total Requests by route and status code.',
+        '# TYPE flask_requests_total counter',
+    ]
+    for (method, route), m in sorted(snapshot.items()):
+        for status, count in sorted(m['statuses'].items()):
+            lines.append(f'flask_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+def _metrics_authorized():
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+
+@metrics_api.route('/metrics')
+def metrics():
+    if not current_app.config['METRICS_TOKEN']:
+        abort(404)  # no token configured, the endpoint is off
+    if not _metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,50 @@
+from flask import Blueprint, request, g
+from flask_restful import Api, Resource  # used for REST API building
+from __init__ import db
+from api.jwt_authorize import token_required
+from model.jobs import Job
+
+"""
+This Blueprint object is used to define the API for background job status.
+Endpoints that hand slow work to model/jobs.py answer 202 with the job and a Location header,
+clients poll GET /api/jobs/<id> until the status is 'done' or 'failed'.
+"""
+jobs_api = Blueprint('jobs_api', __name__, url_prefix='/api')
+
+api = Api(jobs_api)
+
+def idempotency_key(scope):
+    """
+    Reads the optional Idempotency-Key header, scoped so clients cannot collide with each other.
+
+    Args:
+        scope (str): E.g. the endpoint and user, 'pfp:3'.
+
+    Returns:
+        str: The key to pass to enqueue(), or None without the header.
+    """
+    key = request.headers.get('Idempotency-Key')
+    return f"{scope}:{key[:200]}" if key else None
+
+def accepted(job, message):
+    """
+    Returns:
+        tuple: The 202 response for an enqueued job.
+    """
+    return {'message': message, 'job': job.read()}, 202, {'Location': f'/api/jobs/{job.id}'}
+
+class JobsAPI:
+    """
+    Define the status endpoint for background jobs.
+    """
+    class _Status(Resource):
+        @token_required()
+        def get(self, job_id):
+            current_user = g.current_user
+            job = db.session.get(Job, job_id)
+            # Other users' jobs are reported missing rather than forbidden
+            if job is None or (job.user_id != current_user.id and current_user.role != 'Admin'):
+                return {'message': f'Job {job_id} not found'}, 404
+            return job.read()
+
+    api.add_resource(_Status, '/jobs/<int:job_id>')
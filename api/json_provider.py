@@ -0,0 +1,149 @@
+import json
+import re
+import uuid
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from model.readers import RawJSON
+
+"""
+JSON encoding of API responses.
+
+OrjsonProvider encodes with orjson when it is installed and JSON_BACKEND allows it, several times faster than
+the standard library, and falls back to Flask's encoder for anything orjson refuses (integers over 64 bits,
+indented debug output).  Dates, decimals and dataclasses still go through Flask's default(), so responses
+look the same either way.
+
+RawJSON (model/readers.py) wraps text that is already JSON, such as a JSON column read as text, so it goes
+into the response as it is instead of being decoded into Python objects and encoded again.  orjson 3.9+
+writes it natively, older orjson decodes it in C, and the standard library gets a placeholder string that is
+swapped for the text after encoding.
+"""
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, the standard library encoder is used without it
+    orjson = None
+
+
+class _NeedsSplice(TypeError):
+    """Raised from the standard library encoder's default() on a RawJSON."""
+
+
+def _splice_raw(obj, encode):
+    """
+    Encodes obj with RawJSON values swapped for unique placeholder strings, then puts their text back.
+    Works with any encoder that has no way to emit raw text.
+    """
+    raws = []
+    nonce = uuid.uuid4().hex
+
+    def swap(value):
+        if isinstance(value, RawJSON):
+            raws.append(value.text)
+            return f"{nonce}{len(raws) - 1}"
+        if isinstance(value, dict):
+            return {key: swap(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [swap(item) for item in value]
+        return value
+
+    encoded = encode(swap(obj))
+    # One pass over the output, whatever the number of placeholders
+    return re.sub(f'"{nonce}(\\d+)"', lambda match: raws[int(match.group(1))], encoded)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider using orjson when available, installed by init_json().
+    """
+    use_orjson = orjson is not None
+
+    @staticmethod
+    def _orjson_default(obj):
+        if isinstance(obj, RawJSON):
+            if hasattr(orjson, 'Fragment'):
+                return orjson.Fragment(obj.text)  # orjson 3.9+ writes it as it is
+            return orjson.loads(obj.text)
+        return DefaultJSONProvider.default(obj)
+
+    @staticmethod
+    def _stdlib_default(obj):
+        if isinstance(obj, RawJSON):
+            raise _NeedsSplice
+        return DefaultJSONProvider.default(obj)
+
+    def _orjson_options(self, sort_keys):
+        # Flask's default() handles these, keep their output the same as the standard library's
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        return options | orjson.OPT_SORT_KEYS if sort_keys else options
+
+    def dumps_bytes(self, obj, sort_keys=None):
+        """
+        Returns:
+            bytes: obj encoded as compact UTF-8 JSON.
+        """
+        sort_keys = self.sort_keys if sort_keys is None else sort_keys
+        if self.use_orjson:
+            options = self._orjson_options(sort_keys)
+            try:
+                return orjson.dumps(obj, default=self._orjson_default, option=options)
+            except TypeError:
+                pass  # orjson.JSONEncodeError, e.g. an integer over 64 bits, which the standard library can encode
+        return self._stdlib_dumps(obj, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+    def _stdlib_dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', self._stdlib_default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        try:
+            return json.dumps(obj, **kwargs)
+        except _NeedsSplice:
+            return _splice_raw(obj, lambda swapped: json.dumps(swapped, **kwargs))
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() <= {'sort_keys'} and self.use_orjson:
+            return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+        return self._stdlib_dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Indented for reading, the standard library does that
+            return self._app.response_class(f"{self._stdlib_dumps(obj, indent=2)}\n", mimetype=self.mimetype)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for Resources that return dicts, through the app's JSON provider."""
+    response = current_app.json.response(data)
+    response.status_code = code
+    response.headers.extend(headers or {})
+    return response
+
+
+def install_restful_output():
+    """
+    Makes output_json Flask-RESTful's JSON representation.  Called by register_blueprints() right before the
+    API blueprints are imported, each Api copies the representations when it is created, and not earlier so
+    lazy mode does not import flask_restful at startup.
+    """
+    import flask_restful
+    flask_restful.DEFAULT_REPRESENTATIONS[:] = [('application/json', output_json)]
+
+
+def init_json(app):
+    """
+    Installs OrjsonProvider as app.json.
+    """
+    backend = app.config['JSON_BACKEND']
+    if backend not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"Unknown JSON_BACKEND {backend}")
+    if backend == 'orjson' and orjson is None:
+        raise ImportError("JSON_BACKEND=orjson needs the orjson package")
+    app.json = OrjsonProvider(app)
+    app.json.use_orjson = orjson is not None and backend != 'stdlib'
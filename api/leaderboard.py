@@ -0,0 +1,97 @@
+from flask import Blueprint, request, g
+from flask_restful import Api, Resource  # used for REST API building
+from __init__ import db
+from api.jwt_authorize import token_required
+from model.user import User
+from model.leaderboard import riddle_ranks, top_entries, entry_for_user, neighbors
+from model.riddle import Riddle
+from model.riddle_answers import riddle_answer_buffer
+
+"""
+This Blueprint object is used to define APIs for the riddle leaderboard.
+- top: the entries with the most points
+- rank: the rank of one user, the signed in user by default
+- neighbors: the entries just above and below a user
+- answers: submit an answer, checked against the riddle here and scored in the next batch (RIDDLE_FLUSH_SECONDS)
+Ranks come from the in-memory rank structure in model/leaderboard.py, not a COUNT(*) per request.
+"""
+leaderboard_api = Blueprint('leaderboard_api', __name__, url_prefix='/api')
+
+api = Api(leaderboard_api)
+
+MAX_LIMIT = 100
+
+def _int_arg(name, default, low, high):
+    return min(high, max(low, int(request.args.get(name, default))))
+
+def _with_names(entries):
+    """Reads entries with user names and ranks, looking up all the names in one query."""
+    names = dict(db.session.query(User.id, User._name).filter(User.id.in_([entry.user_id for entry in entries])).all()) if entries else {}
+    return [{**entry.read(), 'name': names.get(entry.user_id), 'rank': riddle_ranks.rank(entry.points)} for entry in entries]
+
+def _user_entry():
+    user_id = request.args.get('user_id', type=int) or g.current_user.id
+    return entry_for_user(user_id)
+
+class LeaderboardAPI:
+    """
+    Define the read endpoints for the riddle leaderboard.
+    """
+    class _Top(Resource):
+        def get(self):
+            try:
+                limit = _int_arg('limit', 10, 1, MAX_LIMIT)
+                offset = _int_arg('offset', 0, 0, 10 ** 9)
+            except ValueError:
+                return {'message': 'limit and offset must be integers'}, 400
+            return {'total': riddle_ranks.total(), 'entries': _with_names(top_entries(limit, offset))}
+
+    class _Rank(Resource):
+        @token_required()
+        def get(self):
+            entry = _user_entry()
+            if entry is None:
+                return {'message': 'User is not on the leaderboard'}, 404
+            return {**entry.read(), 'rank': riddle_ranks.rank(entry.points), 'total': riddle_ranks.total()}
+
+    class _Neighbors(Resource):
+        @token_required()
+        def get(self):
+            try:
+                count = _int_arg('count', 5, 1, MAX_LIMIT)
+            except ValueError:
+                return {'message': 'count must be an integer'}, 400
+            entry = _user_entry()
+            if entry is None:
+                return {'message': 'User is not on the leaderboard'}, 404
+            above, below = neighbors(entry, count)
+            return {
+                'entry': _with_names([entry])[0],
+                'above': _with_names(above),
+                'below': _with_names(below),
+                'total': riddle_ranks.total(),
+            }
+
+    class _Answers(Resource):
+        @token_required()
+        def post(self):
+            data = request.get_json(silent=True)
+            if not data or 'riddle_id' not in data or not isinstance(data.get('answer'), str):
+                return {'message': 'riddle_id and answer are required'}, 400
+            try:
+                riddle_id = int(data['riddle_id'])
+            except (TypeError, ValueError):
+                return {'message': 'riddle_id must be an integer'}, 400
+            riddle = db.session.get(Riddle, riddle_id)
+            if riddle is None:
+                return {'message': f'Riddle {riddle_id} not found'}, 404
+            correct = riddle.is_answer(data['answer'])
+            if not riddle_answer_buffer.submit(g.current_user.id, riddle_id, correct):
+                return {'message': 'This riddle was already answered'}, 409
+            return {'message': 'Answer accepted', 'riddle_id': riddle_id, 'correct': correct,
+                    'scored_within_seconds': riddle_answer_buffer.flush_seconds}, 202
+
+    api.add_resource(_Top, '/leaderboard/riddles')
+    api.add_resource(_Answers, '/leaderboard/riddles/answers')
+    api.add_resource(_Rank, '/leaderboard/riddles/rank')
+    api.add_resource(_Neighbors, '/leaderboard/riddles/neighbors')
@@ -1,8 +1,8 @@
 # by P5 G1
 from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource
-import requests
-import json
+from model.trivia import get_trivia_question
+import threading
 
 # Create a Blueprint for the messages API
 messages_api = Blueprint('messages_api', __name__, url_prefix='/api')
@@ -10,10 +10,8 @@ api = Api(messages_api)
 
 # Path for the messages file
 MESSAGE_FILE_PATH = 'Period-5/aaak/messages.txt'
-
-# API Key and URL template for the trivia API
-API_KEY = 'LUDk78PjUOELr1cvaaQuEA==t3yAhXp37UD4j6P9'
-TRIVIA_API_URL = 'https://api.api-ninjas.com/v1/trivia?category={}'
+# Serializes appends from concurrent requests in threaded and gevent workers
+MESSAGE_FILE_LOCK = threading.Lock()
 
 class MessagesAPI:
     # Define the API CRUD endpoints for the messages file.
@@ -36,7 +34,7 @@ class MessagesAPI:
             if not message:
                 return {'message': 'Message content is required.'}, 400
             try:
-                with open(MESSAGE_FILE_PATH, 'a') as file:
+                with MESSAGE_FILE_LOCK, open(MESSAGE_FILE_PATH, 'a') as file:
                     file.write(f"{message}\n")
                 return {'message': 'Message added successfully'}, 201
             except Exception as e:
@@ -53,22 +51,12 @@ class MessagesAPI:
             question = get_trivia_question(topic)
 
             if question:
-                with open(MESSAGE_FILE_PATH, 'a') as file:
+                with MESSAGE_FILE_LOCK, open(MESSAGE_FILE_PATH, 'a') as file:
                     file.write(question + '\n')
                 return jsonify({"message": "Trivia question added", "question": question})
             else:
-                return jsonify({"error": "Failed to fetch trivia question"}), 500
+                # A topic not asked for before is being fetched in the background
+                return {"error": "No trivia question ready for this topic, try again shortly"}, 503, {'Retry-After': '2'}
 
     # Add the resource for /trivia
     api.add_resource(_Trivia, '/trivia')
-
-def get_trivia_question(topic):
-    """Fetch a trivia question from the API."""
-    api_url = TRIVIA_API_URL.format(topic)
-    response = requests.get(api_url, headers={'X-Api-Key': API_KEY})
-    if response.status_code == requests.codes.ok:
-        question = json.loads(response.text)[0]['question']
-        return question
-    else:
-        print("Error:", response.status_code, response.text)
-        return None
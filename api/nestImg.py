@@ -3,10 +3,26 @@ from flask_restful import Api, Resource
 from api.jwt_authorize import token_required
 from model.nestPost import NestPost
 from model.nestImg import nestImg_base64_decode, nestImg_base64_upload
+from model.assets import get_asset
+from api.http_cache import cache_control
 
 nestImg_api = Blueprint('nestImg_api', __name__, url_prefix='/api/id')
 api = Api(nestImg_api)
 
+def post_image(current_user, nest_post):
+    """
+    The picture of a nest post as base64, for GET and POST /nestImg and GET /nestImg/<id>.
+    """
+    if nest_post._image_url:
+        base64_encode = nestImg_base64_decode(current_user.uid, nest_post._image_url)
+        if not base64_encode:
+            return {'message': 'An error occurred while reading the picture.'}, 500
+        return {'postImg': base64_encode}, 200
+    else:
+        # A post without an image shows the default one, encoded once at startup
+        default = get_asset('nest')
+        return {'postImg': default.base64, 'url': default.url, 'default': True}, 200
+
 class _NestImage(Resource):
     """
     Retrieves the current user's profile picture as a base64 encoded string.
@@ -24,37 +40,23 @@ class _NestImage(Resource):
     Returns:
     - A JSON object containing the base64 encoded string of the profile picture under the key 'pfp' if the operation is successful.
     - HTTP status code 200 if the  picture is successfully retrieved.
-    - HTTP status code 404 if the  picture is not set for the current post.
+    - HTTP status code 200 with the default image, its /assets/ url and 'default': True if the post has no picture.
     - HTTP status code 500 if an error occurs while reading the post picture from the server.
     """
     @token_required()
     def get(self):
         current_user = g.current_user
-        # Doesn't work since you can't add a body to a GET
+        # Browsers cannot send a body with GET, use GET /nestImg/<id> instead
         data = request.get_json()
         current_nestPost = NestPost.query.filter_by(id=data["imageID"]).first()
-
-        if current_nestPost._image_url:
-            base64_encode = nestImg_base64_decode(current_user.uid, current_nestPost._image_url)
-            if not base64_encode:
-                return {'message': 'An error occurred while reading the picture.'}, 500
-            return {'postImg': base64_encode}, 200
-        else:
-            return {'message': 'There was an error accessing the image.'}, 404
+        return post_image(current_user, current_nestPost)
 
     @token_required()
     def post(self):
         current_user = g.current_user
         data = request.get_json()
         current_nestPost = NestPost.query.filter_by(id=data["imageID"]).first()
-
-        if current_nestPost._image_url:
-            base64_encode = nestImg_base64_decode(current_user.uid, current_nestPost._image_url)
-            if not base64_encode:
-                return {'message': 'An error occurred while reading the picture.'}, 500
-            return {'postImg': base64_encode}, 200
-        else:
-            return {'message': 'There was an error accessing the image.'}, 404
+        return post_image(current_user, current_nestPost)
 
     @token_required()
     def put(self):
@@ -98,4 +100,18 @@ class _NestImage(Resource):
         except Exception as e:
             return {'message': f'A database error occurred while assigning post picture: {str(e)}'}, 500
         
+class _NestImageItem(Resource):
+    """
+    Retrieves the picture of a nest post by ID from the path, the cacheable form of POST /nestImg.
+    The browser revalidates it with its ETag.
+    """
+    @token_required()
+    @cache_control()
+    def get(self, image_id):
+        current_nestPost = NestPost.query.filter_by(id=image_id).first()
+        if current_nestPost is None:
+            return {'message': 'Post not found.'}, 404
+        return post_image(g.current_user, current_nestPost)
+
 api.add_resource(_NestImage, '/nestImg')
+api.add_resource(_NestImageItem, '/nestImg/<int:image_id>')
@@ -1,8 +1,14 @@
 from flask import Blueprint, g, request
 from flask_restful import Api, Resource
 from api.jwt_authorize import token_required
-from model.user import User
-from model.pfp import pfp_base64_decode, pfp_base64_upload, pfp_file_delete
+from model.user import User, stage_upload
+from model.pfp import pfp_base64_decode, pfp_file_delete
+from model.blobstore import blob_url, is_blob_ref
+from model.avatars import avatars_for
+from model.assets import get_asset
+from model.jobs import enqueue
+from model.imaging import ImageError, check_base64_format
+from api.jobs import accepted, idempotency_key
 
 pfp_api = Blueprint('pfp_api', __name__, url_prefix='/api/id')
 api = Api(pfp_api)
@@ -22,9 +28,10 @@ class _PFP(Resource):
     4. The base64 encoded string of the image is returned in the response.
 
     Returns:
-    - A JSON object containing the base64 encoded string of the profile picture under the key 'pfp' if the operation is successful.
+    - A JSON object containing the base64 encoded string of the profile picture under the key 'pfp' if the operation is successful,
+      and under 'url' its immutable /uploads/blobs/<hash> address when the picture is in the blob store.
     - HTTP status code 200 if the profile picture is successfully retrieved.
-    - HTTP status code 404 if the profile picture is not set for the current user.
+    - HTTP status code 404 if the profile picture is not set for the current user, with the default avatar's url.
     - HTTP status code 500 if an error occurs while reading the profile picture from the server.
     """
     @token_required()
@@ -35,9 +42,13 @@ class _PFP(Resource):
             base64_encode = pfp_base64_decode(current_user.uid, current_user.pfp)
             if not base64_encode:
                 return {'message': 'An error occurred while reading the profile picture.'}, 500
+            if is_blob_ref(current_user.pfp):
+                # A cacheable URL for the same image
+                return {'pfp': base64_encode, 'url': blob_url(current_user.pfp)}, 200
             return {'pfp': base64_encode}, 200
         else:
-            return {'message': 'Profile picture is not set.'}, 404
+            # Still a 404 for existing clients, with the default avatar's cacheable url to show instead
+            return {'message': 'Profile picture is not set.', 'url': get_asset('avatar').url, 'default': True}, 404
 
     @token_required()
     def delete(self):
@@ -95,8 +106,9 @@ class _PFP(Resource):
         Updates the user's profile picture with a new image provided as base64 encoded data.
 
         This endpoint allows users to update their profile picture by sending a PUT request with base64 encoded image data.
-        The image is decoded and saved to a secure location on the server, and the user's profile information is updated
-        to reference the new image file.
+        The image is decoded and saved to a secure location on the server by a background job, which then updates the
+        user's profile information to reference the new image file.  Poll GET /api/jobs/<id> for the outcome.  An
+        Idempotency-Key header makes a retried request return the job of the first one.
 
         The function requires a valid authentication token and expects the base64 image data to be included in the request's JSON body
         under the key 'pfp'. If the image data is not provided, or if any error occurs during the upload process or while updating
@@ -104,28 +116,56 @@ class _PFP(Resource):
 
         Returns:
         - A JSON object with a message indicating the success or failure of the operation.
-        - HTTP status code 200 if the profile picture was updated successfully.
+        - HTTP status code 202 with the job if the update was queued, with a Location header to its status.
         - HTTP status code 400 if the base64 image data is missing from the request.
-        - HTTP status code 500 if an error occurs during the upload process or while updating the database.
+        - HTTP status code 415 if the data is not one of the image types in UPLOAD_EXTENSIONS.
         """
         current_user = g.current_user
 
         # Obtain the base64 image data from the request
         if 'pfp' not in request.json:
             return {'message': 'Base64 image data required.'}, 400
-        base64_image = request.json['pfp']
-       
-        # Make an image file from the base64 data 
-        filename = pfp_base64_upload(base64_image, current_user.uid)
-        if not filename:
-            return {'message': 'An error occurred while uploading the profile picture'}, 500
-        
-        # Update the user's profile picture to the uploaded file
         try:
-            # write the filename reference to the database
-            current_user.update({"pfp": filename})
-            return {'message': 'Profile picture updated successfully'}, 200
-        except Exception as e:
-            return {'message': f'A database error occurred while assigning profile picture: {str(e)}'}, 500
+            check_base64_format(request.json['pfp'])
+            upload = stage_upload(request.json['pfp'])
+        except ImageError as e:
+            return {'message': str(e)}, 415
+
+        # Re-encoding the image happens in a background job, queued with the stored upload's hash
+        job = enqueue('user.save_pfp', {'user_id': current_user.id, 'upload': upload},
+                      idempotency_key=idempotency_key(f'pfp:{current_user.id}'), user_id=current_user.id)
+        return accepted(job, 'Profile picture update queued')
         
+class _PFPBatch(Resource):
+    """
+    Retrieves the profile pictures of many users at once, e.g. the authors of a channel feed.
+
+    Query parameters:
+    - uids: Comma separated user uids, at most MAX_BATCH_UIDS.
+    - inline: 1 to include a small thumbnail of each picture as a data URI, so the feed needs no image requests.
+    - size: Thumbnail width and height in pixels, 16 to 256, defaults to AVATAR_THUMBNAIL_SIZE.
+
+    Returns:
+    - A JSON object with 'avatars', keyed by uid, each with a 'url' (the default avatar's, with 'default': True,
+      without a picture) and with inline a 'thumbnail', and 'missing', the uids that do not exist.
+    - HTTP status code 400 if uids is missing, too long, or size is not a number.
+    """
+    MAX_BATCH_UIDS = 100
+
+    @token_required()
+    def get(self):
+        uids = list(dict.fromkeys(uid for uid in request.args.get('uids', '').split(',') if uid))
+        if not uids:
+            return {'message': 'uids required.'}, 400
+        if len(uids) > self.MAX_BATCH_UIDS:
+            return {'message': f'At most {self.MAX_BATCH_UIDS} uids per request.'}, 400
+        size = request.args.get('size')
+        if size is not None:
+            if not size.isdigit():
+                return {'message': 'size must be an integer'}, 400
+            size = min(256, max(16, int(size)))
+        avatars, missing = avatars_for(uids, inline=request.args.get('inline') == '1', size=size)
+        return {'avatars': avatars, 'missing': missing}, 200
+
 api.add_resource(_PFP, '/pfp')
+api.add_resource(_PFPBatch, '/pfps')
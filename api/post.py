@@ -6,6 +6,10 @@ from __init__ import app
 from api.jwt_authorize import token_required
 from model.post import Post
 from model.channel import Channel
+from model.post_score import SORT_COLUMNS, ranked_page
+from model.readers import read_posts
+from api.streaming import stream_json
+from api.http_cache import cache_control
 
 """
 This Blueprint object is used to define APIs for the Post model.
@@ -22,6 +26,32 @@ The Api object is connected to the Blueprint object to define the API endpoints.
 """
 api = Api(post_api)
 
+# Page size for ranked channel listings
+DEFAULT_RANKED_POSTS = 50
+MAX_RANKED_POSTS = 200
+
+def channel_posts(channel_id, sort=None, limit=None, offset=None):
+    """
+    The posts of a channel, for POST /posts/filter and GET /posts?channel_id=.
+    With sort ("top", "hot" or "new") one page (limit, offset) in that order instead.
+    """
+    # Optional ranking: top (net votes), hot (net votes with time decay) or new, read from post_scores
+    if sort:
+        if sort not in SORT_COLUMNS:
+            return {'message': f"sort must be one of {', '.join(SORT_COLUMNS)}"}, 400
+        try:
+            limit = min(MAX_RANKED_POSTS, max(1, int(DEFAULT_RANKED_POSTS if limit is None else limit)))
+            offset = max(0, int(offset or 0))
+        except (TypeError, ValueError):
+            return {'message': 'limit and offset must be integers'}, 400
+        # Shared by all workers, see model/cache.py
+        return jsonify(ranked_page(channel_id, sort, limit=limit, offset=offset))
+
+    # Find all posts of the channel
+    posts = read_posts(Post._channel_id == channel_id)
+    # Return a JSON list, encoded as the posts are read
+    return stream_json(posts)
+
 class PostAPI:
     """
     Define the API CRUD endpoints for the Post model.
@@ -130,11 +160,9 @@ class PostAPI:
             # Obtain the current user
             current_user = g.current_user
             # Find all the posts by the current user
-            posts = Post.query.filter(Post._user_id == current_user.id).all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = [post.read() for post in posts]
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            posts = read_posts(Post._user_id == current_user.id)
+            # Return a JSON list, encoded as the posts are read
+            return stream_json(posts)
 
     class _BULK_CRUD(Resource):
         def post(self):
@@ -162,25 +190,29 @@ class PostAPI:
             # Return the results of the bulk creation process
             return jsonify(results)
         
+        @cache_control(public=True)
         def get(self):
             """
-            Retrieve all posts.
+            Retrieve all posts, or with ?channel_id= the posts of a channel, optionally with
+            &sort=top|hot|new&limit=&offset= as for /posts/filter.  Cacheable for PUBLIC_CACHE_SECONDS.
             """
-            # Find all the posts
-            posts = Post.query.all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = []
-            for post in posts:
-                post_data = post.read()
-                json_ready.append(post_data)
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            channel_id = request.args.get('channel_id')
+            if channel_id is not None:
+                if not channel_id.isdigit():
+                    return {'message': 'channel_id must be an integer'}, 400
+                return channel_posts(int(channel_id), request.args.get('sort'),
+                                     request.args.get('limit'), request.args.get('offset'))
+            # Read the post columns with author and channel names, without loading Post objects
+            posts = read_posts()
+            # Return a JSON list, encoded as the posts are read
+            return stream_json(posts)
 
     class _FILTER(Resource):
         @token_required()
         def post(self):
             """
             Retrieve all posts by channel ID and user ID.
+            With "sort" ("top", "hot" or "new") return one page ("limit", "offset") in that order instead.
             """
             # Obtain and validate the request data sent by the RESTful client API
             data = request.get_json()
@@ -189,22 +221,33 @@ class PostAPI:
             if 'channel_id' not in data:
                 return {'message': 'Channel ID not found'}, 400
             
-            # Find all posts by channel ID and user ID
-            posts = Post.query.filter_by(_channel_id=data['channel_id']).all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = [post.read() for post in posts]
-            # Return a JSON list, converting Python dictionaries to JSON format
-            return jsonify(json_ready)
+            sort = data.get('sort') or request.args.get('sort')
+            return channel_posts(data['channel_id'], sort, data.get('limit'), data.get('offset'))
+
+    class _ITEM(Resource):
+        @token_required()
+        @cache_control()
+        def get(self, post_id):
+            """
+            Retrieve a single post by ID from the path, the cacheable form of GET /post with a JSON body.
+            The browser revalidates it with its ETag.
+            """
+            post = Post.query.get(post_id)
+            if post is None:
+                return {'message': 'Post not found'}, 404
+            return jsonify(post.read())
 
     """
-    Map the _CRUD, _USER, _BULK_CRUD, and _FILTER classes to the API endpoints for /post, /post/user, /posts, and /posts/filter.
+    Map the _CRUD, _ITEM, _USER, _BULK_CRUD, and _FILTER classes to the API endpoints for /post, /post/<id>, /post/user, /posts, and /posts/filter.
     - The API resource class inherits from flask_restful.Resource.
     - The _CRUD class defines the HTTP methods for the API.
+    - The _ITEM class defines the endpoint for reading a post by ID in the path.
     - The _USER class defines the endpoints for retrieving posts by the current user.
     - The _BULK_CRUD class defines the bulk operations for the API.
     - The _FILTER class defines the endpoints for filtering posts by channel ID and user ID.
     """
     api.add_resource(_CRUD, '/post')
+    api.add_resource(_ITEM, '/post/<int:post_id>')
     api.add_resource(_USER, '/post/user')
     api.add_resource(_BULK_CRUD, '/posts')
     api.add_resource(_FILTER, '/posts/filter')
\ No newline at end of file
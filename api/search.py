@@ -0,0 +1,50 @@
+from flask import Blueprint, request, current_app
+from flask_restful import Api, Resource  # used for REST API building
+from api.jwt_authorize import token_required
+from model.search import SEARCH_SOURCES, search
+
+"""
+This Blueprint object is used to define the search API.
+- Searches post titles and comments, nest post titles and content, and feedback.
+- Results are ranked by relevance and paged, so the frontend no longer pulls /api/posts to filter it.
+"""
+search_api = Blueprint('search_api', __name__, url_prefix='/api')
+
+api = Api(search_api)
+
+MAX_PAGE_SIZE = 50
+
+class SearchAPI:
+    """
+    Define the search endpoint.
+    - get: /api/search?q=words&kind=post&page=1&per_page=20
+    """
+    class _Search(Resource):
+        @token_required()
+        def get(self):
+            query = request.args.get('q', '').strip()
+            kind = request.args.get('kind') or None
+            if not query:
+                return {'message': 'Query parameter q is required'}, 400
+            if kind and kind not in SEARCH_SOURCES:
+                return {'message': f"kind must be one of {', '.join(SEARCH_SOURCES)}"}, 400
+            try:
+                page = max(1, int(request.args.get('page', 1)))
+                per_page = min(MAX_PAGE_SIZE, max(1, int(request.args.get('per_page', current_app.config['SEARCH_PAGE_SIZE']))))
+            except ValueError:
+                return {'message': 'page and per_page must be integers'}, 400
+
+            result = search(query, kind=kind, page=page, per_page=per_page)
+            if result is None:
+                return {'message': 'Search is not available on this server'}, 503
+            total, hits = result
+            return {
+                'query': query,
+                'kind': kind,
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'results': hits,
+            }
+
+    api.add_resource(_Search, '/search')
@@ -5,6 +5,8 @@ from datetime import datetime
 from __init__ import app
 from api.jwt_authorize import token_required
 from model.section import Section
+from model.readers import read_sections
+from api.streaming import stream_json
 
 """
 This Blueprint object is used to define APIs for the Section model.
@@ -138,15 +140,10 @@ class SectionAPI:
             """
             Retrieve all sections.
             """
-            # Find all the sections
-            sections = Section.query.all()
-            # Converting Python objects to JSON format
-            json_ready = []
-            for section in sections:
-                section_data = section.read()
-                json_ready.append(section_data)
-            # Return a JSON list of all the sections in restful response
-            return jsonify(json_ready)
+            # Read the section columns, without loading Section objects
+            sections = read_sections()
+            # Return a JSON list of all the sections, encoded as the rows are read
+            return stream_json(sections)
 
     """
     Map the _CRUD and _BULK_CRUD classes to the API endpoints for /section and /sections.
@@ -0,0 +1,90 @@
+import logging
+from itertools import chain, islice
+from flask import Response, g, request, stream_with_context
+from __init__ import app, db
+
+"""
+Streaming JSON responses for listings.
+
+The response body is encoded a batch of items at a time as the client reads it, so a worker never holds
+the whole list of dicts or the whole encoded string, and the first bytes go out as soon as the first rows
+are read.  Clients get a JSON array, or NDJSON, one item per line, with ?format=ndjson or
+Accept: application/x-ndjson, which they can parse as it arrives.
+
+The first batch is read before the response is returned, so a failing query is an ordinary error response.
+Once the status line is out an error can no longer change it: the body is cut off without its closing
+bracket and the connection dropped, so clients see a failed read rather than a short but valid list, and
+NDJSON clients also get a last {"error": ...} line.  The request metrics are recorded when the body ends.
+"""
+
+NDJSON = 'application/x-ndjson'
+
+# Items encoded per call, one call per item would spend more time in the encoder's setup than encoding
+BATCH_ITEMS = 500
+
+def _batches(items):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, BATCH_ITEMS))
+        if not batch:
+            return
+        yield batch
+
+def _json_array(items):
+    yield '['
+    separator = ''
+    for batch in _batches(items):
+        # Encode the batch as a list and drop its brackets
+        yield separator + app.json.dumps(batch)[1:-1]
+        separator = ','
+    yield ']'
+
+def _ndjson(items):
+    dumps = app.json.dumps
+    for batch in _batches(items):
+        yield ''.join(dumps(item) + '\n' for item in batch)
+
+def _streamed(chunks, session, error_line):
+    try:
+        yield from chunks
+    except Exception:
+        logging.exception(f"{request.method} {request.path} failed while streaming its response")
+        g.stream_failed = True  # read by the instrumentation when the response closes
+        if error_line:
+            yield error_line
+        raise
+    finally:
+        session.close()
+
+def wants_ndjson():
+    return request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+def stream_json(items, status=200):
+    """
+    Streams an iterable of JSON-able items as a JSON array, the same body jsonify(list(items)) would send,
+    or as NDJSON if the client asked for it.
+
+    Args:
+        items (iterable): E.g. a reader from model/readers.py, consumed while the response is sent.
+
+    Returns:
+        Response: A streamed response.
+    """
+    items = iter(items)
+    first = list(islice(items, BATCH_ITEMS))
+    items = chain(first, items)
+    if wants_ndjson():
+        body, mimetype = _ndjson(items), NDJSON
+        error_line = app.json.dumps({'error': 'The response failed while streaming'}) + '\n'
+    else:
+        body, mimetype = _json_array(items), 'application/json'
+        error_line = None
+    # The request's teardown removes the scoped session before the body is read, take this session out of
+    # the registry so it and its cursor stay open, the stream closes it when it ends
+    session = db.session()
+    db.session.registry.clear()
+    response = Response(stream_with_context(_streamed(body, session, error_line)), status=status, mimetype=mimetype)
+    response.call_on_close(session.close)  # also when the client left before the body started
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx passes chunks on as they come
+    return response
@@ -5,6 +5,10 @@ from datetime import datetime
 from __init__ import app
 from api.jwt_authorize import token_required
 from model.user import User
+from model.readers import read_users
+from api.streaming import stream_json
+from model.jobs import enqueue
+from api.jobs import accepted, idempotency_key
 
 # Create a Blueprint for the user API
 user_api = Blueprint('user_api', __name__, url_prefix='/api')
@@ -22,32 +26,23 @@ class UserAPI:
         Users API operation for bulk Create and Read.
         """
 
+        @token_required()
         def post(self):
             """
-            Handle bulk user creation by sending POST requests to the single user endpoint.
+            Handle bulk user creation in a background job, see users.bulk_create in model/user.py.
+            Returns 202 with the job, its result has the success and error counts, the caller may poll it.
             """
+            current_user = g.current_user
             users = request.get_json()
 
             if not isinstance(users, list):
                 return {'message': 'Expected a list of user data'}, 400
+            if len(users) > app.config['BULK_USERS_MAX']:
+                return {'message': f"At most {app.config['BULK_USERS_MAX']} users per request"}, 413
 
-            results = {'errors': [], 'success_count': 0, 'error_count': 0}
-
-            with current_app.test_client() as client:
-                for user in users:
-                    # Set a default password as we don't have it for bulk creation
-                    user["password"] = app.config['DEFAULT_PASSWORD']
-
-                    # Simulate a POST request to the single user creation endpoint
-                    response = client.post('/api/user', json=user)
-
-                    if response.status_code == 200:
-                        results['success_count'] += 1
-                    else:
-                        results['errors'].append(response.get_json())
-                        results['error_count'] += 1
-
-            return jsonify(results)
+            job = enqueue('users.bulk_create', {'users': users}, user_id=current_user.id,
+                          idempotency_key=idempotency_key(f'users:{current_user.id}'))
+            return accepted(job, f'Creating {len(users)} users')
         
         @token_required()
         def get(self):
@@ -55,19 +50,19 @@ class UserAPI:
             Retrieve all users.
             """
             current_user = g.current_user
-            users = User.query.all()  # extract all users from the database
-
-            # Prepare a JSON list of user dictionaries
-            json_ready = []
-            for user in users:
-                user_data = user.read()
-                if current_user.role == 'Admin' or current_user.id == user.id:
-                    user_data['access'] = ['rw']  # read-write access control
-                else:
-                    user_data['access'] = ['ro']  # read-only access control
-                json_ready.append(user_data)
+            is_admin, current_id = current_user.role == 'Admin', current_user.id
+            users = read_users()  # projected columns, no ORM objects
+
+            def with_access(users):
+                for user_data in users:
+                    if is_admin or current_id == user_data['id']:
+                        user_data['access'] = ['rw']  # read-write access control
+                    else:
+                        user_data['access'] = ['ro']  # read-only access control
+                    yield user_data
 
-            return jsonify(json_ready)
+            # Encoded and sent as the rows are read
+            return stream_json(with_access(users))
 
     class _CRUD(Resource):
         """
@@ -41,9 +41,8 @@ class VoteAPI:
             # Check if the vote already exists for the user on the post
             existing_vote = Vote.query.filter_by(_post_id=data['post_id'], _user_id=current_user.id).first()
             if existing_vote:
-                # Update the existing vote type
-                existing_vote._vote_type = data['vote_type']
-                existing_vote.create()  # This will commit the update
+                # Update the existing vote type, post scores follow through the ORM events
+                existing_vote.update(data['vote_type'])
                 return jsonify(existing_vote.read())
 
             # Create a new vote object
@@ -0,0 +1,58 @@
+""" gunicorn_config.py
+Gunicorn settings for serving the Flask app, selected through environment variables.
+
+Usage: Run from the root of the project:
+> gunicorn -c gunicorn_config.py wsgi:app
+
+Worker modes (GUNICORN_WORKER_CLASS):
+- sync:   one request per worker process, the original deployment.
+- gthread: GUNICORN_THREADS requests per worker process, each on its own thread.
+- gevent: GUNICORN_WORKER_CONNECTIONS requests per worker process as greenlets, best with MySQL.
+- auto:   gevent when running against MySQL and gevent is installed, otherwise gthread.
+
+See "Concurrency Model" in README.md for what blocks in each mode.
+"""
+import importlib.util
+import os
+
+def _mysql_configured():
+    return bool(os.environ.get('DB_ENDPOINT') and os.environ.get('DB_USERNAME') and os.environ.get('DB_PASSWORD'))
+
+def _worker_class(requested):
+    if requested == 'auto':
+        requested = 'gevent' if _mysql_configured() else 'gthread'
+    if requested == 'gevent' and importlib.util.find_spec('gevent') is None:
+        print("gevent is not installed, falling back to gthread workers")
+        requested = 'gthread'
+    return requested
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8887'
+workers = int(os.environ.get('GUNICORN_WORKERS') or 3)
+worker_class = _worker_class(os.environ.get('GUNICORN_WORKER_CLASS') or 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS') or 8) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 100)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT') or 30)
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE') or 5)
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+# Import the app once in the master and fork it, instead of importing it again in every worker
+preload_app = (os.environ.get('GUNICORN_PRELOAD') or '0') == '1'
+
+# Size the SQLAlchemy pool for the number of requests one worker can have in flight
+if worker_class == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+elif worker_class == 'gevent':
+    os.environ.setdefault('DB_POOL_SIZE', str(min(worker_connections, 20)))
+
+def when_ready(server):
+    server.log.info(f"Serving with {workers} {worker_class} workers"
+                    + (f" x {threads} threads" if worker_class == 'gthread' else "")
+                    + (f" x {worker_connections} connections" if worker_class == 'gevent' else ""))
+
+def post_worker_init(worker):
+    # Every worker runs a scheduler thread, a database lease picks the one that runs the jobs
+    from model.scheduler import start_scheduler
+    start_scheduler()
+    # And in JOB_QUEUE_MODE=thread a job thread, the claim's compare-and-set keeps a job on one worker
+    from model.jobs import start_job_runner
+    start_job_runner()
@@ -2,9 +2,10 @@
 import json
 import os
 from urllib.parse import urljoin, urlparse
-from flask import abort, redirect, render_template, request, send_from_directory, url_for, jsonify  # import render_template from "public" flask libraries
+from flask import abort, redirect, render_template, request, send_file, send_from_directory, url_for, jsonify  # import render_template from "public" flask libraries
 from flask_login import current_user, login_user, logout_user
 from flask.cli import AppGroup
+import click
 from flask_login import current_user, login_required
 from flask import current_app
 from werkzeug.security import generate_password_hash
@@ -14,19 +15,11 @@ import shutil
 
 # import "objects" from "this" project
 from __init__ import app, db, login_manager  # Key Flask objects 
-# API endpoints
-from api.user import user_api 
-from api.pfp import pfp_api
-from api.nestImg import nestImg_api # Justin added this, custom format for his website
-from api.post import post_api
-from api.channel import channel_api
-from api.group import group_api
-from api.section import section_api
-from api.nestPost import nestPost_api # Justin added this, custom format for his website
-from api.messages_api import messages_api # Adi added this, messages for his website
-from api.carphoto import car_api
-
-from api.vote import vote_api
+# API endpoints are listed in api/manifest.py
+from api.manifest import register_blueprints, startup_report, format_startup_report
+from api.instrumentation import init_instrumentation
+from api.json_provider import init_json
+from api.http_cache import init_http_cache
 # database Initialization functions
 from model.user import User, initUsers
 from model.section import Section, initSections
@@ -35,21 +28,34 @@ from model.channel import Channel, initChannels
 from model.post import Post, initPosts
 from model.nestPost import NestPost, initNestPosts # Justin added this, custom format for his website
 from model.vote import Vote, initVotes
+from model.post_score import rebuild_post_scores
+from model.cache import get_cache
+from model.leaderboard import init_riddle_leaderboard
+from model.riddle_answers import RiddleAnswer
+from model.riddle import Riddle, init_riddles
+from model.scheduler import ScheduledJob, start_scheduler
+from model.jobs import Job, run_workers, start_job_runner
+from model.blobstore import Blob, blob_gc, blob_key, is_blob_ref, recount_references, sniff_content_type
+from model.storage import get_storage
+from model.assets import find_asset
+from model.synthetic import generate_synthetic_data
+from model.search import init_search, reindex, setup_search
 # server only Views
 
-# register URIs for api endpoints
-app.register_blueprint(messages_api) # Adi added this, messages for his website
-app.register_blueprint(user_api)
-app.register_blueprint(pfp_api) 
-app.register_blueprint(post_api)
-app.register_blueprint(channel_api)
-app.register_blueprint(group_api)
-app.register_blueprint(section_api)
-# Added new files to create nestPosts, uses a different format than Mortensen and didn't want to touch his junk
-app.register_blueprint(nestPost_api)
-app.register_blueprint(nestImg_api)
-app.register_blueprint(vote_api)
-app.register_blueprint(car_api)
+# orjson encoding for jsonify, and for Flask-RESTful once the API blueprints are imported
+init_json(app)
+
+# request latency and SQL statement metrics, served at /metrics
+init_instrumentation(app)
+
+# brotli or gzip compression, weak ETags and 304s for every response
+init_http_cache(app)
+
+# full-text search index, kept in sync by ORM events on posts, nest posts and feedback
+init_search()
+
+# register URIs for api endpoints, deferred to the first request when LAZY_BLUEPRINTS is set
+register_blueprints(app, lazy=app.config['LAZY_BLUEPRINTS'])
 
 # Tell Flask-Login the view function name of your login route
 login_manager.login_view = "login"
@@ -118,7 +124,51 @@ def u2table():
 # Helper function to extract uploads for a user (ie PFP image)
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
+    url = get_storage('uploads').url(filename)
+    if url:
+        return storage_redirect(url)
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+def storage_redirect(url):
+    # Presigned URLs expire, so the redirect itself is only cached for part of their lifetime
+    response = redirect(url, 302)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['S3_PRESIGN_SECONDS'] // 2
+    return response
+
+# Content-addressed images, the URL changes with the content so browsers may cache them forever
+@app.route('/uploads/blobs/<blob_hash>')
+def blob_file(blob_hash):
+    if not is_blob_ref(blob_hash):
+        abort(404)
+    storage = get_storage('blobs')
+    url = storage.url(blob_key(blob_hash))
+    if url:
+        # The object itself is stored with an immutable Cache-Control
+        return storage_redirect(url)
+    path = storage.local_path(blob_key(blob_hash))
+    try:
+        with open(path, 'rb') as blob_head:
+            mimetype = sniff_content_type(blob_head.read(16))
+    except FileNotFoundError:
+        abort(404)
+    response = send_file(path, mimetype=mimetype, etag=blob_hash, max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# Default images, preloaded in model/assets.py, the hash in the filename changes with the content
+@app.route('/assets/<filename>')
+def default_asset(filename):
+    asset = find_asset(filename)
+    if asset is None:
+        abort(404)
+    response = app.response_class(asset.data, mimetype=asset.content_type)
+    response.set_etag(asset.digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
  
 @app.route('/users/delete/<int:user_id>', methods=['DELETE'])
 @login_required
@@ -149,7 +199,9 @@ custom_cli = AppGroup('custom', help='Custom commands')
 
 # Define a command to run the data generation functions
 @custom_cli.command('generate_data')
-def generate_data():
+@click.option('--scale', default=0.0, help='Add synthetic data, 1 unit is about 1k users, 20k posts and 100k votes.')
+@click.option('--seed', default=42, help='Random seed for the synthetic data.')
+def generate_data(scale, seed):
     initUsers()
     initSections()
     initGroups()
@@ -157,7 +209,83 @@ def generate_data():
     initPosts()
     initNestPosts()
     initVotes()
+    init_riddle_leaderboard()
+    init_riddles()
+    created = setup_search()
+    if scale > 0:
+        generate_synthetic_data(scale=scale, seed=seed)
+        # bulk inserts bypass the ORM events that keep post scores and the search index current
+        rebuild_post_scores()
+    if created or scale > 0:
+        reindex()
     
+# Define a command to recompute post vote totals and rankings from the votes table
+@custom_cli.command('post_scores_rebuild')
+def post_scores_rebuild():
+    count = rebuild_post_scores()
+    print(f"Scored {count} posts")
+
+# Define a command to create the search index, once per database before the web workers start
+@custom_cli.command('search_setup')
+def search_setup():
+    created = setup_search()
+    if created is None:
+        print("Search is disabled (SEARCH_BACKEND=none)")
+    elif created:
+        print(f"Created the search index and indexed {reindex()} documents")
+    else:
+        print("The search index already exists")
+
+# Define a command to rebuild the search index, needed after bulk imports that bypass the ORM
+@custom_cli.command('search_reindex')
+def search_reindex():
+    count = reindex()
+    if count is None:
+        print("Search is disabled (SEARCH_BACKEND=none)")
+    else:
+        print(f"Indexed {count} documents")
+
+# Define a command to show the periodic jobs, see model/scheduler.py
+@custom_cli.command('scheduled_jobs')
+def scheduled_jobs():
+    db.create_all()
+    for job in ScheduledJob.query.order_by(ScheduledJob.name).all():
+        print(json.dumps(job.read()))
+
+# Define a command to run background job workers, see model/jobs.py
+@custom_cli.command('jobs_worker')
+@click.option('--processes', default=1, help='Number of worker processes.')
+@click.option('--burst', is_flag=True, help='Exit once no jobs are due.')
+def jobs_worker(processes, burst):
+    db.create_all()
+    count = run_workers(processes=processes, burst=burst)
+    if burst and count is not None:
+        print(f"Ran {count} jobs")
+
+# Define a command to delete unreferenced image blobs, see model/blobstore.py
+@custom_cli.command('blob_gc')
+@click.option('--grace', default=None, type=int, help='Seconds a blob stays after its last reference, defaults to BLOB_GC_GRACE_SECONDS.')
+@click.option('--recount', is_flag=True, help='Recompute reference counts from the users table first.')
+def blob_gc_command(grace, recount):
+    db.create_all()
+    if recount:
+        print(f"Corrected {recount_references()} reference counts")
+    print(f"Deleted {blob_gc(grace)} blobs, {Blob.query.count()} left")
+
+# Define a command to empty the shared cache, see model/cache.py, needed after editing the database by hand
+@custom_cli.command('cache_clear')
+def cache_clear():
+    get_cache().clear()
+    print(f"Cleared the {app.config['CACHE_BACKEND']} cache")
+
+# Define a command to report where startup time goes
+@custom_cli.command('startup_profile')
+@click.option('--top', default=20, help='Number of slowest imports to list.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+def startup_profile(top, as_json):
+    report = startup_report(top=top)
+    print(json.dumps(report, indent=2) if as_json else format_startup_report(report))
+
 # Backup the old database
 def backup_database(db_uri, backup_uri):
     """Backup the current database."""
@@ -225,5 +353,9 @@ app.cli.add_command(custom_cli)
         
 # this runs the flask application on the development server
 if __name__ == "__main__":
+    # periodic jobs, only in the reloader's child process that serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_scheduler()
+        start_job_runner()
     # change name for testing
     app.run(debug=True, host="0.0.0.0", port="8887")
\ No newline at end of file
@@ -0,0 +1,72 @@
+# assets.py
+import base64
+import hashlib
+import os
+from __init__ import app
+from model.imaging import CONTENT_TYPES, sniff_format
+
+"""
+Images shown in place of a picture a user or post does not have: the default car, avatar and nest image.
+
+They ship with the code under static/assets/defaults/ and never change while the app runs, so each is read,
+hashed and base64 encoded once when this module is imported, instead of on every request.  Each has a URL
+with its hash in it, /assets/<name>.<hash>.<ext>, served from memory and cacheable forever: a new default
+image is a new URL.
+"""
+
+ASSET_FOLDER = os.path.join(app.root_path, 'static', 'assets', 'defaults')
+
+# name -> file under ASSET_FOLDER
+DEFAULT_ASSETS = {
+    'car': 'no_car.jpg',
+    'avatar': 'avatar.png',
+    'nest': 'nest.png',
+}
+
+
+class Asset:
+    """
+    One default image, loaded and encoded once.
+
+    Attributes:
+        name (str): Registry name, e.g. 'car'.
+        data (bytes): The file content.
+        digest (str): First 12 hex digits of its SHA-256, in the URL and the ETag.
+        content_type (str): MIME type sniffed from the content.
+        base64 (str): The content base64 encoded, as the API returns pictures.
+        filename (str): <name>.<digest>.<ext>
+    """
+    def __init__(self, name, path):
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        self.name = name
+        self.digest = hashlib.sha256(self.data).hexdigest()[:12]
+        self.content_type = CONTENT_TYPES.get(sniff_format(self.data[:16]), 'application/octet-stream')
+        self.base64 = base64.b64encode(self.data).decode('ascii')
+        self.filename = f"{name}.{self.digest}{os.path.splitext(path)[1]}"
+
+    @property
+    def url(self):
+        return f"/assets/{self.filename}"
+
+    @property
+    def data_uri(self):
+        return f"data:{self.content_type};base64,{self.base64}"
+
+
+def _load_assets():
+    return {name: Asset(name, os.path.join(ASSET_FOLDER, filename)) for name, filename in DEFAULT_ASSETS.items()}
+
+# Loaded at import, a missing default image fails startup rather than a request
+default_assets = _load_assets()
+_by_filename = {asset.filename: asset for asset in default_assets.values()}
+
+def get_asset(name):
+    return default_assets[name]
+
+def find_asset(filename):
+    """
+    Returns:
+        Asset: The asset served at /assets/<filename>, or None.
+    """
+    return _by_filename.get(filename)
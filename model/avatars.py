@@ -0,0 +1,126 @@
+# avatars.py
+import base64
+import threading
+from collections import OrderedDict
+from __init__ import app, db
+from model.user import User
+from model.blobstore import blob_url, is_blob_ref, read_blob
+from model.storage import get_storage
+from model.imaging import make_thumbnails
+from model.assets import get_asset
+
+"""
+Avatars of many users at once, for rendering a feed with one request instead of one per author.
+
+Each avatar has a URL and optionally a small inline thumbnail as a data URI.  Thumbnails are kept in an
+in-memory LRU per worker.  Pictures in the blob store are keyed by content hash, so their thumbnails never go
+stale.  Older pictures under UPLOAD_FOLDER/<uid>/ are keyed by uid and filename.
+"""
+
+class ThumbnailCache:
+    """
+    A thread-safe LRU of encoded thumbnails, bounded by entry count.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+thumbnail_cache = ThumbnailCache(app.config['AVATAR_CACHE_ENTRIES'])
+
+
+def avatar_url(uid, pfp):
+    if is_blob_ref(pfp):
+        return blob_url(pfp)
+    return f"/uploads/{uid}/{pfp}"
+
+def _read_picture(uid, pfp):
+    if is_blob_ref(pfp):
+        return read_blob(pfp)
+    return get_storage('uploads').read(f'{uid}/{pfp}')
+
+def thumbnail_key(uid, pfp, size):
+    return (pfp, size) if is_blob_ref(pfp) else (uid, pfp, size)
+
+def load_thumbnails(pictures, size):
+    """
+    Makes the thumbnails missing from the cache, in one batch across the image pool.
+
+    Args:
+        pictures (list): (uid, pfp) pairs.
+        size (int): Thumbnail width and height.
+
+    Returns:
+        dict: thumbnail key -> data URI, or None if the picture could not be read.
+    """
+    thumbnails, missing = {}, []
+    for uid, pfp in pictures:
+        key = thumbnail_key(uid, pfp, size)
+        if key in thumbnails:
+            continue
+        thumbnails[key] = thumbnail_cache.get(key)
+        if thumbnails[key] is None:
+            data = _read_picture(uid, pfp)
+            if data is not None:
+                missing.append((key, data))
+    if missing:
+        for (key, _), made in zip(missing, make_thumbnails([data for _, data in missing], size)):
+            if made is not None:
+                encoded, content_type = made
+                thumbnails[key] = f"data:{content_type};base64,{base64.b64encode(encoded).decode('ascii')}"
+                thumbnail_cache.put(key, thumbnails[key])
+    return thumbnails
+
+def avatars_for(uids, inline=False, size=None):
+    """
+    Looks up the avatars of many users in one query.
+
+    Args:
+        uids (list): User uids.
+        inline (bool): Include a thumbnail data URI for each avatar.
+        size (int): Thumbnail width and height, defaults to AVATAR_THUMBNAIL_SIZE.
+
+    Returns:
+        tuple: ({uid: {'url': ..., 'thumbnail': ...}}, [uids not found]).  Users without a picture get the
+            default avatar, with 'default': True.
+    """
+    size = size or app.config['AVATAR_THUMBNAIL_SIZE']
+    rows = db.session.query(User._uid, User._pfp).filter(User._uid.in_(uids)).all() if uids else []
+    thumbnails = load_thumbnails([(uid, pfp) for uid, pfp in rows if pfp], size) if inline else {}
+    avatars = {}
+    default = get_asset('avatar')
+    for uid, pfp in rows:
+        if not pfp:
+            # The default avatar is small enough to inline as it is
+            avatars[uid] = {'url': default.url, 'default': True}
+            if inline:
+                avatars[uid]['thumbnail'] = default.data_uri
+            continue
+        avatar = {'url': avatar_url(uid, pfp)}
+        if inline:
+            avatar['thumbnail'] = thumbnails.get(thumbnail_key(uid, pfp, size))
+        avatars[uid] = avatar
+    return avatars, [uid for uid in uids if uid not in avatars]
@@ -0,0 +1,222 @@
+# blobstore.py
+import hashlib
+import logging
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from __init__ import app, db
+from model.scheduler import scheduled_job
+from model.storage import get_storage
+from model.imaging import CONTENT_TYPES, sniff_format
+
+"""
+Content-addressed storage for uploaded images.
+
+A blob is stored once under its SHA-256, at ab/cd/abcd... in the 'blobs' storage namespace (BLOB_FOLDER or
+S3, see model/storage.py), however many users upload it.
+Users reference blobs by hash in their pfp and car columns, so a new picture is a new URL and
+/uploads/blobs/<hash> can be cached forever.  The blobs table counts references: the User setters
+retain the new hash and release the old one, and blob_gc() deletes blobs nobody has referenced for
+BLOB_GC_GRACE_SECONDS.  The grace period covers a blob stored by an upload whose user row is not
+committed yet.  Stores write the row before the file and blob_gc() deletes the file before committing the row
+delete, so a blob being collected is never retained.  Older values in pfp and car are plain filenames under
+UPLOAD_FOLDER/<uid>/ and still work.
+"""
+
+BLOB_REF = re.compile(r'[0-9a-f]{64}')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Blob(db.Model):
+    """
+    Blob Model
+
+    One stored file and the number of references to it.
+
+    Attributes:
+        hash (db.Column): Hex SHA-256 of the content, the primary key.
+        size (db.Column): Size in bytes.
+        refcount (db.Column): Number of user columns pointing at the blob.
+        touched_at (db.Column): Last store, retain or release, garbage collection waits a grace period after it.
+    """
+    __tablename__ = 'blobs'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    touched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Garbage collection looks for unreferenced blobs
+    __table_args__ = (
+        db.Index('ix_blobs_refcount_touched_at', 'refcount', 'touched_at'),
+    )
+
+
+def is_blob_ref(value):
+    return bool(value) and BLOB_REF.fullmatch(value) is not None
+
+def blob_key(blob_hash):
+    """Sharded by the first two bytes of the hash, so no directory holds more than a few files."""
+    return f"{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}"
+
+def blob_url(blob_hash):
+    return f"/uploads/blobs/{blob_hash}"
+
+def sniff_content_type(head):
+    return CONTENT_TYPES.get(sniff_format(head), 'application/octet-stream')
+
+def _insert_row(blob_hash, size, refcount):
+    """Inserts a blob row in a savepoint, a concurrent insert of the same hash is fine."""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Blob.__table__).values(
+                hash=blob_hash, size=size, refcount=refcount, touched_at=datetime.utcnow()))
+        return True
+    except IntegrityError:
+        return False
+
+def _put_file(blob_hash, data):
+    get_storage('blobs').put(blob_key(blob_hash), data, content_type=sniff_content_type(data[:16]),
+                             cache_control=IMMUTABLE)
+
+def store_blob(data):
+    """
+    Stores content and makes sure it has a row, without adding a reference.  The caller assigns the hash
+    to a user column, which retains it, and commits.
+
+    Args:
+        data (bytes): The content.
+
+    Returns:
+        str: The hex SHA-256 of the content.
+    """
+    blob_hash = hashlib.sha256(data).hexdigest()
+    # Row before file: touching the row waits for a blob_gc deleting it, which removes the file before it commits
+    blobs = Blob.__table__
+    touched = db.session.execute(update(blobs).where(blobs.c.hash == blob_hash)
+                                 .values(touched_at=datetime.utcnow())).rowcount
+    if not touched:
+        _insert_row(blob_hash, len(data), 0)
+    storage = get_storage('blobs')
+    if not storage.exists(blob_key(blob_hash)):
+        _put_file(blob_hash, data)
+    return blob_hash
+
+def read_blob(blob_hash):
+    """
+    Returns:
+        bytes: The content, or None if the blob is missing.
+    """
+    return get_storage('blobs').read(blob_key(blob_hash))
+
+def retain(blob_hash):
+    blobs = Blob.__table__
+    retained = db.session.execute(update(blobs).where(blobs.c.hash == blob_hash)
+                                  .values(refcount=blobs.c.refcount + 1, touched_at=datetime.utcnow())).rowcount
+    if not retained:
+        # A reference restored from a backup, count it if the file is here
+        data = read_blob(blob_hash)
+        if not (data is not None and _insert_row(blob_hash, len(data), 1)):
+            logging.warning(f"Reference to unknown blob {blob_hash}")
+
+def release(blob_hash):
+    blobs = Blob.__table__
+    db.session.execute(update(blobs).where(blobs.c.hash == blob_hash, blobs.c.refcount > 0)
+                       .values(refcount=blobs.c.refcount - 1, touched_at=datetime.utcnow()))
+
+def swap_reference(old, new):
+    """
+    Moves a reference from one value of a user column to another.  Either may be a legacy filename or None.
+    """
+    if old == new:
+        return
+    if is_blob_ref(new):
+        retain(new)
+    if is_blob_ref(old):
+        release(old)
+
+
+def _referenced(hashes):
+    """Returns the hashes some user points at, in case a reference was stored without going through the setters."""
+    from model.user import User
+    return {value for row in db.session.execute(
+        select(User._pfp, User._car).where(or_(User._pfp.in_(hashes), User._car.in_(hashes)))) for value in row}
+
+def recount_references():
+    """
+    Recomputes every refcount from the users table, after a restore or a bulk update that bypassed the setters.
+
+    Returns:
+        int: Number of blobs whose count changed.
+    """
+    from model.user import User
+    counts = {}
+    for row in db.session.execute(select(User._pfp, User._car)):
+        for value in row:
+            if is_blob_ref(value):
+                counts[value] = counts.get(value, 0) + 1
+    changed = 0
+    for blob in Blob.query.yield_per(1000):
+        if blob.refcount != counts.get(blob.hash, 0):
+            blob.refcount = counts.get(blob.hash, 0)
+            changed += 1
+    db.session.commit()
+    return changed
+
+@scheduled_job('blob_gc', hours=24)
+def blob_gc(grace_seconds=None):
+    """
+    Deletes blobs that have been unreferenced for the grace period.
+
+    Each blob goes in its own transaction, which deletes the file before committing the row delete.  Until
+    then the row stays locked, so a concurrent retain() or store_blob() of the hash waits and afterwards
+    finds neither row nor file, instead of counting a reference to a file that is about to go.
+
+    Args:
+        grace_seconds (float): Defaults to BLOB_GC_GRACE_SECONDS.
+
+    Returns:
+        int: Number of blobs deleted.
+    """
+    if grace_seconds is None:
+        grace_seconds = app.config['BLOB_GC_GRACE_SECONDS']
+    blobs = Blob.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    deleted = 0
+    while True:
+        rows = db.session.execute(select(blobs.c.hash).where(blobs.c.refcount == 0, blobs.c.touched_at < cutoff)
+                                  .limit(500)).scalars().all()
+        db.session.commit()
+        if not rows:
+            break
+        referenced = _referenced(rows)
+        if referenced:
+            # Counts were off, fix them so these are not candidates again
+            recount_references()
+        for blob_hash in rows:
+            if blob_hash not in referenced and _delete_blob(blob_hash, cutoff):
+                deleted += 1
+    return deleted
+
+def _delete_blob(blob_hash, cutoff):
+    """Deletes one unreferenced blob, row and file, or neither.  Returns True if it was deleted."""
+    blobs = Blob.__table__
+    # Conditional delete, a blob retained since the select stays
+    if not db.session.execute(delete(blobs).where(
+            blobs.c.hash == blob_hash, blobs.c.refcount == 0, blobs.c.touched_at < cutoff)).rowcount:
+        db.session.commit()
+        return False
+    storage = get_storage('blobs')
+    data = storage.read(blob_key(blob_hash))
+    storage.delete(blob_key(blob_hash))
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # The row is back, so is its file
+        if data is not None:
+            _put_file(blob_hash, data)
+        raise
+    return True
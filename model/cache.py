@@ -0,0 +1,483 @@
+# cache.py
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from __init__ import app
+
+"""
+A cache shared by every worker, for read results that are slow to build and read far more often than they
+change.  An in-process cache would be copied per gunicorn worker, each missing on its own, and nothing would
+tell the other workers when the data changed.
+
+- sqlite: a file at CACHE_PATH, memory-mapped, shared by the workers on one host.  The default.
+- redis: any Redis compatible server at REDIS_URL, shared by every host.  Needs the redis package.
+- none: nothing is cached.
+
+Entries expire after their TTL, and carry tags naming what they were built from, e.g. 'channel:42' or
+'user:7'.  A write calls invalidate_on_commit() with the same tags, and every entry with one of them is
+dropped once the transaction commits.  Every invalidation also gets the next number of a sequence, recorded
+against its tags: a result is built after reading the sequence, and is not stored if one of its tags was
+invalidated since, as it may have been read before the commit.  The sqlite driver evicts the least recently used entries beyond
+CACHE_MAX_ENTRIES or CACHE_MAX_BYTES, Redis does it itself with a maxmemory-policy of allkeys-lru.
+
+Values are pickled, so only point CACHE_BACKEND at a store the app alone can write to.  A cache that fails
+is logged and skipped, a request never fails because of it.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+# The tag clear() invalidates, every set() checks it
+ALL_TAGS = '*'
+
+# Tag versions are kept this long, a build running longer may store a result invalidated while it ran
+VERSION_SECONDS = 600
+
+
+class CacheDriver:
+    """
+    Interface of a cache driver.  Keys and tags are strings, values are bytes.
+    """
+    def get(self, key):
+        """
+        Returns:
+            bytes: The value, or None if it is missing or expired.
+        """
+        raise NotImplementedError
+
+    def sequence(self):
+        """
+        Returns:
+            int: The number of the last invalidation, for set(since=).
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        """
+        Stores a value for ttl seconds, replacing any value and tags the key had.
+
+        Args:
+            since (int): A sequence() read before the value was built.  Nothing is stored if one of the tags
+                was invalidated after it.
+
+        Returns:
+            bool: True if the value was stored.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        """
+        Deletes every entry carrying one of the tags.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheDriver):
+    """CACHE_BACKEND=none, every get misses."""
+    def get(self, key):
+        return None
+
+    def sequence(self):
+        return 0
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        return False
+
+    def delete(self, key):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SqliteCache(CacheDriver):
+    """
+    Entries in a SQLite file in WAL mode, so workers read it at the same time as one writes.  Reads go through
+    a memory map of the file, pages the workers share through the OS page cache.
+
+    Every EVICT_INTERVAL sets in a process, expired entries are deleted, then the least recently used ones
+    until the cache is back under 90% of its limits.  The last access time is written at most once every
+    TOUCH_SECONDS per entry, so a hit does not always write.
+    """
+    EVICT_INTERVAL = 64
+    TOUCH_SECONDS = 30
+    MMAP_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create()
+
+    def _connection(self):
+        # One connection per thread, and none carried over a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=15, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={self.MMAP_BYTES}")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _create(self):
+        connection = self._connection()
+        connection.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+            expires REAL NOT NULL, accessed REAL NOT NULL)""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS cache_tags (
+            key TEXT NOT NULL REFERENCES cache_entries(key) ON DELETE CASCADE, tag TEXT NOT NULL,
+            PRIMARY KEY (key, tag))""")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_tags_tag ON cache_tags (tag)")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed)")
+        # The invalidation sequence, and the number of the last invalidation of each tag
+        connection.execute("""CREATE TABLE IF NOT EXISTS cache_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)""")
+        connection.execute("INSERT OR IGNORE INTO cache_sequence (id, value) VALUES (0, 0)")
+        connection.execute("""CREATE TABLE IF NOT EXISTS cache_tag_versions (
+            tag TEXT PRIMARY KEY, version INTEGER NOT NULL, invalidated REAL NOT NULL)""")
+
+    def get(self, key):
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute("SELECT value, expires, accessed FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None  # expired entries are deleted by the next eviction
+        if row[2] < now - self.TOUCH_SECONDS:
+            connection.execute("UPDATE cache_entries SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def sequence(self):
+        return self._connection().execute("SELECT value FROM cache_sequence WHERE id = 0").fetchone()[0]
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        now = time.time()
+        tags = set(tags)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if since is not None:
+                checked = [*tags, ALL_TAGS]
+                placeholders = ', '.join('?' * len(checked))
+                if connection.execute(f"SELECT 1 FROM cache_tag_versions WHERE tag IN ({placeholders}) AND version > ? "
+                                      f"LIMIT 1", (*checked, since)).fetchone():
+                    connection.execute("ROLLBACK")
+                    return False
+            connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            connection.execute("INSERT INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                               (key, value, len(value), now + ttl, now))
+            connection.executemany("INSERT INTO cache_tags (key, tag) VALUES (?, ?)", [(key, tag) for tag in tags])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._sets += 1
+        if self._sets % self.EVICT_INTERVAL == 0:
+            self.evict()
+        return True
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def _bump(self, connection, tags):
+        """Takes the next sequence number for the tags, inside the caller's transaction."""
+        connection.execute("UPDATE cache_sequence SET value = value + 1 WHERE id = 0")
+        version = connection.execute("SELECT value FROM cache_sequence WHERE id = 0").fetchone()[0]
+        connection.executemany("INSERT INTO cache_tag_versions (tag, version, invalidated) VALUES (?, ?, ?) "
+                               "ON CONFLICT (tag) DO UPDATE SET version = excluded.version, "
+                               "invalidated = excluded.invalidated", [(tag, version, time.time()) for tag in tags])
+
+    def invalidate(self, tags):
+        tags = list(set(tags))
+        if not tags:
+            return
+        placeholders = ', '.join('?' * len(tags))
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._bump(connection, tags)
+            connection.execute(f"DELETE FROM cache_entries WHERE key IN "
+                               f"(SELECT key FROM cache_tags WHERE tag IN ({placeholders}))", tags)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._bump(connection, [ALL_TAGS])
+            connection.execute("DELETE FROM cache_entries")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def evict(self):
+        """
+        Deletes expired entries, then the least recently used ones while the cache is over its limits.  Also
+        forgets tag versions older than VERSION_SECONDS.
+
+        Returns:
+            int: Entries deleted.
+        """
+        connection = self._connection()
+        connection.execute("DELETE FROM cache_tag_versions WHERE invalidated < ?", (time.time() - VERSION_SECONDS,))
+        deleted = connection.execute("DELETE FROM cache_entries WHERE expires <= ?", (time.time(),)).rowcount
+        count, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return deleted
+        # Down to 90%, so the next few sets do not evict again
+        excess_entries = count - self.max_entries * 9 // 10
+        excess_bytes = size - self.max_bytes * 9 // 10
+        victims = []
+        for key, entry_size in connection.execute("SELECT key, size FROM cache_entries ORDER BY accessed"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            victims.append((key,))
+            excess_entries -= 1
+            excess_bytes -= entry_size
+        connection.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+        return deleted + len(victims)
+
+
+class RedisCache(CacheDriver):
+    """
+    Entries as Redis strings with an expiry, and a set of keys per tag.  Tag sets expire with the longest
+    lived entry added to them, EXPIRE NX and GT need Redis 7.  The invalidation sequence is a counter, and
+    the version of a tag a string that a set(since=) WATCHes.
+    """
+    def __init__(self, url, prefix):
+        import redis  # Optional dependency, only needed for CACHE_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def _tag(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    def _version(self, tag):
+        return f"{self.prefix}version:{tag}"
+
+    @property
+    def _sequence(self):
+        return f"{self.prefix}sequence"
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def sequence(self):
+        return int(self.client.get(self._sequence) or 0)
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        ttl = max(1, int(ttl))
+        tags = set(tags)
+        with self.client.pipeline() as pipe:
+            try:
+                if since is not None:
+                    # An invalidation between the check and the write fails the EXEC
+                    versions = [self._version(tag) for tag in (*tags, ALL_TAGS)]
+                    pipe.watch(*versions)
+                    if any(int(version) > since for version in pipe.mget(versions) if version is not None):
+                        return False
+                    pipe.multi()
+                pipe.set(self._key(key), value, ex=ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag(tag), self._key(key))
+                    pipe.expire(self._tag(tag), ttl, nx=True)
+                    pipe.expire(self._tag(tag), ttl, gt=True)
+                pipe.execute()
+            except self._watch_error:
+                return False
+        return True
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def _bump(self, pipe, tags):
+        version = self.client.incr(self._sequence)
+        for tag in tags:
+            pipe.set(self._version(tag), version, ex=VERSION_SECONDS)
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        if not tags:
+            return
+        # Versions first, a set() that did not see them has added its key to the tag sets read below
+        pipe = self.client.pipeline()
+        self._bump(pipe, tags)
+        for tag in tags:
+            pipe.smembers(self._tag(tag))
+        keys = set().union(*pipe.execute()[len(tags):])
+        self.client.delete(*keys, *(self._tag(tag) for tag in tags))
+
+    def clear(self):
+        pipe = self.client.pipeline()
+        self._bump(pipe, [ALL_TAGS])
+        pipe.execute()
+        # The sequence and versions stay, builds already running check them
+        kept = f"{self.prefix}version:"
+        keys = [key for key in self.client.scan_iter(match=f"{self.prefix}*", count=1000)
+                if key != self._sequence.encode() and not key.startswith(kept.encode())]
+        for i in range(0, len(keys), 1000):
+            self.client.delete(*keys[i:i + 1000])
+
+
+_driver = None
+_driver_lock = threading.Lock()
+
+def get_cache():
+    """
+    Returns the configured cache driver.
+    """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                backend = app.config['CACHE_BACKEND']
+                if backend == 'sqlite':
+                    _driver = SqliteCache(app.config['CACHE_PATH'], app.config['CACHE_MAX_ENTRIES'],
+                                          app.config['CACHE_MAX_BYTES'])
+                elif backend == 'redis':
+                    _driver = RedisCache(app.config['REDIS_URL'], app.config['CACHE_PREFIX'])
+                elif backend == 'none':
+                    _driver = NullCache()
+                else:
+                    raise ValueError(f"Unknown CACHE_BACKEND {backend}")
+    return _driver
+
+
+""" Reading through the cache """
+
+# Tags added with cache_tags() by the cached functions running in this context, innermost last
+_building = contextvars.ContextVar('cache_building', default=())
+
+def cache_tags(*tags):
+    """
+    Adds tags to the result a @cached function is building, for tags only known from the data it read, e.g.
+    the authors of a page of posts.  Outer @cached functions get them too.  Does nothing outside one.
+    """
+    building = _building.get()
+    if building:
+        building[-1].update(tags)
+
+def cached(key, tags=(), ttl=None):
+    """
+    Decorator caching a function's result in the shared cache.  Results must be picklable, and None is not
+    cached, nor is a result one of whose tags is invalidated while it is built.
+
+    Args:
+        key (str): Template of the cache key, formatted with the function's arguments by name,
+            e.g. 'ranked_posts:{channel_id}:{sort}'.  Prefixed with the function's module and name.
+        tags (list): Templates of the tags of the result, formatted the same way, e.g. ['channel:{channel_id}'].
+        ttl (int): Seconds the result may be served, defaults to CACHE_DEFAULT_TTL.
+
+    The wrapped function has a .uncached attribute, the original function.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        prefix = f"{func.__module__}.{func.__qualname__}:"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = prefix + key.format(**bound.arguments)
+            cache = get_cache()
+            try:
+                data = cache.get(cache_key)
+                # Read before building, a tag invalidated after it may have changed what the function reads
+                since = cache.sequence() if data is None else None
+            except Exception:
+                logger.exception("Cache read failed for %s", cache_key)
+                data = since = None
+            building = _building.get()
+            if data is not None:
+                result_tags, result = pickle.loads(data)
+                if building:
+                    building[-1].update(result_tags)
+                return result
+
+            result_tags = {tag.format(**bound.arguments) for tag in tags}
+            token = _building.set(building + (result_tags,))
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _building.reset(token)
+            if building:
+                building[-1].update(result_tags)
+            if result is not None and since is not None:
+                try:
+                    # The tags go with the value, for an outer @cached function that hits this entry
+                    cache.set(cache_key, pickle.dumps((result_tags, result), pickle.HIGHEST_PROTOCOL),
+                              ttl or app.config['CACHE_DEFAULT_TTL'], result_tags, since=since)
+                except Exception:
+                    logger.exception("Cache write failed for %s", cache_key)
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+""" Invalidation, after the writes are committed """
+
+def invalidate(*tags):
+    """
+    Drops every entry carrying one of the tags, now.  Writes in a transaction use invalidate_on_commit().
+    """
+    try:
+        get_cache().invalidate(tags)
+    except Exception:
+        # Entries left behind are served until their TTL runs out
+        logger.exception("Cache invalidation failed for %s", ', '.join(tags))
+
+def invalidate_on_commit(session, *tags):
+    """
+    Drops every entry carrying one of the tags once the session commits, nothing if it rolls back.  Called
+    from ORM events, with object_session(target).  Invalidating before the commit would let another worker
+    cache the old rows again before the new ones are visible.
+    """
+    if session is None:
+        invalidate(*tags)
+    else:
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate(*tags)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('cache_tags', None)
@@ -1,13 +1,14 @@
 import base64
-import os
 from werkzeug.utils import secure_filename
 from __init__ import app
+from model.blobstore import is_blob_ref, read_blob
+from model.storage import get_storage
+from model.imaging import reencode_image
+from model.assets import get_asset
 
 def default_car_decode():
-        img_path = f"{app.config['UPLOAD_FOLDER']}/no_car.jpg"
-        with open(img_path, 'rb') as img_file:
-            base64_encoded = base64.b64encode(img_file.read()).decode('utf-8')
-        return base64_encoded
+    """Returns the default car picture base64 encoded, encoded once at startup in model/assets.py."""
+    return get_asset('car').base64
 
 def car_base64_decode(user_id, user_car):
     """
@@ -23,10 +24,17 @@ def car_base64_decode(user_id, user_car):
     Returns:
     - str: The base64 encoded image if the user has a car picture; otherwise, None.
     """
-    img_path = os.path.join(app.config['UPLOAD_FOLDER'], user_id, user_car)
     try:
-        with open(img_path, 'rb') as img_file:
-            base64_encoded = base64.b64encode(img_file.read()).decode('utf-8')
+        if is_blob_ref(user_car):
+            image_data = read_blob(user_car)
+            if image_data is None:
+                raise FileNotFoundError(f'blob {user_car}')
+        else:
+            # Saved before the blob store, in the user's upload directory
+            image_data = get_storage('uploads').read(f'{user_id}/{user_car}')
+            if image_data is None:
+                raise FileNotFoundError(f'{user_id}/{user_car}')
+        base64_encoded = base64.b64encode(image_data).decode('utf-8')
         return base64_encoded
     except Exception as e:
         print(f'An error occurred while reading the car picture: {str(e)}')
@@ -48,14 +56,10 @@ def car_base64_upload(base64_image, user_uid):
     - str: The filename of the saved image if the upload is successful; otherwise, None.
     """
     try:
-        image_data = base64.b64decode(base64_image)
-        filename = secure_filename(f'{user_uid}_car.png')
-        user_dir = os.path.join(app.config['UPLOAD_FOLDER'], user_uid)
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        file_path = os.path.join(user_dir, filename)
-        with open(file_path, 'wb') as img_file:
-            img_file.write(image_data)
+        # Validated and re-encoded, the extension follows the stored format
+        image_data, content_type, extension = reencode_image(base64.b64decode(base64_image))
+        filename = secure_filename(f'{user_uid}_car{extension}')
+        get_storage('uploads').put(f'{user_uid}/{filename}', image_data, content_type=content_type)
         return filename 
     except Exception as e:
         print (f'An error occurred while updating the car picture: {str(e)}')
@@ -75,10 +79,11 @@ def car_file_delete(user_uid, filename):
     Returns:
     - bool: True if the file was deleted successfully; otherwise, False.
     """
+    if is_blob_ref(filename):
+        # Blobs may be shared, they are deleted by blob_gc once no user references them
+        return True
     try:
-        img_path = os.path.join(app.config['UPLOAD_FOLDER'], user_uid, filename)
-        if os.path.exists(img_path):
-            os.remove(img_path)
+        get_storage('uploads').delete(f'{user_uid}/{filename}')
         # Success is when the file does not exist after calling this function
         return True 
     except Exception as e:
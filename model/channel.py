@@ -184,8 +184,8 @@ def initChannels():
         
         #P3 Channels Below
          # Share and Care channels below:
-        DNHSCafe = Group.query.filter_by(_name='Study Room').first()
-        chess_forum = Group.query.filter_by(_name='Chess Forum').first()
+        DNHSCafe = Group.query.filter_by(_name='DNHS Cafe').first()
+        chess_forum = Group.query.filter_by(_name='Chess Champion').first()
         Underground_Music = Group.query.filter_by(_name='Underground Music').first()
         share_and_care_channels = [
             Channel(name='Math', group_id=DNHSCafe.id),
@@ -29,7 +29,8 @@ class Group(db.Model):
     _section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
 
     channels = db.relationship('Channel', backref='group', lazy=True)
-    moderators = db.relationship('User', secondary=group_moderators, lazy='subquery',
+    # Loaded when used, listings ask for them with selectinload
+    moderators = db.relationship('User', secondary=group_moderators, lazy='select',
                                  backref=db.backref('moderated_groups', lazy=True))
     
     def __init__(self, name, section_id, moderators=None):
@@ -0,0 +1,266 @@
+# imaging.py
+import base64
+import binascii
+import io
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from __init__ import app
+
+"""
+Validation and re-encoding of uploaded images, before they are stored.
+
+An upload is accepted only if its bytes are one of the formats in UPLOAD_EXTENSIONS, whatever its name or
+base64 prefix says.  It is decoded with a pixel limit against decompression bombs, rotated by its EXIF
+orientation, shrunk to fit IMAGE_MAX_DIMENSION, and saved again without metadata (EXIF, GPS, comments)
+as an optimized PNG when it has transparency, JPEG otherwise, or WebP with IMAGE_FORMAT=webp.  Lossy
+images are saved at lower quality, then smaller, until they fit in IMAGE_MAX_BYTES.
+
+Decoding and encoding are CPU bound and hold the GIL, so they run in a pool of IMAGE_POOL_SIZE processes.
+Pillow is imported by the functions that decode, not at startup.
+"""
+
+class ImageError(ValueError):
+    """Raised for uploads that are not an accepted image."""
+
+
+# Leading bytes of the formats Pillow is asked to decode
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+
+EXTENSION_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.gif': 'GIF', '.webp': 'WEBP'}
+FORMAT_EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'GIF': '.gif', 'WEBP': '.webp'}
+CONTENT_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+
+def sniff_format(head):
+    """
+    Args:
+        head (bytes): The first bytes of a file, 12 are enough.
+
+    Returns:
+        str: 'PNG', 'JPEG', 'GIF' or 'WEBP', or None for anything else.
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for magic, image_format in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return image_format
+    return None
+
+def allowed_formats():
+    return {EXTENSION_FORMATS[ext] for ext in app.config['UPLOAD_EXTENSIONS'] if ext in EXTENSION_FORMATS}
+
+def check_format(head):
+    """
+    Returns:
+        str: The sniffed format of an upload.
+
+    Raises:
+        ImageError: If it is not one of UPLOAD_EXTENSIONS.
+    """
+    image_format = sniff_format(head)
+    if image_format not in allowed_formats():
+        allowed = ', '.join(sorted(app.config['UPLOAD_EXTENSIONS']))
+        raise ImageError(f"Unsupported image type, expected one of {allowed}")
+    return image_format
+
+def check_base64_format(base64_image):
+    """
+    Checks the format of a base64 upload from its first bytes, so a request can be refused before
+    the whole image is decoded.
+
+    Raises:
+        ImageError: If it is not base64 or not one of UPLOAD_EXTENSIONS.
+    """
+    try:
+        head = base64.b64decode(base64_image[:24], validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise ImageError("Image data is not base64")
+    return check_format(head)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+def _encode(image, output_format, quality):
+    out = io.BytesIO()
+    if output_format == 'JPEG':
+        image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif output_format == 'WEBP':
+        image.save(out, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+def _open(data, settings, max_dimension):
+    """Decodes an image within the pixel limit, upright, at least max_dimension on each side where it can."""
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = settings['max_pixels']
+    with warnings.catch_warnings():
+        # Pillow only warns between MAX_IMAGE_PIXELS and twice that, refuse those too
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(data))
+            if image.format not in settings['formats']:
+                raise ImageError(f"Unsupported image type {image.format}")
+            width, height = image.size
+            if width * height > settings['max_pixels']:
+                raise ImageError(f"Image is too large, {width}x{height} pixels")
+            # JPEG can decode straight to a reduced size, much faster than decoding all of a phone photo
+            image.draft('RGB', (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(image)  # EXIF is dropped below, keep the orientation it gave
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+            raise ImageError(f"Image is too large: {e}")
+        except (OSError, SyntaxError) as e:
+            raise ImageError(f"Could not decode image: {e}")
+    return image
+
+def _reencode(data, settings):
+    """
+    Decodes, shrinks and re-encodes one image.  Runs in a pool process, so it only uses its arguments.
+
+    Returns:
+        tuple: (bytes, format)
+    """
+    from PIL import Image
+    max_dimension = settings['max_dimension']
+    image = _open(data, settings, max_dimension)
+    alpha = _has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')  # first frame of an animation, palettes expanded
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    output_format = settings['format']
+    if output_format == 'auto':
+        output_format = 'PNG' if alpha else 'JPEG'
+    if output_format == 'JPEG' and alpha:
+        output_format = 'PNG'
+
+    quality = settings['quality']
+    encoded = _encode(image, output_format, quality)
+    while len(encoded) > settings['max_bytes']:
+        if output_format != 'PNG' and quality > 50:
+            quality -= 10
+        elif min(image.size) > 64:
+            image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+        else:
+            break
+        encoded = _encode(image, output_format, quality)
+    return encoded, output_format
+
+def _thumbnail(data, settings, size):
+    """
+    Returns:
+        tuple: (bytes, format) of an image at most size pixels on each side.
+    """
+    from PIL import Image
+    image = _open(data, settings, size)
+    alpha = _has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    image.thumbnail((size, size), Image.LANCZOS)
+    output_format = 'PNG' if alpha else 'JPEG'
+    return _encode(image, output_format, 80), output_format
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool, _pool_pid
+    size = app.config['IMAGE_POOL_SIZE']
+    if size <= 0:
+        return None
+    # A pool does not survive fork, e.g. jobs_worker --processes
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # spawn, forking a process with running threads can copy a held lock
+                _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context('spawn'))
+                _pool_pid = os.getpid()
+    return _pool
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def reencode_image(data):
+    """
+    Validates an upload and re-encodes it for storage.
+
+    Args:
+        data (bytes): The uploaded file.
+
+    Returns:
+        tuple: (bytes, content_type, extension) of the image to store.
+
+    Raises:
+        ImageError: If the upload is not an accepted image, too large, or could not be processed.
+    """
+    check_format(data[:16])
+    settings = _settings()
+    encoded, output_format = _run(_reencode, data, settings)
+    return encoded, CONTENT_TYPES[output_format], FORMAT_EXTENSIONS[output_format]
+
+def make_thumbnails(images, size):
+    """
+    Shrinks several images at once, in parallel across the pool.
+
+    Returns:
+        list: (bytes, content_type) per image, None for images that could not be decoded.
+    """
+    settings = _settings()
+    pool = _get_pool()
+    if pool is None:
+        futures = None
+    else:
+        futures = [pool.submit(_thumbnail, data, settings, size) for data in images]
+    thumbnails = []
+    for i, data in enumerate(images):
+        try:
+            if futures is None:
+                encoded, output_format = _thumbnail(data, settings, size)
+            else:
+                encoded, output_format = futures[i].result(timeout=app.config['IMAGE_TIMEOUT_SECONDS'])
+            thumbnails.append((encoded, CONTENT_TYPES[output_format]))
+        except (ImageError, TimeoutError):
+            thumbnails.append(None)
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            thumbnails.append(None)
+    return thumbnails
+
+def _settings():
+    return {
+        'formats': allowed_formats(),
+        'format': app.config['IMAGE_FORMAT'].upper() if app.config['IMAGE_FORMAT'] != 'auto' else 'auto',
+        'max_dimension': app.config['IMAGE_MAX_DIMENSION'],
+        'max_pixels': app.config['IMAGE_MAX_PIXELS'],
+        'max_bytes': app.config['IMAGE_MAX_BYTES'],
+        'quality': app.config['IMAGE_QUALITY'],
+    }
+
+def _run(func, *args):
+    """Runs func in the pool, or here with IMAGE_POOL_SIZE=0."""
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    future = pool.submit(func, *args)
+    try:
+        return future.result(timeout=app.config['IMAGE_TIMEOUT_SECONDS'])
+    except TimeoutError:
+        future.cancel()
+        raise ImageError("Image took too long to process")
+    except BrokenProcessPool:
+        # A worker died, likely out of memory on a hostile image
+        _reset_pool(pool)
+        raise ImageError("Image could not be processed")
@@ -0,0 +1,394 @@
+# jobs.py
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import IntegrityError
+from __init__ import app, db
+from model.scheduler import scheduled_job
+
+"""
+A job queue in the database, for write-side work too slow to do inside a request.
+
+A request calls enqueue() and answers 202 with the job id, the client follows GET /api/jobs/<id>.
+Handlers are registered with @job_handler and receive the job's JSON payload as keyword arguments.
+Any worker can claim a queued job: it picks the oldest due job and claims it with a compare-and-set
+UPDATE on the status, so a job runs on one worker even when several poll at once.  A failed job is
+retried with exponential backoff up to max_attempts, a handler raises JobError for failures not worth
+retrying.  A job left running by a worker that died is queued again after JOB_LEASE_SECONDS.  Long handlers
+call save_progress() as they go, which renews the lease and lets a retry resume where the last run stopped,
+and a run whose lease was taken over records nothing.
+
+JOB_QUEUE_MODE picks who runs jobs:
+- thread: a background thread in each web worker, started with the worker, nothing else to deploy.
+- worker: only `flask custom jobs_worker` processes, the web workers just enqueue.
+- inline: in the request that enqueues it, the old behavior, for debugging.
+"""
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# kind -> function
+HANDLERS = {}
+
+def job_handler(kind):
+    """
+    Registers a function to run jobs of a kind.
+
+    Args:
+        kind (str): The job kind passed to enqueue().
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class JobError(Exception):
+    """Raised by a handler when a job cannot succeed, so it fails without retrying."""
+
+
+class LeaseLost(JobError):
+    """Raised by save_progress() when the lease expired and the job may be running on another worker."""
+
+
+class Job(db.Model):
+    """
+    Job Model
+
+    One unit of background work and its outcome.
+
+    Attributes:
+        id (db.Column): The primary key, the id clients poll.
+        kind (db.Column): The handler name.
+        payload (db.Column): JSON keyword arguments for the handler, references to stored data rather than the data.
+        status (db.Column): 'queued', 'running', 'done' or 'failed'.
+        attempts (db.Column): Runs started so far.
+        max_attempts (db.Column): Runs allowed before the job fails.
+        run_after (db.Column): When the job is due, later after a failed attempt.
+        idempotency_key (db.Column): Optional unique key, enqueueing it again returns the existing job.
+        user_id (db.Column): The user who asked for the job, who may read its status.
+        locked_by (db.Column): The worker running the job.
+        locked_at (db.Column): When that worker claimed it.
+        result (db.Column): JSON returned by the handler, or saved by save_progress() while it runs.
+        error (db.Column): The last error.
+        created_at (db.Column): When the job was enqueued.
+        finished_at (db.Column): When the job was done or failed.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text().with_variant(mysql.LONGTEXT(), 'mysql'), nullable=False)  # TEXT stops at 64 KB
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(255), nullable=True, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    locked_by = db.Column(db.String(255), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Workers look for the oldest due job in a status
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    def read(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def enqueue(kind, payload, idempotency_key=None, user_id=None, max_attempts=None):
+    """
+    Adds a job to the queue and commits the session, along with any changes already in it.
+
+    Args:
+        kind (str): A kind registered with @job_handler.
+        payload (dict): JSON serializable keyword arguments for the handler.
+        idempotency_key (str): Optional, unique across all jobs, so callers scope it (e.g. by user).
+        user_id (int): The user who may read the job's status.
+        max_attempts (int): Defaults to JOB_MAX_ATTEMPTS.
+
+    Returns:
+        Job: The new job, or the existing one with the same idempotency key.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler for job kind {kind}")
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+    job = Job(kind=kind, payload=json.dumps(payload), idempotency_key=idempotency_key, user_id=user_id,
+              max_attempts=max_attempts or app.config['JOB_MAX_ATTEMPTS'])
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Same key enqueued by a concurrent request
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first() if idempotency_key else None
+        if existing is None:
+            raise
+        return existing
+
+    mode = app.config['JOB_QUEUE_MODE']
+    if mode == 'inline':
+        run_job(job.id, worker_id())
+        db.session.refresh(job)
+    elif mode == 'thread':
+        job_runner.notify()
+    return job
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def requeue_stale_jobs():
+    """
+    Queues again the jobs whose worker has held them longer than JOB_LEASE_SECONDS.
+
+    Returns:
+        int: Number of jobs queued again.
+    """
+    jobs = Job.__table__
+    expired = datetime.utcnow() - timedelta(seconds=app.config['JOB_LEASE_SECONDS'])
+    count = db.session.execute(update(jobs).where(jobs.c.status == RUNNING, jobs.c.locked_at < expired)
+                               .values(status=QUEUED, locked_by=None, locked_at=None)).rowcount
+    db.session.commit()
+    return count
+
+def claim_next(owner):
+    """
+    Claims the oldest due job.
+
+    Returns:
+        int: The claimed job's id, or None when nothing is due.
+    """
+    jobs = Job.__table__
+    for _ in range(5):
+        now = datetime.utcnow()
+        job_id = db.session.execute(
+            select(jobs.c.id).where(jobs.c.status == QUEUED, jobs.c.run_after <= now)
+            .order_by(jobs.c.run_after, jobs.c.id).limit(1)).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(jobs).where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+            .values(status=RUNNING, locked_by=owner, locked_at=now, attempts=jobs.c.attempts + 1)).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+        # Another worker took it first, try the next one
+    return None
+
+# The job this thread runs, (job id, owner, progress saved by an earlier run), for save_progress()
+_running = threading.local()
+
+def job_progress():
+    """
+    Returns:
+        The progress the running job saved with save_progress() on an earlier attempt, or None.
+    """
+    running = getattr(_running, 'job', None)
+    return running[2] if running else None
+
+def save_progress(progress):
+    """
+    Records the running job's progress as its result and renews its lease, in the session's transaction, so
+    it commits with the handler's next commit: write the progress that includes a change before committing
+    the change, and a retry neither repeats nor misses it.
+
+    Args:
+        progress: JSON serializable, what job_progress() returns to a retry.
+
+    Raises:
+        LeaseLost: The lease expired, another worker may have claimed the job.
+    """
+    job_id, owner, _ = _running.job
+    jobs = Job.__table__
+    renewed = db.session.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == RUNNING,
+                                                    jobs.c.locked_by == owner)
+                                 .values(result=json.dumps(progress), locked_at=datetime.utcnow())).rowcount
+    if not renewed:
+        db.session.rollback()
+        raise LeaseLost(f"Job {job_id} is no longer held by {owner}")
+
+def run_job(job_id, owner):
+    """
+    Runs a claimed job and records the outcome.  A queued job is claimed first, as in inline mode.
+    The outcome is only recorded while owner still holds the job.
+
+    Returns:
+        Job: The job after the run.
+    """
+    jobs = Job.__table__
+    db.session.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+                       .values(status=RUNNING, locked_by=owner, locked_at=datetime.utcnow(), attempts=jobs.c.attempts + 1))
+    db.session.commit()
+    job = db.session.get(Job, job_id, populate_existing=True)
+    if job is None or job.status != RUNNING or job.locked_by != owner:
+        return job
+    kind, attempts, max_attempts = job.kind, job.attempts, job.max_attempts
+
+    handler = HANDLERS.get(kind)
+    _running.job = (job_id, owner, json.loads(job.result) if job.result else None)
+    try:
+        if handler is None:
+            raise JobError(f"No handler for job kind {kind}")
+        result = handler(**json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        values = {'error': f"{type(e).__name__}: {e}"}
+        if isinstance(e, JobError) or attempts >= max_attempts:
+            values.update(status=FAILED, finished_at=datetime.utcnow())
+            logging.warning(f"Job {job_id} ({kind}) failed: {traceback.format_exc()}")
+        else:
+            values.update(status=QUEUED, run_after=datetime.utcnow() + timedelta(
+                seconds=app.config['JOB_RETRY_SECONDS'] * 2 ** (attempts - 1)))
+    else:
+        values = {'status': DONE, 'finished_at': datetime.utcnow(), 'error': None,
+                  'result': json.dumps(result) if result is not None else None}
+    finally:
+        _running.job = None
+    # Only while the lease is ours, a worker that took over a stale job owns its outcome
+    recorded = db.session.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == RUNNING,
+                                                     jobs.c.locked_by == owner)
+                                  .values(locked_by=None, locked_at=None, **values)).rowcount
+    db.session.commit()
+    if not recorded:
+        logging.warning(f"Job {job_id} ({kind}) lost its lease to another worker, its outcome is not recorded")
+    return db.session.get(Job, job_id, populate_existing=True)
+
+def work(burst=False, stop=None):
+    """
+    Runs jobs until stopped, or in burst mode until none are due.
+
+    Args:
+        burst (bool): Return once the queue has no due jobs.
+        stop (threading.Event): Optional, set to stop between jobs.
+
+    Returns:
+        int: Number of jobs run.
+    """
+    stop = stop or threading.Event()
+    count = 0
+    owner = worker_id()
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                requeue_stale_jobs()
+                job_id = claim_next(owner)
+                if job_id is not None:
+                    run_job(job_id, owner)
+                    count += 1
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                logging.warning(f"Job worker error: {e}")
+            if burst:
+                break
+            stop.wait(app.config['JOB_POLL_SECONDS'])
+    return count
+
+def _work_in_child(burst):
+    # Connections inherited from the parent must not be used by the child
+    with app.app_context():
+        db.engine.dispose(close=False)
+    work(burst=burst)
+
+def run_workers(processes=1, burst=False):
+    """
+    Runs job workers, in this process or in forked child processes.  Used by `flask custom jobs_worker`.
+    """
+    # Importing the modules that define handlers registers them
+    import model.user  # noqa: F401
+    if processes <= 1:
+        return work(burst=burst)
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_work_in_child, args=(burst,), name=f'jobs-worker-{i}') for i in range(processes)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+
+class JobRunner:
+    """
+    Runs jobs on a background thread of a web worker, the 'thread' JOB_QUEUE_MODE.
+
+    The thread starts with the worker, see start_job_runner(), so jobs queued before a restart or by
+    other workers run without waiting for this worker to enqueue one.  enqueue() wakes it, it runs every
+    due job and then polls every JOB_POLL_SECONDS.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        self._wake.set()
+        self.start()
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='jobs', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            work(burst=True)
+            self._wake.wait(app.config['JOB_POLL_SECONDS'])
+
+job_runner = JobRunner()
+
+def start_job_runner():
+    """
+    Starts the job thread in this process when JOB_QUEUE_MODE is 'thread'.  Called by gunicorn's
+    post_worker_init hook and by main.py when running the development server.
+
+    Returns:
+        JobRunner: The runner, or None in the other modes.
+    """
+    if app.config['JOB_QUEUE_MODE'] != 'thread':
+        return None
+    # Importing the modules that define handlers registers them
+    import model.user  # noqa: F401
+    job_runner.start()
+    return job_runner
+
+
+@scheduled_job('jobs_cleanup', hours=1)
+def delete_finished_jobs():
+    """
+    Deletes done and failed jobs older than JOB_RETENTION_HOURS, with their payloads.
+    """
+    jobs = Job.__table__
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['JOB_RETENTION_HOURS'])
+    db.session.execute(delete(jobs).where(jobs.c.status.in_([DONE, FAILED]), jobs.c.finished_at < cutoff))
+    db.session.commit()
@@ -0,0 +1,283 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from __init__ import app, db
+
+REWARD_FACTOR = 10  # Points per correct answer
+
+class RiddleLeaderboardEntry(db.Model):
+    """
+    RiddleLeaderboardEntry Model
+    Represents a single entry in the leaderboard, tracking user points for correctly answering riddles.
+
+    Attributes:
+        id (db.Column): Primary key representing the unique identifier for the leaderboard entry.
+        user_id (db.Column): Foreign key ID of the user associated with this entry, one entry per user.
+        correct_answers (db.Column): Integer count of correct riddle answers by the user.
+        total_attempts (db.Column): Integer count of all attempts made by the user.
+        points (db.Column): Calculated points for the user on the leaderboard.
+        last_updated (db.Column): Datetime of the last update to this leaderboard entry.
+    """
+    __tablename__ = 'riddle_leaderboard'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
+    correct_answers = db.Column(db.Integer, default=0)
+    total_attempts = db.Column(db.Integer, default=0)
+    points = db.Column(db.Float, default=0.0)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Leaderboard order: most points first, whoever got there first wins a tie
+    __table_args__ = (
+        db.Index('ix_riddle_leaderboard_points', points.desc(), last_updated),
+    )
+
+    def __init__(self, user_id, correct_answers=0, total_attempts=0, points=0.0):
+        """
+        Constructor for initializing a RiddleLeaderboardEntry object.
+
+        Args:
+            user_id (int): ID of the user for this leaderboard entry.
+            correct_answers (int): Number of correct answers by the user.
+            total_attempts (int): Total number of attempts by the user.
+            points (float): Points awarded based on correct answers.
+        """
+        self.user_id = user_id
+        self.correct_answers = correct_answers
+        self.total_attempts = total_attempts
+        self.points = points
+
+    def __repr__(self):
+        """
+        Returns a string representation of the RiddleLeaderboardEntry object.
+
+        Returns:
+            str: Text representation of the RiddleLeaderboardEntry.
+        """
+        return f"RiddleLeaderboardEntry(id={self.id}, user_id={self.user_id}, points={self.points})"
+
+    def read(self):
+        """
+        Returns:
+            dict: The entry as a dictionary.
+        """
+        return {
+            "user_id": self.user_id,
+            "correct_answers": self.correct_answers,
+            "total_attempts": self.total_attempts,
+            "points": self.points,
+            "last_updated": self.last_updated.isoformat() if self.last_updated else None,
+        }
+
+    def save(self):
+        """
+        Saves the RiddleLeaderboardEntry object to the database.
+
+        Raises:
+            Exception: Rolls back the transaction if an error occurs.
+        """
+        is_new = self.id is None
+        try:
+            db.session.add(self)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        if is_new:
+            riddle_ranks.add(self.points)
+
+    def update_points(self):
+        """
+        Updates the points from the correct answers: correct_answers * REWARD_FACTOR, a whole number, as the
+        one-point buckets of ScoreRanks need.
+
+        Raises:
+            Exception: Rolls back the transaction if an error occurs.
+        """
+        old_points = self.points
+        try:
+            self.points = self.correct_answers * REWARD_FACTOR
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        # Entries not saved yet are counted by save()
+        if self.id is not None:
+            riddle_ranks.move(old_points, self.points)
+
+
+class FenwickTree:
+    """
+    Binary indexed tree of counts: add to a slot and sum a prefix of slots, both in O(log n).
+    """
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Builds the tree from a list of slot counts in O(n)."""
+        fenwick = cls(len(counts))
+        fenwick.tree[1:] = counts
+        for i in range(1, fenwick.size + 1):
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                fenwick.tree[parent] += fenwick.tree[i]
+        return fenwick
+
+    def add(self, slot, delta):
+        i = slot + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, slot):
+        """Sum of slots 0..slot inclusive."""
+        total = 0
+        i = slot + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class ScoreRanks:
+    """
+    Order statistics over leaderboard points for rank queries.
+
+    Points are counted in one-point buckets in a Fenwick tree, so the rank of a score (1 + the number of
+    entries with more points, ties share a rank) is a prefix sum instead of a COUNT(*) over the table.
+    Scores at or above max_points share the last bucket and are ranked with an indexed COUNT over just
+    those few top entries.
+
+    Each worker keeps its own tree.  It follows the updates made in this worker and reloads the points
+    column when it is older than refresh_seconds, to pick up updates made by other workers.
+    """
+    def __init__(self, max_points, refresh_seconds):
+        self.max_points = max_points
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._tree = None
+        self._total = 0
+        self._loaded_at = 0.0
+
+    def _bucket(self, points):
+        return min(max(int(points or 0), 0), self.max_points)
+
+    def _ensure_loaded(self):
+        if self._tree is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        counts = [0] * (self.max_points + 1)
+        total = 0
+        for (points,) in db.session.query(RiddleLeaderboardEntry.points).yield_per(5000):
+            counts[self._bucket(points)] += 1
+            total += 1
+        self._tree = FenwickTree.from_counts(counts)
+        self._total = total
+        self._loaded_at = time.monotonic()
+
+    def add(self, points):
+        with self._lock:
+            if self._tree is not None:
+                self._tree.add(self._bucket(points), 1)
+                self._total += 1
+
+    def move(self, old_points, new_points):
+        with self._lock:
+            if self._tree is not None and self._bucket(old_points) != self._bucket(new_points):
+                self._tree.add(self._bucket(old_points), -1)
+                self._tree.add(self._bucket(new_points), 1)
+
+    def invalidate(self):
+        with self._lock:
+            self._tree = None
+
+    def total(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._total
+
+    def rank(self, points):
+        """
+        Returns the competition rank of a score, 1 for the most points.
+        """
+        bucket = self._bucket(points)
+        if bucket == self.max_points:
+            # Top bucket holds many different scores, count them in the index instead
+            return 1 + RiddleLeaderboardEntry.query.filter(RiddleLeaderboardEntry.points > points).count()
+        with self._lock:
+            self._ensure_loaded()
+            return 1 + self._total - self._tree.prefix_sum(bucket)
+
+riddle_ranks = ScoreRanks(app.config['LEADERBOARD_MAX_POINTS'], app.config['LEADERBOARD_REFRESH_SECONDS'])
+
+
+""" Leaderboard queries, all served by ix_riddle_leaderboard_points """
+
+def leaderboard_order():
+    return (RiddleLeaderboardEntry.points.desc(), RiddleLeaderboardEntry.last_updated, RiddleLeaderboardEntry.id)
+
+def top_entries(limit=10, offset=0):
+    """
+    Returns:
+        list: The leaderboard entries with the most points, best first.
+    """
+    return RiddleLeaderboardEntry.query.order_by(*leaderboard_order()).limit(limit).offset(offset).all()
+
+def entry_for_user(user_id):
+    return RiddleLeaderboardEntry.query.filter_by(user_id=user_id).first()
+
+def neighbors(entry, count=5):
+    """
+    Returns the entries just above and just below an entry in leaderboard order.
+
+    Args:
+        entry (RiddleLeaderboardEntry): The entry in the middle.
+        count (int): How many entries to return on each side.
+
+    Returns:
+        tuple: (above, below), both lists in leaderboard order.
+    """
+    model = RiddleLeaderboardEntry
+    ahead = or_(model.points > entry.points,
+                and_(model.points == entry.points, or_(model.last_updated < entry.last_updated,
+                                                       and_(model.last_updated == entry.last_updated, model.id < entry.id))))
+    behind = or_(model.points < entry.points,
+                 and_(model.points == entry.points, or_(model.last_updated > entry.last_updated,
+                                                        and_(model.last_updated == entry.last_updated, model.id > entry.id))))
+    above = model.query.filter(ahead).order_by(model.points, model.last_updated.desc(), model.id.desc()).limit(count).all()
+    below = model.query.filter(behind).order_by(*leaderboard_order()).limit(count).all()
+    return list(reversed(above)), below
+
+
+def init_riddle_leaderboard():
+    """
+    Initializes the Riddle Leaderboard table with sample data for testing.
+
+    Uses:
+        SQLAlchemy ORM to create the table and add sample leaderboard entries.
+
+    Instantiates:
+        RiddleLeaderboardEntry objects with sample data.
+
+    Raises:
+        IntegrityError: Occurs if there are duplicate or invalid data entries.
+    """
+    with app.app_context():
+        # Create the Riddle Leaderboard table
+        db.create_all()
+
+        # Sample leaderboard entries for testing
+        entry1 = RiddleLeaderboardEntry(user_id=1, correct_answers=3, total_attempts=5)
+        entry2 = RiddleLeaderboardEntry(user_id=2, correct_answers=5, total_attempts=8)
+
+        for entry in [entry1, entry2]:
+            try:
+                entry.update_points()  # Update points based on correct answers
+                entry.save()  # Save to the database
+                print(f"Record created: {repr(entry)}")
+            except IntegrityError:
+                db.session.rollback()
+                print(f"Error: Duplicate or invalid data for leaderboard entry for user {entry.user_id}")
@@ -0,0 +1,26 @@
+# loading.py
+from sqlalchemy.orm import raiseload
+from __init__ import app
+
+"""
+Loader options for queries that return many rows.
+
+Relationships load lazily by default, one query the first time each object touches one, which is fine for
+a single object and an N+1 for a listing.  A listing names the relationships its read() uses, loaded with
+selectinload in one more query each.  With SQLALCHEMY_RAISELOAD=1, every other relationship of the listed
+objects raises instead of loading, so a read() that starts touching a new relationship fails in development
+rather than adding a query per row in production.
+"""
+
+def listing_options(*loaders):
+    """
+    Args:
+        loaders: Options for the relationships the listing reads, e.g. selectinload(Group.moderators).
+
+    Returns:
+        tuple: Options for query.options().
+    """
+    if app.config['SQLALCHEMY_RAISELOAD']:
+        # sql_only, a many-to-one already in the session is still fine
+        return (*loaders, raiseload('*', sql_only=True))
+    return loaders
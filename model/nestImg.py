@@ -1,7 +1,8 @@
 import base64
-import os
 from werkzeug.utils import secure_filename
 from __init__ import app
+from model.storage import get_storage
+from model.imaging import reencode_image
 
 def nestImg_base64_decode(user_id, imageURL):
     """
@@ -17,10 +18,11 @@ def nestImg_base64_decode(user_id, imageURL):
     Returns:
     - str: The base64 encoded image if the user has a profile picture; otherwise, None.
     """
-    img_path = os.path.join(app.config['UPLOAD_FOLDER'], user_id, imageURL)
     try:
-        with open(img_path, 'rb') as img_file:
-            base64_encoded = base64.b64encode(img_file.read()).decode('utf-8')
+        image_data = get_storage('uploads').read(f'{user_id}/{imageURL}')
+        if image_data is None:
+            raise FileNotFoundError(f'{user_id}/{imageURL}')
+        base64_encoded = base64.b64encode(image_data).decode('utf-8')
         return base64_encoded
     except Exception as e:
         print(f'An error occurred while reading the post picture: {str(e)}')
@@ -42,14 +44,10 @@ def nestImg_base64_upload(base64_image, user_uid):
     - str: The filename of the saved image if the upload is successful; otherwise, None.
     """
     try:
-        image_data = base64.b64decode(base64_image)
-        filename = secure_filename(f'{user_uid}.png')
-        user_dir = os.path.join(app.config['UPLOAD_FOLDER'], user_uid)
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        file_path = os.path.join(user_dir, filename)
-        with open(file_path, 'wb') as img_file:
-            img_file.write(image_data)
+        # Validated and re-encoded, the extension follows the stored format
+        image_data, content_type, extension = reencode_image(base64.b64decode(base64_image))
+        filename = secure_filename(f'{user_uid}{extension}')
+        get_storage('uploads').put(f'{user_uid}/{filename}', image_data, content_type=content_type)
         return filename 
     except Exception as e:
         print (f'An error occurred while updating the post picture: {str(e)}')
@@ -3,9 +3,11 @@ import logging
 from sqlite3 import IntegrityError
 from sqlalchemy import Text, JSON
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from __init__ import app, db
 from model.user import User
 from model.channel import Channel
+from model.loading import listing_options
 
 class Post(db.Model):
     """
@@ -73,18 +75,25 @@ class Post(db.Model):
             return None
         return self
         
+    @staticmethod
+    def listing():
+        """
+        A query for many posts, with the authors and channels read() needs loaded in one query each.
+        """
+        return Post.query.options(*listing_options(selectinload(Post.author), selectinload(Post.channel)))
+
     def read(self):
         """
         The read method retrieves the object data from the object's attributes and returns it as a dictionary.
         
         Uses:
-            The Channel.query and User.query methods to retrieve the channel and user objects.
+            The author and channel relationships, loaded in bulk by Post.listing().
         
         Returns:
             dict: A dictionary containing the post data, including user and channel names.
         """
-        user = User.query.get(self._user_id)
-        channel = Channel.query.get(self._channel_id)
+        user = self.author
+        channel = self.channel
         data = {
             "id": self.id,
             "title": self._title,
@@ -0,0 +1,363 @@
+# post_score.py
+import bisect
+import math
+from datetime import datetime
+from sqlalchemy import event, inspect, select, func, case
+from sqlalchemy.orm import object_session, selectinload
+from __init__ import app, db
+from model.user import User
+from model.channel import Channel
+from model.post import Post
+from model.vote import Vote
+from model.loading import listing_options
+from model.cache import cache_tags, cached, get_cache, invalidate_on_commit
+from model.scheduler import scheduled_job
+
+# Reddit style hot ranking: every 45000 seconds (12.5 hours) of age is worth a factor of 10 in net votes
+HOT_EPOCH = datetime(2024, 1, 1)
+HOT_DECAY_SECONDS = 45000
+
+def hot_score(upvotes, downvotes, created_at):
+    """
+    Computes the hot rank of a post.  Newer posts start higher, so the value never has to be
+    recomputed as time passes, only when the votes change.
+
+    Args:
+        upvotes (int): Number of upvotes.
+        downvotes (int): Number of downvotes.
+        created_at (datetime): When the post was created.
+
+    Returns:
+        float: The hot rank, higher is better.
+    """
+    score = upvotes - downvotes
+    order = math.log10(max(abs(score), 1))
+    sign = 1 if score > 0 else -1 if score < 0 else 0
+    return round(sign * order + (created_at - HOT_EPOCH).total_seconds() / HOT_DECAY_SECONDS, 7)
+
+
+class PostScore(db.Model):
+    """
+    PostScore Model
+
+    The PostScore class keeps the vote totals and rankings for each post, so channel listings can be
+    sorted by an index instead of counting the votes table on every request.  Rows are kept up to date
+    by the ORM events at the bottom of this file, and posts written without the ORM get theirs from
+    backfill_post_scores().  Posts have no creation time of their own, this table records it.
+
+    Attributes:
+        post_id (db.Column): The post, also the primary key.
+        channel_id (db.Column): Copy of the post's channel, so each sort order has a (channel, rank) index.
+        upvotes (db.Column): Number of upvotes.
+        downvotes (db.Column): Number of downvotes.
+        score (db.Column): upvotes - downvotes, used by sort=top.
+        hot (db.Column): hot_score(), used by sort=hot.
+        created_at (db.Column): When the post was created, used by sort=new and the hot rank.
+    """
+    __tablename__ = 'post_scores'
+
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    channel_id = db.Column(db.Integer, nullable=False)
+    upvotes = db.Column(db.Integer, nullable=False, default=0)
+    downvotes = db.Column(db.Integer, nullable=False, default=0)
+    score = db.Column(db.Integer, nullable=False, default=0)
+    hot = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_post_scores_channel_score', 'channel_id', 'score'),
+        db.Index('ix_post_scores_channel_hot', 'channel_id', 'hot'),
+        db.Index('ix_post_scores_channel_created', 'channel_id', 'created_at'),
+    )
+
+    def read(self):
+        """
+        Returns:
+            dict: The vote totals and rankings of the post.
+        """
+        return {
+            "upvotes": self.upvotes,
+            "downvotes": self.downvotes,
+            "score": self.score,
+            "hot": self.hot,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+# Vote types and the column and score change of one vote
+VOTE_TYPES = {
+    'upvote': ('upvotes', 1),
+    'downvote': ('downvotes', -1),
+}
+
+# Sort orders accepted by /api/posts/filter
+SORT_COLUMNS = {
+    'top': (PostScore.score.desc(), PostScore.post_id.desc()),
+    'hot': (PostScore.hot.desc(), PostScore.post_id.desc()),
+    'new': (PostScore.created_at.desc(), PostScore.post_id.desc()),
+}
+
+def ranked_posts(channel_id, sort, limit=50, offset=0):
+    """
+    Returns one page of a channel's posts in the requested order, read from the post_scores indexes.
+    A post without a score row is missing until backfill_post_scores() adds it.
+
+    Args:
+        channel_id (int): The channel.
+        sort (str): 'top', 'hot' or 'new'.
+        limit (int): Page size.
+        offset (int): Rows to skip.
+
+    Returns:
+        list: (Post, PostScore) tuples.
+    """
+    return db.session.query(Post, PostScore) \
+        .options(*listing_options(selectinload(Post.author), selectinload(Post.channel))) \
+        .join(PostScore, PostScore.post_id == Post.id) \
+        .filter(PostScore.channel_id == channel_id) \
+        .order_by(*SORT_COLUMNS[sort]).limit(limit).offset(offset).all()
+
+# A page ordered by votes spanning more bands than this is tagged with its whole sort order instead
+MAX_PAGE_BANDS = 8
+
+def _band(sort, key):
+    """
+    Band of a 'top' or 'hot' sort key, for tagging the pages a vote can reorder.  Bands only grow with the
+    key: for 'top' one per power of two of the score, for 'hot' one per unit, a factor of 10 in net votes
+    or 12.5 hours.
+    """
+    if sort == 'top':
+        return key.bit_length() if key >= 0 else -(-key).bit_length()
+    return math.floor(key)
+
+def _band_tags(channel_id, sort, low, high):
+    """Tags of the bands from key low to key high, or of the whole sort order if there are too many."""
+    first, last = _band(sort, low), _band(sort, high)
+    if last - first >= MAX_PAGE_BANDS:
+        return {f"channel:{channel_id}:{sort}"}
+    return {f"channel:{channel_id}:{sort}:{band}" for band in range(first, last + 1)}
+
+def _vote_tags(row, column, step):
+    """
+    Tags of the pages one vote changes: those showing the post, and for the orders by votes the pages
+    between its old and new place.
+
+    Args:
+        row: The post's score row after the vote.
+        column (str): 'upvotes' or 'downvotes'.
+        step (int): 1 for a vote added, -1 for one removed.
+    """
+    old = {'upvotes': row.upvotes, 'downvotes': row.downvotes}
+    old[column] -= step
+    tags = {f"post:{row.post_id}", f"channel:{row.channel_id}:top", f"channel:{row.channel_id}:hot"}
+    for sort, before, after in (
+            ('top', old['upvotes'] - old['downvotes'], row.upvotes - row.downvotes),
+            ('hot', hot_score(old['upvotes'], old['downvotes'], row.created_at),
+             hot_score(row.upvotes, row.downvotes, row.created_at))):
+        tags |= _band_tags(row.channel_id, sort, min(before, after), max(before, after))
+    return tags
+
+@cached('{channel_id}:{sort}:{limit}:{offset}', tags=['channel:{channel_id}'])
+def ranked_page(channel_id, sort, limit=50, offset=0):
+    """
+    One page of ranked_posts() as the API returns it, from the shared cache.  Dropped when a post is added
+    to or removed from the channel, the channel or one of the page's posts or authors changes, and for
+    sort=top|hot, a vote moves a post past one of the page's posts.
+
+    Returns:
+        list: Each post's read() and its score's read(), merged.
+    """
+    ranked = ranked_posts(channel_id, sort, limit=limit, offset=offset)
+    cache_tags(*{f"user:{post._user_id}" for post, _ in ranked}, *{f"post:{post.id}" for post, _ in ranked})
+    if sort in ('top', 'hot') and ranked:
+        keys = [getattr(score, 'score' if sort == 'top' else 'hot') for _, score in ranked]
+        if len(ranked) < limit:
+            # The last page, every post a vote moves below it lands here
+            cache_tags(f"channel:{channel_id}:{sort}")
+        else:
+            cache_tags(*_band_tags(channel_id, sort, keys[-1], keys[0]))
+    return [{**post.read(), **score.read()} for post, score in ranked]
+
+def _created_at_estimator(recorded):
+    """
+    Posts have no creation time column, post_scores records one when the ORM inserts a post.  For a post
+    without it, e.g. loaded in bulk, the earliest time recorded for a newer post is the closest bound,
+    since ids only grow, and now if no newer post has one.
+
+    Args:
+        recorded (dict): post id -> created_at, for the posts that have one.
+
+    Returns:
+        function: post id -> created_at.
+    """
+    ids = sorted(recorded)
+    earliest_after = [None] * len(ids)  # earliest time among ids[i:]
+    earliest = None
+    for i in range(len(ids) - 1, -1, -1):
+        earliest = recorded[ids[i]] if earliest is None else min(earliest, recorded[ids[i]])
+        earliest_after[i] = earliest
+    now = datetime.utcnow()
+
+    def estimate(post_id):
+        if post_id in recorded:
+            return recorded[post_id]
+        i = bisect.bisect_right(ids, post_id)
+        return earliest_after[i] if i < len(ids) else now
+    return estimate
+
+def _vote_tally():
+    return select(Vote._post_id.label('post_id'),
+                  func.sum(case((Vote._vote_type == 'upvote', 1), else_=0)).label('upvotes'),
+                  func.sum(case((Vote._vote_type == 'downvote', 1), else_=0)).label('downvotes')) \
+        .group_by(Vote._post_id).subquery()
+
+def _insert_scores(rows, created_at, chunk_size):
+    chunk = []
+    for post_id, channel_id, upvotes, downvotes in rows:
+        upvotes, downvotes = upvotes or 0, downvotes or 0
+        created = created_at(post_id)
+        chunk.append({'post_id': post_id, 'channel_id': channel_id, 'upvotes': upvotes, 'downvotes': downvotes,
+                      'score': upvotes - downvotes, 'hot': hot_score(upvotes, downvotes, created),
+                      'created_at': created})
+        if len(chunk) >= chunk_size:
+            db.session.execute(PostScore.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(PostScore.__table__.insert(), chunk)
+
+def rebuild_post_scores(chunk_size=5000):
+    """
+    Recomputes every post's row from the votes table.  Creation times already recorded are kept, see
+    _created_at_estimator() for posts without one.  Run after loading votes outside the ORM.
+
+    Returns:
+        int: Number of posts scored.
+    """
+    with app.app_context():
+        db.create_all()
+        recorded = dict(db.session.execute(select(PostScore.post_id, PostScore.created_at)).all())
+        tally = _vote_tally()
+        rows = db.session.execute(select(Post.id, Post._channel_id, tally.c.upvotes, tally.c.downvotes)
+                                  .outerjoin(tally, tally.c.post_id == Post.id)).all()
+        db.session.execute(PostScore.__table__.delete())
+        _insert_scores(rows, _created_at_estimator(recorded), chunk_size)
+        db.session.commit()
+        # Bulk loads bypass the ORM events below, drop every cached page
+        get_cache().clear()
+        return len(rows)
+
+@scheduled_job('post_scores_backfill', minutes=10)
+def backfill_post_scores(chunk_size=5000):
+    """
+    Adds the score rows of posts that have none: posts from before post_scores existed, on the first run
+    after upgrading, and posts inserted without the ORM since.  Existing rows are left alone.
+
+    Returns:
+        int: Number of posts scored.
+    """
+    with app.app_context():
+        tally = _vote_tally()
+        rows = db.session.execute(select(Post.id, Post._channel_id, tally.c.upvotes, tally.c.downvotes)
+                                  .outerjoin(PostScore, PostScore.post_id == Post.id)
+                                  .outerjoin(tally, tally.c.post_id == Post.id)
+                                  .where(PostScore.post_id.is_(None))).all()
+        if not rows:
+            return 0
+        recorded = dict(db.session.execute(select(PostScore.post_id, PostScore.created_at)).all())
+        _insert_scores(rows, _created_at_estimator(recorded), chunk_size)
+        db.session.commit()
+        get_cache().invalidate({f"channel:{row._channel_id}" for row in rows})
+        return len(rows)
+
+
+""" Keep post_scores in step with posts and votes, in the same transaction, and drop the cached pages """
+
+post_scores = PostScore.__table__
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    now = datetime.utcnow()
+    connection.execute(post_scores.insert().values(post_id=target.id, channel_id=target._channel_id, upvotes=0,
+                                                   downvotes=0, score=0, hot=hot_score(0, 0, now), created_at=now))
+    invalidate_on_commit(object_session(target), f"channel:{target._channel_id}")
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    channels = inspect(target).attrs._channel_id.history
+    if channels.has_changes():
+        connection.execute(post_scores.update().where(post_scores.c.post_id == target.id)
+                           .values(channel_id=target._channel_id))
+        # The channel it left and the channel it is in now
+        invalidate_on_commit(object_session(target), *{f"channel:{channel_id}"
+                                                       for channel_id in (target._channel_id, *channels.deleted)})
+    else:
+        invalidate_on_commit(object_session(target), f"post:{target.id}")
+
+@event.listens_for(Post, 'before_delete')
+def _post_deleted(mapper, connection, target):
+    connection.execute(post_scores.delete().where(post_scores.c.post_id == target.id))
+    invalidate_on_commit(object_session(target), f"channel:{target._channel_id}")
+
+def _apply_vote(connection, post_id, vote_type, step):
+    """
+    Adds (step=1) or removes (step=-1) one vote and refreshes the hot rank.
+
+    Returns:
+        set: The tags of the cached pages the vote changes, none if the post has no score row.
+    """
+    if vote_type not in VOTE_TYPES:
+        raise ValueError(f"Unknown vote type {vote_type!r}, expected one of {', '.join(VOTE_TYPES)}")
+    column, sign = VOTE_TYPES[vote_type]
+    connection.execute(post_scores.update().where(post_scores.c.post_id == post_id).values({
+        column: post_scores.c[column] + step,
+        'score': post_scores.c.score + sign * step,
+    }))
+    row = connection.execute(select(post_scores.c.post_id, post_scores.c.upvotes, post_scores.c.downvotes,
+                                    post_scores.c.created_at, post_scores.c.channel_id)
+                             .where(post_scores.c.post_id == post_id)).first()
+    if row is None:
+        return set()
+    connection.execute(post_scores.update().where(post_scores.c.post_id == post_id)
+                       .values(hot=hot_score(row.upvotes, row.downvotes, row.created_at)))
+    return _vote_tags(row, column, step)
+
+def _vote_changed(target, *tag_sets):
+    invalidate_on_commit(object_session(target), *set().union(*tag_sets))
+
+@event.listens_for(Vote, 'after_insert')
+def _vote_inserted(mapper, connection, target):
+    _vote_changed(target, _apply_vote(connection, target._post_id, target._vote_type, 1))
+
+# The update below moves a vote from its old type and post, load them before a change replaces them,
+# after a commit they are expired and the history would have no old value
+@event.listens_for(Vote._vote_type, 'set', active_history=True)
+@event.listens_for(Vote._post_id, 'set', active_history=True)
+def _load_old_vote(target, value, oldvalue, initiator):
+    pass
+
+@event.listens_for(Vote, 'after_update')
+def _vote_updated(mapper, connection, target):
+    state = inspect(target)
+    vote_type = state.attrs._vote_type.history
+    post_id = state.attrs._post_id.history
+    if not vote_type.has_changes() and not post_id.has_changes():
+        return
+    old_type = vote_type.deleted[0] if vote_type.deleted else target._vote_type
+    old_post = post_id.deleted[0] if post_id.deleted else target._post_id
+    _vote_changed(target, _apply_vote(connection, old_post, old_type, -1),
+                  _apply_vote(connection, target._post_id, target._vote_type, 1))
+
+@event.listens_for(Vote, 'after_delete')
+def _vote_deleted(mapper, connection, target):
+    _vote_changed(target, _apply_vote(connection, target._post_id, target._vote_type, -1))
+
+# Pages show the channel and author names
+@event.listens_for(Channel, 'after_update')
+@event.listens_for(Channel, 'after_delete')
+def _channel_changed(mapper, connection, target):
+    invalidate_on_commit(object_session(target), f"channel:{target.id}")
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_on_commit(object_session(target), f"user:{target.id}")
@@ -0,0 +1,112 @@
+# readers.py
+from sqlalchemy import Text, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+from __init__ import db
+from model.user import User
+from model.channel import Channel
+from model.section import Section
+from model.post import Post
+
+"""
+Read paths for large listings that skip the ORM.
+
+A listing of full model objects pays for the identity map, attribute instrumentation and a read() call
+per row, only to turn each object back into a dict.  The readers here select just the columns read()
+returns and build the same dicts straight from row tuples, fetched from the cursor in chunks.  Keep the
+column lists in step with the models' read() methods.  read_objects() streams the read() of ORM objects
+for listings that need them.
+
+JSON columns are read as their stored text and wrapped in RawJSON, which the app's JSON provider
+(api/json_provider.py) writes into the response as it is, without decoding and encoding it again.
+"""
+
+CHUNK_SIZE = 1000
+
+
+class RawJSON:
+    """
+    Text that is already valid JSON, written into a response as it is.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"RawJSON({self.text!r})"
+
+
+class _RawJSONText(TypeDecorator):
+    """A JSON column's stored text, as RawJSON."""
+    impl = Text
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else RawJSON(value)
+
+def raw_json(column):
+    return type_coerce(column, _RawJSONText())
+
+# Response key -> column, in the order read() returns them
+USER_COLUMNS = (('id', User.id), ('uid', User._uid), ('name', User._name), ('email', User._email),
+                ('role', User._role), ('pfp', User._pfp), ('car', User._car))
+CHANNEL_COLUMNS = (('id', Channel.id), ('name', Channel._name), ('attributes', raw_json(Channel._attributes)),
+                   ('group_id', Channel._group_id))
+SECTION_COLUMNS = (('id', Section.id), ('name', Section._name), ('theme', Section._theme))
+POST_COLUMNS = (('id', Post.id), ('title', Post._title), ('comment', Post._comment),
+                ('content', raw_json(Post._content)), ('user_name', User._name), ('channel_name', Channel._name))
+# Outer joins, read() gives None for a missing author or channel
+POST_JOINS = ((User, User.id == Post._user_id), (Channel, Channel.id == Post._channel_id))
+
+
+def read_rows(columns, *criteria, joins=(), order_by=None, chunk_size=CHUNK_SIZE):
+    """
+    Runs a projected query now, so errors surface before a response starts, and returns its rows as dicts.
+
+    Args:
+        columns (tuple): (key, column) pairs.
+        criteria: Where clauses.
+        joins (tuple): (table, on clause) pairs, outer joined.
+        order_by: Optional order by clause.
+
+    Returns:
+        iterator: One dict per row, read from the cursor chunk_size rows at a time.
+    """
+    keys = tuple(key for key, _ in columns)
+    statement = select(*(column for _, column in columns))
+    for target, onclause in joins:
+        statement = statement.outerjoin(target, onclause)
+    statement = statement.where(*criteria)
+    if order_by is not None:
+        statement = statement.order_by(order_by)
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    return (dict(zip(keys, row)) for row in result)
+
+def read_objects(query, chunk_size=CHUNK_SIZE):
+    """
+    Runs an ORM query now and returns the read() of each object, for listings that need the model's logic.
+
+    Objects are fetched chunk_size at a time, and eager loaders such as selectinload run once per chunk.
+    The session only holds them weakly, so objects already sent are freed.
+
+    Returns:
+        iterator: One dict per object.
+    """
+    objects = query.session.execute(query.statement, execution_options={'yield_per': chunk_size}).scalars()
+    return (obj.read() for obj in objects)
+
+def read_users(*criteria):
+    """Rows shaped like User.read()."""
+    return read_rows(USER_COLUMNS, *criteria)
+
+def read_channels(*criteria):
+    """Rows shaped like Channel.read()."""
+    return read_rows(CHANNEL_COLUMNS, *criteria)
+
+def read_sections(*criteria):
+    """Rows shaped like Section.read()."""
+    return read_rows(SECTION_COLUMNS, *criteria)
+
+def read_posts(*criteria):
+    """Rows shaped like Post.read(), the author and channel names joined in."""
+    return read_rows(POST_COLUMNS, *criteria, joins=POST_JOINS, order_by=Post.id)
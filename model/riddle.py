@@ -0,0 +1,138 @@
+# riddle.py
+import random
+import re
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from __init__ import app, db
+from model.scheduler import scheduled_job
+
+class Riddle(db.Model):
+    """
+    Riddle Model to store riddles in the database.
+
+    Attributes:
+        id (int): Primary key, unique identifier for the riddle.
+        question (str): The riddle question.
+        answer (str): The answer to the riddle.
+        posted_at (datetime): Timestamp when the riddle was last posted, None if it never was.
+    """
+    __tablename__ = 'riddles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    question = db.Column(db.String(255), nullable=False, unique=True)
+    answer = db.Column(db.String(255), nullable=False)
+    posted_at = db.Column(db.DateTime, nullable=True)  # Keeps track of when the riddle was posted
+
+    # Serves both the random pick among unposted riddles (posted_at IS NULL, id >= x) and the latest posted riddle
+    __table_args__ = (
+        db.Index('ix_riddles_posted_at_id', 'posted_at', 'id'),
+    )
+
+    def __init__(self, question, answer):
+        self.question = question
+        self.answer = answer
+
+    def __repr__(self):
+        return f"<Riddle(id={self.id}, question='{self.question}', answer='{self.answer}')>"
+
+    def read(self):
+        """
+        Returns:
+            dict: The riddle without its answer.
+        """
+        return {
+            "id": self.id,
+            "question": self.question,
+            "posted_at": self.posted_at.isoformat() if self.posted_at else None,
+        }
+
+    @staticmethod
+    def _normalize(text):
+        return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+    def is_answer(self, answer):
+        """
+        Checks a submitted answer, ignoring case, punctuation and spacing.
+
+        Returns:
+            bool: True if it matches the stored answer.
+        """
+        return bool(self._normalize(answer)) and self._normalize(answer) == self._normalize(self.answer)
+
+    def mark_as_posted(self):
+        """
+        Marks the riddle as posted by setting the `posted_at` timestamp to now.
+        """
+        self.posted_at = datetime.utcnow()
+        db.session.commit()
+
+
+def pick_unposted_riddle(rng=random):
+    """
+    Picks a random riddle that has not been posted, without loading the table.
+
+    Draws a random id between the lowest and highest unposted id and takes the first unposted riddle at or
+    after it, wrapping around to the start.  Each step is a seek on ix_riddles_posted_at_id.  Riddles after a
+    gap in the ids are a little more likely to be picked, which is fine for a riddle of the day.
+    When every riddle has been posted, the one posted longest ago is repeated.
+
+    Returns:
+        Riddle: The riddle, or None if the table is empty.
+    """
+    unposted = Riddle.query.filter(Riddle.posted_at.is_(None))
+    low, high = db.session.query(func.min(Riddle.id), func.max(Riddle.id)).filter(Riddle.posted_at.is_(None)).one()
+    if low is None:
+        return Riddle.query.order_by(Riddle.posted_at, Riddle.id).first()
+    start = rng.randint(low, high)
+    return unposted.filter(Riddle.id >= start).order_by(Riddle.id).first() \
+        or unposted.order_by(Riddle.id).first()
+
+def current_riddle():
+    """
+    Returns:
+        Riddle: The riddle posted most recently, or None.
+    """
+    return Riddle.query.filter(Riddle.posted_at.isnot(None)).order_by(Riddle.posted_at.desc()).first()
+
+@scheduled_job('riddle_of_the_day', hours=24)
+def post_random_riddle():
+    """
+    Selects a random riddle from the database, marks it as the "riddle of the day,"
+    and updates the posted timestamp.  Runs once a day on one worker, see model/scheduler.py.
+    """
+    selected_riddle = pick_unposted_riddle()
+    if selected_riddle:
+        selected_riddle.mark_as_posted()
+        print(f"Riddle of the Day: {selected_riddle.question}")
+
+
+# Function to initialize the database with some sample riddles
+def init_riddles():
+    """
+    Initializes the Riddle table with sample riddles.
+    """
+    with app.app_context():
+        db.create_all()
+
+        sample_riddles = [
+            Riddle(question="What has keys but can't open locks?", answer="A piano"),
+            Riddle(question="What runs but never walks?", answer="A river"),
+            Riddle(question="I speak without a mouth and hear without ears. What am I?", answer="An echo"),
+            Riddle(question="The more you take, the more you leave behind. What am I?", answer="Footsteps"),
+            Riddle(question="I am thought to be everywhere, and I only have one rival. He hides within himself, and stays wherever I cannot reach. Who am I? And who is my rival?", answer="Light and Darkness"),
+            Riddle(question="The more of this there is, the less you see. What is it?", answer="Darkness"),
+            Riddle(question="I'm tall when I'm young and short when I'm old. What am I?", answer="A candle"),
+            Riddle(question="What comes once in a minute, twice in a moment, but never in a thousand years?", answer="The letter M"),
+            Riddle(question="Forward I am heavy, but backward I am not. What am I?", answer="The word 'ton'"),
+            Riddle(question="I have branches, but no fruit, trunk, or leaves. What am I?", answer="A bank"),
+        ]
+
+        for riddle in sample_riddles:
+            try:
+                db.session.add(riddle)
+                db.session.commit()
+                print(f"Record created: {repr(riddle)}")
+            except IntegrityError:
+                db.session.rollback()
+                print(f"Records exist, duplicate riddle, or error: {riddle.question}")
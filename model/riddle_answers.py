@@ -0,0 +1,196 @@
+# riddle_answers.py
+import atexit
+import logging
+import threading
+import uuid
+from datetime import datetime
+from sqlalchemy import case, func, insert, select, update
+from __init__ import app, db
+from model.leaderboard import RiddleLeaderboardEntry, REWARD_FACTOR, riddle_ranks
+
+class RiddleAnswer(db.Model):
+    """
+    RiddleAnswer Model
+
+    Staging table of riddle answers.  Each user is scored once per riddle, the unique constraint drops
+    resubmissions even when they reach different workers.
+
+    Attributes:
+        id (db.Column): The primary key.
+        user_id (db.Column): The user who answered.
+        riddle_id (db.Column): The riddle answered.
+        correct (db.Column): Whether the answer matched the riddle's, checked by the server.
+        submitted_at (db.Column): When the answer was received.
+        batch (db.Column): The flush that claimed this answer, None while it waits to be scored.
+    """
+    __tablename__ = 'riddle_answers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    riddle_id = db.Column(db.Integer, db.ForeignKey('riddles.id'), nullable=False)
+    correct = db.Column(db.Boolean, nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    batch = db.Column(db.String(32), nullable=True, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'riddle_id', name='uq_riddle_answers_user_riddle'),
+    )
+
+    @staticmethod
+    def exists(user_id, riddle_id):
+        return db.session.query(RiddleAnswer.id).filter_by(user_id=user_id, riddle_id=riddle_id).first() is not None
+
+
+def apply_pending_answers():
+    """
+    Scores every staged answer not yet claimed by a flush, in one transaction.
+
+    The answers are claimed with a batch id first, so two workers flushing at once never count the same
+    answer twice.  Then each user's correct and attempt counts are added with one UPDATE per user,
+    sent as a single executemany, and users without an entry get one.  The rank tree of this worker moves
+    each entry from its old points to its new ones, other workers reload theirs on their refresh timer.
+
+    Returns:
+        int: Number of answers scored.
+    """
+    answers = RiddleAnswer.__table__
+    entries = RiddleLeaderboardEntry.__table__
+    batch = uuid.uuid4().hex
+    claimed = db.session.execute(update(answers).where(answers.c.batch.is_(None)).values(batch=batch)).rowcount
+    if not claimed:
+        db.session.commit()
+        return 0
+
+    deltas = db.session.execute(
+        select(answers.c.user_id,
+               func.sum(case((answers.c.correct, 1), else_=0)).label('correct'),
+               func.count().label('attempts'))
+        .where(answers.c.batch == batch).group_by(answers.c.user_id)).all()
+    now = datetime.utcnow()
+    # The points before this batch, to move the entries in the rank tree
+    existing = {row.user_id: row for row in db.session.execute(
+        select(entries.c.user_id, entries.c.correct_answers, entries.c.points)
+        .where(entries.c.user_id.in_([delta.user_id for delta in deltas])))}
+
+    updates = [{'uid': d.user_id, 'dc': d.correct, 'da': d.attempts, 'now': now} for d in deltas if d.user_id in existing]
+    if updates:
+        db.session.execute(
+            update(entries).where(entries.c.user_id == db.bindparam('uid')).values(
+                correct_answers=entries.c.correct_answers + db.bindparam('dc'),
+                total_attempts=entries.c.total_attempts + db.bindparam('da'),
+                points=(entries.c.correct_answers + db.bindparam('dc')) * REWARD_FACTOR,
+                last_updated=db.bindparam('now')),
+            updates)
+    inserts = [{'user_id': d.user_id, 'correct_answers': d.correct, 'total_attempts': d.attempts,
+                'points': float(d.correct * REWARD_FACTOR), 'last_updated': now} for d in deltas if d.user_id not in existing]
+    if inserts:
+        db.session.execute(insert(entries), inserts)
+    db.session.commit()
+    for d in deltas:
+        if d.user_id in existing:
+            old = existing[d.user_id]
+            riddle_ranks.move(old.points, ((old.correct_answers or 0) + d.correct) * REWARD_FACTOR)
+        else:
+            riddle_ranks.add(d.correct * REWARD_FACTOR)
+    return claimed
+
+
+class AnswerBuffer:
+    """
+    Collects riddle answers in memory and writes them in batches.
+
+    A timed riddle event sends hundreds of answers at once.  Scoring each one with update_points() is a
+    commit per answer on a few hot leaderboard rows.  Here a request only records the answer in memory.
+    A background thread flushes every flush_seconds: one multi-row INSERT into riddle_answers (duplicates
+    ignored), then apply_pending_answers() scores the batch.  Leaderboard reads lag answers by at most
+    flush_seconds plus the rank refresh.  Answers still in memory when a worker is killed are lost,
+    a normal exit flushes them.
+    """
+    def __init__(self, flush_seconds):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (user_id, riddle_id) -> (correct, submitted_at)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def submit(self, user_id, riddle_id, correct):
+        """
+        Records an answer to be scored at the next flush.
+
+        Returns:
+            bool: False if this user's answer to the riddle is already waiting or was already scored.
+        """
+        key = (user_id, riddle_id)
+        with self._lock:
+            if key in self._pending:
+                return False
+        if RiddleAnswer.exists(user_id, riddle_id):
+            return False
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = (bool(correct), datetime.utcnow())
+        self._start()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """
+        Writes the buffered answers to riddle_answers and scores them.
+
+        Returns:
+            int: Number of answers scored, including ones staged by other workers.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            with app.app_context():
+                if batch:
+                    statement = insert(RiddleAnswer.__table__)
+                    # Another worker may have staged the same answer, keep the first one
+                    if db.engine.dialect.name == 'mysql':
+                        statement = statement.prefix_with('IGNORE')
+                    elif db.engine.dialect.name == 'sqlite':
+                        statement = statement.prefix_with('OR IGNORE')
+                    try:
+                        db.session.execute(statement, [
+                            {'user_id': user_id, 'riddle_id': riddle_id, 'correct': correct, 'submitted_at': submitted_at}
+                            for (user_id, riddle_id), (correct, submitted_at) in batch.items()])
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        # Keep the answers for the next flush
+                        with self._lock:
+                            self._pending = {**batch, **self._pending}
+                        raise
+                return apply_pending_answers()
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='riddle-answer-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Riddle answer flush failed: {e}")
+
+riddle_answer_buffer = AnswerBuffer(app.config['RIDDLE_FLUSH_SECONDS'])
+
+@atexit.register
+def _flush_on_exit():
+    if riddle_answer_buffer.pending():
+        try:
+            riddle_answer_buffer.flush()
+        except Exception as e:
+            logging.warning(f"Could not flush riddle answers on exit: {e}")
@@ -0,0 +1,236 @@
+# scheduler.py
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from __init__ import app, db
+
+"""
+Periodic jobs that run once per cluster, not once per worker.
+
+Every worker runs a scheduler thread, and they elect a leader with a lease row in scheduler_locks: the
+leader renews the lease every tick, and another worker takes over once it has expired.  Only the leader
+runs jobs.  Job definitions come from the @scheduled_job registry, their schedule lives in scheduled_jobs,
+so a restart or deploy neither re-runs a job early nor forgets one that is due.  Claiming a run moves
+next_run_at forward with a compare-and-set UPDATE, so even two overlapping leaders cannot run it twice.
+"""
+
+LEADER_LOCK = 'scheduler'
+
+# name -> (function, interval)
+JOBS = {}
+
+def scheduled_job(name, seconds=0, minutes=0, hours=0):
+    """
+    Registers a function to run on an interval.
+
+    Args:
+        name (str): Unique job name, the key in scheduled_jobs.
+        seconds, minutes, hours (int): The interval.
+    """
+    def decorator(func):
+        JOBS[name] = (func, timedelta(seconds=seconds, minutes=minutes, hours=hours))
+        return func
+    return decorator
+
+
+class SchedulerLock(db.Model):
+    """
+    SchedulerLock Model
+
+    A named lease.  The holder is the leader until expires_at, and renews before then.
+
+    Attributes:
+        name (db.Column): The lock name, the primary key.
+        owner (db.Column): host:pid of the holder.
+        expires_at (db.Column): When another worker may take the lock.
+    """
+    __tablename__ = 'scheduler_locks'
+
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class ScheduledJob(db.Model):
+    """
+    ScheduledJob Model
+
+    The persistent schedule and last result of a registered job.
+
+    Attributes:
+        name (db.Column): The job name from @scheduled_job, the primary key.
+        interval_seconds (db.Column): Seconds between runs.
+        next_run_at (db.Column): When the job is next due.
+        last_run_at (db.Column): When the job last started.
+        last_status (db.Column): 'ok' or 'error'.
+        last_error (db.Column): The traceback of the last failure.
+        last_owner (db.Column): The worker that last ran the job.
+    """
+    __tablename__ = 'scheduled_jobs'
+
+    name = db.Column(db.String(64), primary_key=True)
+    interval_seconds = db.Column(db.Integer, nullable=False)
+    next_run_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(16), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    last_owner = db.Column(db.String(255), nullable=True)
+
+    def read(self):
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "next_run_at": self.next_run_at.isoformat(),
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_status": self.last_status,
+            "last_owner": self.last_owner,
+        }
+
+
+def acquire_lease(name, owner, ttl_seconds):
+    """
+    Takes or renews a lease.
+
+    Args:
+        name (str): The lock name.
+        owner (str): Who wants it.
+        ttl_seconds (float): How long the lease lasts without renewal.
+
+    Returns:
+        bool: True if owner holds the lease now.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    locks = SchedulerLock.__table__
+    taken = db.session.execute(
+        update(locks).where(locks.c.name == name, or_(locks.c.owner == owner, locks.c.expires_at < now))
+        .values(owner=owner, expires_at=expires_at)).rowcount
+    if not taken:
+        try:
+            db.session.execute(insert(locks).values(name=name, owner=owner, expires_at=expires_at))
+            taken = 1
+        except IntegrityError:
+            taken = 0  # someone else holds it
+    db.session.commit()
+    return bool(taken)
+
+def release_lease(name, owner):
+    locks = SchedulerLock.__table__
+    db.session.execute(update(locks).where(locks.c.name == name, locks.c.owner == owner)
+                       .values(expires_at=datetime.utcnow()))
+    db.session.commit()
+
+
+class Scheduler:
+    """
+    Runs registered jobs on the elected leader.
+    """
+    def __init__(self, tick_seconds):
+        self.tick_seconds = tick_seconds
+        self.lease_seconds = 3 * tick_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+            logging.info(f"Scheduler started in {self.owner}")
+
+    def stop(self):
+        self._stop.set()
+        if self.is_leader:
+            with app.app_context():
+                release_lease(LEADER_LOCK, self.owner)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logging.warning(f"Scheduler tick failed: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def tick(self):
+        """
+        Renews or takes the leader lease, and if this worker leads, runs the due jobs.
+        """
+        with app.app_context():
+            was_leader = self.is_leader
+            self.is_leader = acquire_lease(LEADER_LOCK, self.owner, self.lease_seconds)
+            if self.is_leader and not was_leader:
+                logging.info(f"Scheduler leader is now {self.owner}")
+            if not self.is_leader:
+                return
+            self._sync_jobs()
+            now = datetime.utcnow()
+            for job in ScheduledJob.query.filter(ScheduledJob.next_run_at <= now).all():
+                self._run_job(job, now)
+
+    def _sync_jobs(self):
+        """Adds registered jobs missing from scheduled_jobs, due now, and applies interval changes."""
+        rows = {job.name: job for job in ScheduledJob.query.all()}
+        for name, (_, interval) in JOBS.items():
+            seconds = int(interval.total_seconds())
+            if name not in rows:
+                db.session.add(ScheduledJob(name=name, interval_seconds=seconds, next_run_at=datetime.utcnow()))
+            elif rows[name].interval_seconds != seconds:
+                rows[name].interval_seconds = seconds
+        db.session.commit()
+
+    def _run_job(self, job, now):
+        if job.name not in JOBS:
+            return  # a job this version of the code no longer has
+        func, interval = JOBS[job.name]
+        jobs = ScheduledJob.__table__
+        # Compare-and-set on next_run_at, whoever moves it forward owns this run
+        claimed = db.session.execute(
+            update(jobs).where(jobs.c.name == job.name, jobs.c.next_run_at == job.next_run_at)
+            .values(next_run_at=now + interval, last_run_at=now, last_owner=self.owner)).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+        try:
+            func()
+            status, error = 'ok', None
+        except Exception:
+            db.session.rollback()
+            status, error = 'error', traceback.format_exc()
+            logging.warning(f"Scheduled job {job.name} failed: {error}")
+        db.session.execute(update(jobs).where(jobs.c.name == job.name).values(last_status=status, last_error=error))
+        db.session.commit()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    """
+    Starts the scheduler thread in this process, once.  Called by gunicorn's post_worker_init hook
+    and by main.py when running the development server.
+
+    Returns:
+        Scheduler: The scheduler, or None when SCHEDULER_ENABLED is off.
+    """
+    global _scheduler
+    if not app.config['SCHEDULER_ENABLED']:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            # Importing the modules that define jobs registers them
+            import model.riddle  # noqa: F401
+            import model.jobs  # noqa: F401
+            import model.blobstore  # noqa: F401
+            import model.post_score  # noqa: F401
+            _scheduler = Scheduler(app.config['SCHEDULER_TICK_SECONDS'])
+            _scheduler.start()
+    return _scheduler
+
+def get_scheduler():
+    return _scheduler
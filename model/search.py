@@ -0,0 +1,372 @@
+""" search.py
+Full-text search over post titles and comments, nest post titles and content, and feedback.
+
+One interface, three backends:
+- Fts5SearchBackend: an FTS5 virtual table, used when running on SQLite.
+- MysqlSearchBackend: a search_documents table with a FULLTEXT index, used on MySQL in production.
+- InvertedIndexSearchBackend (model/search_index.py): a pure-Python index over posts, used when
+  SQLite was built without FTS5.
+
+Each searchable row is one document identified by (kind, doc_id).  ORM events on Post, NestPost and
+Feedback write the document in the same transaction as the row, so the index never drifts from the
+data.  Rows inserted without the ORM (bulk imports, synthetic data) need `flask custom search_reindex`.
+
+The index storage is created once per database by `flask custom search_setup` (and generate_data), a
+deploy step like a migration.  Workers only check at startup that it exists, they run no DDL.
+"""
+import logging
+import re
+import sqlite3
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.schema import CreateTable
+from __init__ import app, db
+from model.post import Post
+from model.nestPost import NestPost
+from model.feedback import Feedback
+
+# Searchable models: kind -> (model, title column, body column)
+SEARCH_SOURCES = {
+    'post': (Post, '_title', '_comment'),
+    'nest_post': (NestPost, '_title', '_content'),
+    'feedback': (Feedback, None, '_content'),
+}
+KIND_CODES = {'post': 1, 'nest_post': 2, 'feedback': 3}
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    """
+    Splits a user query into lower case words, dropping punctuation and search operators.
+
+    Args:
+        query (str): The text typed by the user.
+
+    Returns:
+        list: Words in the order they were typed.
+    """
+    return [term.lower() for term in WORD.findall(query or '')]
+
+
+class SearchBackend:
+    """
+    Interface for search backends.  Every method takes a SQLAlchemy connection so index writes share
+    the transaction of the row being written.
+    """
+    name = None
+
+    def exists(self, connection):
+        """Returns True if the index storage has been created."""
+        raise NotImplementedError
+
+    def setup(self, connection):
+        """
+        Creates the index storage if it does not exist, tolerating another process creating it at the same
+        time.  Returns True if it was created.
+        """
+        raise NotImplementedError
+
+    def index(self, connection, kind, doc_id, title, body):
+        """Adds or replaces one document."""
+        raise NotImplementedError
+
+    def remove(self, connection, kind, doc_id):
+        """Removes one document, if present."""
+        raise NotImplementedError
+
+    def search(self, connection, query, kind=None, limit=20, offset=0):
+        """
+        Returns (total, hits) for the query, best match first.  Each hit is a dict with kind, id,
+        title, snippet and score.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, connection):
+        """Replaces the whole index with the current rows.  Returns the number of documents."""
+        raise NotImplementedError
+
+
+class Fts5SearchBackend(SearchBackend):
+    """
+    SQLite FTS5 virtual table.  The rowid packs kind and id so updates and deletes are rowid lookups.
+    """
+    name = 'fts5'
+    TABLE = 'search_fts'
+
+    @staticmethod
+    def available():
+        try:
+            connection = sqlite3.connect(':memory:')
+            connection.execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+            connection.close()
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    @staticmethod
+    def _rowid(kind, doc_id):
+        return (KIND_CODES[kind] << 32) | doc_id
+
+    def exists(self, connection):
+        return connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                  {'name': self.TABLE}).first() is not None
+
+    def setup(self, connection):
+        if self.exists(connection):
+            return False
+        connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+                                "title, body, kind UNINDEXED, doc_id UNINDEXED, tokenize = 'porter unicode61')"))
+        return True
+
+    def index(self, connection, kind, doc_id, title, body):
+        rowid = self._rowid(kind, doc_id)
+        connection.execute(text(f"DELETE FROM {self.TABLE} WHERE rowid = :rowid"), {'rowid': rowid})
+        connection.execute(text(f"INSERT INTO {self.TABLE} (rowid, title, body, kind, doc_id) "
+                                "VALUES (:rowid, :title, :body, :kind, :doc_id)"),
+                           {'rowid': rowid, 'title': title or '', 'body': body or '', 'kind': kind, 'doc_id': doc_id})
+
+    def remove(self, connection, kind, doc_id):
+        connection.execute(text(f"DELETE FROM {self.TABLE} WHERE rowid = :rowid"), {'rowid': self._rowid(kind, doc_id)})
+
+    @staticmethod
+    def _match(terms):
+        # Quote every word so user input is never parsed as FTS5 syntax, and prefix match the last one
+        return ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+
+    def search(self, connection, query, kind=None, limit=20, offset=0):
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        params = {'match': self._match(terms), 'kind': kind, 'limit': limit, 'offset': offset}
+        where = f"{self.TABLE} MATCH :match" + (" AND kind = :kind" if kind else "")
+        total = connection.execute(text(f"SELECT count(*) FROM {self.TABLE} WHERE {where}"), params).scalar()
+        rows = connection.execute(text(
+            f"SELECT kind, doc_id, title, snippet({self.TABLE}, 1, '[', ']', '...', 16) AS snippet, "
+            f"bm25({self.TABLE}, 2.0, 1.0) AS score FROM {self.TABLE} WHERE {where} "
+            "ORDER BY score LIMIT :limit OFFSET :offset"), params).all()
+        # bm25() is lower for better matches, flip it so higher is better like MySQL
+        return total, [{'kind': row.kind, 'id': row.doc_id, 'title': row.title, 'snippet': row.snippet,
+                        'score': round(-row.score, 4)} for row in rows]
+
+    def rebuild(self, connection):
+        connection.execute(text(f"DELETE FROM {self.TABLE}"))
+        for kind, (model, title, body) in SEARCH_SOURCES.items():
+            title_sql = title or "''"
+            connection.execute(text(
+                f"INSERT INTO {self.TABLE} (rowid, title, body, kind, doc_id) "
+                f"SELECT ({KIND_CODES[kind]} << 32) | id, {title_sql}, {body}, '{kind}', id "
+                f"FROM {model.__tablename__}"))
+        return connection.execute(text(f"SELECT count(*) FROM {self.TABLE}")).scalar()
+
+
+# Kept out of db.Model metadata so db.create_all() does not build it on SQLite
+search_metadata = MetaData()
+search_documents = Table(
+    'search_documents', search_metadata,
+    Column('kind', String(16), primary_key=True),
+    Column('doc_id', Integer, primary_key=True, autoincrement=False),
+    Column('title', String(255), nullable=False, default=''),
+    Column('body', Text, nullable=False),
+    mysql_engine='InnoDB',
+)
+
+
+class MysqlSearchBackend(SearchBackend):
+    """
+    InnoDB FULLTEXT index over a search_documents table, queried in boolean mode.
+    """
+    name = 'mysql'
+    MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size, shorter words are not indexed
+    INDEX = 'ft_search_documents'
+    # MySQL error codes for DDL another process ran first
+    TABLE_EXISTS = 1050
+    DUPLICATE_KEY_NAME = 1061
+
+    def _has_index(self, connection):
+        return any(index['name'] == self.INDEX for index in inspect(connection).get_indexes('search_documents'))
+
+    def exists(self, connection):
+        return inspect(connection).has_table('search_documents') and self._has_index(connection)
+
+    def _tolerate(self, connection, statement, error_code):
+        try:
+            connection.execute(statement)
+            return True
+        except OperationalError as e:
+            if e.orig.args[0] != error_code:
+                raise
+            return False
+
+    def setup(self, connection):
+        created = False
+        if not inspect(connection).has_table('search_documents'):
+            created = self._tolerate(connection, CreateTable(search_documents), self.TABLE_EXISTS)
+        if not self._has_index(connection):
+            created = self._tolerate(connection, text(f"ALTER TABLE search_documents ADD FULLTEXT INDEX {self.INDEX} (title, body)"),
+                                     self.DUPLICATE_KEY_NAME) or created
+        return created
+
+    def index(self, connection, kind, doc_id, title, body):
+        statement = mysql_insert(search_documents).values(kind=kind, doc_id=doc_id, title=title or '', body=body or '')
+        connection.execute(statement.on_duplicate_key_update(title=statement.inserted.title, body=statement.inserted.body))
+
+    def remove(self, connection, kind, doc_id):
+        connection.execute(search_documents.delete().where(search_documents.c.kind == kind,
+                                                           search_documents.c.doc_id == doc_id))
+
+    def _against(self, terms):
+        words = [f'+{term}' for term in terms[:-1] if len(term) >= self.MIN_TOKEN_SIZE]
+        words.append(f'+{terms[-1]}*')
+        return ' '.join(words)
+
+    def search(self, connection, query, kind=None, limit=20, offset=0):
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        params = {'against': self._against(terms), 'kind': kind, 'limit': limit, 'offset': offset}
+        match = "MATCH (title, body) AGAINST (:against IN BOOLEAN MODE)"
+        where = match + (" AND kind = :kind" if kind else "")
+        total = connection.execute(text(f"SELECT count(*) FROM search_documents WHERE {where}"), params).scalar()
+        rows = connection.execute(text(
+            f"SELECT kind, doc_id, title, LEFT(body, 160) AS snippet, {match} AS score "
+            f"FROM search_documents WHERE {where} ORDER BY score DESC LIMIT :limit OFFSET :offset"), params).all()
+        return total, [{'kind': row.kind, 'id': row.doc_id, 'title': row.title, 'snippet': row.snippet,
+                        'score': round(float(row.score), 4)} for row in rows]
+
+    def rebuild(self, connection):
+        connection.execute(search_documents.delete())
+        for kind, (model, title, body) in SEARCH_SOURCES.items():
+            title_sql = f"LEFT({title}, 255)" if title else "''"
+            connection.execute(text(
+                f"INSERT INTO search_documents (kind, doc_id, title, body) "
+                f"SELECT '{kind}', id, {title_sql}, {body} FROM {model.__tablename__}"))
+        return connection.execute(text("SELECT count(*) FROM search_documents")).scalar()
+
+
+""" Backend selection """
+
+_backend = None
+_backend_ready = False
+
+def select_backend(config_value, dialect):
+    """
+    Picks the backend for SEARCH_BACKEND ('auto', 'fts5', 'mysql', 'inverted' or 'none') and the database dialect.
+
+    Returns:
+        SearchBackend: The backend, or None when search is unavailable.
+    """
+    if config_value == 'none':
+        return None
+    if config_value == 'auto':
+        config_value = 'mysql' if dialect == 'mysql' else 'fts5'
+    if config_value == 'mysql':
+        return MysqlSearchBackend()
+    if config_value == 'fts5':
+        if Fts5SearchBackend.available():
+            return Fts5SearchBackend()
+        logging.warning("SQLite was built without FTS5, searching posts with the in-process index instead")
+        config_value = 'inverted'
+    if config_value == 'inverted':
+        from model.search_index import InvertedIndexSearchBackend  # imports this module
+        return InvertedIndexSearchBackend(app.config['SEARCH_INDEX_PATH'])
+    raise ValueError(f"Unknown SEARCH_BACKEND '{config_value}'")
+
+def init_search():
+    """
+    Selects the search backend and checks that its storage exists.  Called once at startup by main.py.
+    """
+    global _backend, _backend_ready
+    with app.app_context():
+        _backend = select_backend(app.config['SEARCH_BACKEND'], db.engine.dialect.name)
+        if _backend is None:
+            return
+        with db.engine.connect() as connection:
+            _backend_ready = _backend.exists(connection)
+        if not _backend_ready:
+            logging.warning(f"The {_backend.name} search index does not exist, search is off until "
+                            "`flask custom search_setup` has run and the server restarted")
+
+def setup_search():
+    """
+    Creates the search index storage if it does not exist, and turns search on in this process.  Run once
+    per database by `flask custom search_setup` and generate_data.
+
+    Returns:
+        bool: True if the storage was created and needs search_reindex, None if search is off.
+    """
+    global _backend_ready
+    if _backend is None:
+        return None
+    with app.app_context():
+        with db.engine.begin() as connection:
+            created = _backend.setup(connection)
+    _backend_ready = True
+    return created
+
+def get_search_backend():
+    """Returns the active backend, or None if search is unavailable."""
+    return _backend if _backend_ready else None
+
+def search(query, kind=None, page=1, per_page=20):
+    """
+    Searches the index.
+
+    Args:
+        query (str): Words to search for, the last one is prefix matched.
+        kind (str, optional): Limit results to 'post', 'nest_post' or 'feedback'.
+        page (int): 1-based page number.
+        per_page (int): Results per page.
+
+    Returns:
+        tuple: (total, hits), or None if search is unavailable.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return None
+    return backend.search(db.session.connection(), query, kind=kind, limit=per_page, offset=(page - 1) * per_page)
+
+def reindex():
+    """
+    Rebuilds the whole index from the source tables.
+
+    Returns:
+        int: Number of documents indexed, or None if search is unavailable.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return None
+    with app.app_context():
+        with db.engine.begin() as connection:
+            return backend.rebuild(connection)
+
+
+""" Keep the index in sync with the rows """
+
+def _register_sync(kind, model, title, body):
+    def document(target):
+        return getattr(target, title) if title else '', getattr(target, body)
+
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        backend = get_search_backend()
+        if backend:
+            backend.index(connection, kind, target.id, *document(target))
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        backend = get_search_backend()
+        state = inspect(target)
+        changed = any(state.attrs[column].history.has_changes() for column in (title, body) if column)
+        if backend and changed:
+            backend.index(connection, kind, target.id, *document(target))
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        backend = get_search_backend()
+        if backend:
+            backend.remove(connection, kind, target.id)
+
+for _kind, (_model, _title, _body) in SEARCH_SOURCES.items():
+    _register_sync(_kind, _model, _title, _body)
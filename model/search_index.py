@@ -0,0 +1,399 @@
+""" search_index.py
+Pure-Python inverted index over post titles and comments, the search fallback when SQLite has no FTS5.
+
+Layout:
+- Every version of a post gets a new document number (docno), so postings are appended in docno order
+  and stay sorted without re-sorting.  Updating a post tombstones its old docno, deleting removes it.
+- Postings are array('I') docno lists with a parallel array('H') of term frequencies.
+- Terms are also kept in a sorted list, so a prefix query is a bisect plus a short scan.
+- Results are ranked with BM25.  Title words count twice.
+- Postings are compacted once a quarter of the docnos are dead.
+
+Workers keep their own copy in memory.  Post inserts, updates and deletes append the post id to
+search_index_changes in the same transaction, and every worker applies new changes before it searches,
+so all workers see committed posts.  The index is saved to SEARCH_INDEX_PATH (under instance/) and
+memory-mapped on load, so a restarted worker reads postings from the file instead of re-tokenizing
+every post.  `flask custom search_reindex` rebuilds the file and the other workers reload it.
+"""
+import array
+import atexit
+import bisect
+import contextlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, func, inspect, select
+from model.post import Post
+from model.search import SearchBackend, query_terms
+
+MAGIC = b'FLKIDX01'
+HEADER = struct.Struct('<8sQQIIIQ')  # magic, generation, watermark, next docno, docs, terms, total length
+TERM_ENTRY = struct.Struct('<HIQ')   # term length, postings count, postings offset
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 2
+MAX_FREQ = 0xFFFF
+COMPACT_RATIO = 0.25  # compact when this share of docnos is dead
+SAVE_EVERY = 500      # changes applied between saves
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index of post id -> (title, comment), optionally backed by a memory-mapped file.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.generation = int(time.time() * 1000)
+        self.watermark = 0  # last search_index_changes id applied
+        self.next_docno = 1
+        self.doc_post = {}     # live docno -> post id
+        self.post_doc = {}     # post id -> live docno
+        self.doc_length = {}   # live docno -> weighted token count
+        self.total_length = 0
+        self.postings = {}     # term -> (array('I') docnos, array('H') frequencies)
+        self.terms = []        # sorted terms, for prefix queries
+        self.dead = 0          # docnos still in postings but no longer live
+        self._mmap = None
+        self._file_terms = {}  # term -> (count, offset), postings not yet read from the file
+
+    @staticmethod
+    def tokenize(title, comment):
+        """Returns term -> weighted frequency for a post."""
+        counts = Counter()
+        for term in query_terms(title):
+            counts[term] += TITLE_WEIGHT
+        counts.update(query_terms(comment))
+        return counts
+
+    def _postings(self, term):
+        postings = self.postings.get(term)
+        if postings is None and term in self._file_terms:
+            count, offset = self._file_terms.pop(term)
+            docnos = array.array('I')
+            docnos.frombytes(self._mmap[offset:offset + 4 * count])
+            freqs = array.array('H')
+            freqs.frombytes(self._mmap[offset + 4 * count:offset + 6 * count])
+            postings = self.postings[term] = (docnos, freqs)
+        return postings
+
+    def add(self, post_id, title, comment):
+        """Indexes a post, replacing the previous version if there is one."""
+        with self._lock:
+            self.remove(post_id)
+            counts = self.tokenize(title, comment)
+            docno = self.next_docno
+            self.next_docno += 1
+            for term, freq in counts.items():
+                postings = self._postings(term)
+                if postings is None:
+                    postings = self.postings[term] = (array.array('I'), array.array('H'))
+                    bisect.insort(self.terms, term)
+                postings[0].append(docno)
+                postings[1].append(min(freq, MAX_FREQ))
+            length = sum(counts.values())
+            self.doc_post[docno] = post_id
+            self.post_doc[post_id] = docno
+            self.doc_length[docno] = length
+            self.total_length += length
+
+    def remove(self, post_id):
+        """Tombstones a post.  Its postings are dropped at the next compaction."""
+        with self._lock:
+            docno = self.post_doc.pop(post_id, None)
+            if docno is None:
+                return
+            del self.doc_post[docno]
+            self.total_length -= self.doc_length.pop(docno)
+            self.dead += 1
+            if self.dead > COMPACT_RATIO * max(len(self.doc_post), 1000):
+                self.compact()
+
+    def compact(self):
+        """Rewrites every postings list without dead docnos."""
+        with self._lock:
+            for term in list(self._file_terms):
+                self._postings(term)
+            live = self.doc_post
+            for term in list(self.postings):
+                docnos, freqs = self.postings[term]
+                kept = [(docno, freq) for docno, freq in zip(docnos, freqs) if docno in live]
+                if kept:
+                    self.postings[term] = (array.array('I', (k[0] for k in kept)), array.array('H', (k[1] for k in kept)))
+                else:
+                    del self.postings[term]
+            self.terms = sorted(self.postings)
+            self.dead = 0
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings or term in self._file_terms else []
+        matches = []
+        position = bisect.bisect_left(self.terms, term)
+        while position < len(self.terms) and self.terms[position].startswith(term):
+            matches.append(self.terms[position])
+            position += 1
+        return matches
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Returns (total, [(post_id, score)]) for posts containing every word, the last one as a prefix.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            live = len(self.doc_post)
+            if not live:
+                return 0, []
+            avg_length = self.total_length / live or 1
+            scores = None
+            for i, term in enumerate(terms):
+                term_scores = {}
+                for expanded in self._expand(term, prefix=(i == len(terms) - 1)):
+                    docnos, freqs = self._postings(expanded)
+                    idf = math.log(1 + (live - len(docnos) + 0.5) / (len(docnos) + 0.5))
+                    for docno, freq in zip(docnos, freqs):
+                        length = self.doc_length.get(docno)
+                        if length is None:
+                            continue  # tombstoned
+                        score = idf * freq * (K1 + 1) / (freq + K1 * (1 - B + B * length / avg_length))
+                        term_scores[docno] = term_scores.get(docno, 0.0) + score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {docno: score + term_scores[docno] for docno, score in scores.items() if docno in term_scores}
+                if not scores:
+                    return 0, []
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return len(ranked), [(self.doc_post[docno], score) for docno, score in ranked[offset:offset + limit]]
+
+    """ Persistence """
+
+    def save(self, path):
+        """
+        Writes the index to a temporary file next to path, syncs it and renames it into place, so readers
+        and a crash mid-write never leave a partial file at path.
+        """
+        with self._lock:
+            docs = array.array('I')
+            for docno, post_id in self.doc_post.items():
+                docs.extend((docno, post_id, self.doc_length[docno]))
+            terms = sorted(set(self.postings) | set(self._file_terms))
+            encoded = [term.encode('utf-8') for term in terms]
+            postings_start = HEADER.size + len(docs) * 4 + sum(TERM_ENTRY.size + len(e) for e in encoded)
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                            dir=os.path.dirname(path) or '.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(HEADER.pack(MAGIC, self.generation, self.watermark, self.next_docno,
+                                        len(self.doc_post), len(terms), self.total_length))
+                    f.write(docs.tobytes())
+                    offset = postings_start
+                    lists = []
+                    for term, raw in zip(terms, encoded):
+                        docnos, freqs = self._postings(term)
+                        f.write(TERM_ENTRY.pack(len(raw), len(docnos), offset))
+                        f.write(raw)
+                        offset += 6 * len(docnos)
+                        lists.append((docnos, freqs))
+                    for docnos, freqs in lists:
+                        f.write(docnos.tobytes())
+                        f.write(freqs.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+                raise
+
+    @classmethod
+    def load(cls, path):
+        """
+        Maps an index file.  Postings stay in the file until a query or update touches their term.
+
+        Returns:
+            InvertedIndex: The index, or None if the file is missing, not an index or damaged, and needs a rebuild.
+        """
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            index = cls._read(mapped)
+        except (struct.error, ValueError) as e:
+            logging.warning(f"Search index {path} is damaged ({e}), rebuilding it")
+            index = None
+        if index is None:
+            mapped.close()
+        return index
+
+    @classmethod
+    def _read(cls, mapped):
+        magic, generation, watermark, next_docno, n_docs, n_terms, total_length = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            return None
+        index = cls()
+        index.generation, index.watermark, index.next_docno, index.total_length = generation, watermark, next_docno, total_length
+        position = HEADER.size
+        if position + 12 * n_docs > len(mapped):
+            raise ValueError("document table past the end of the file")
+        docs = array.array('I')
+        docs.frombytes(mapped[position:position + 12 * n_docs])
+        position += 12 * n_docs
+        for i in range(0, len(docs), 3):
+            index.doc_post[docs[i]] = docs[i + 1]
+            index.post_doc[docs[i + 1]] = docs[i]
+            index.doc_length[docs[i]] = docs[i + 2]
+        for _ in range(n_terms):
+            length, count, offset = TERM_ENTRY.unpack_from(mapped, position)
+            position += TERM_ENTRY.size
+            if offset + 6 * count > len(mapped):
+                raise ValueError("postings past the end of the file")
+            term = mapped[position:position + length].decode('utf-8')
+            position += length
+            index._file_terms[term] = (count, offset)
+        index.terms = sorted(index._file_terms)
+        index._mmap = mapped
+        return index
+
+    @staticmethod
+    def file_generation(path):
+        """Reads the generation from the header of an index file, or None."""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER.size)
+            magic, generation = HEADER.unpack(header)[:2]
+            return generation if magic == MAGIC else None
+        except (OSError, struct.error):
+            return None
+
+
+# Post ids changed since the index was saved, written in the same transaction as the post.
+# Kept out of db.Model metadata so it only exists where this backend is used.
+changes_metadata = MetaData()
+search_index_changes = Table(
+    'search_index_changes', changes_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('post_id', Integer, nullable=False),
+    Column('created_at', DateTime, nullable=False, server_default=func.now()),
+)
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    Search backend over InvertedIndex.  Covers posts only, nest posts and feedback need FTS5 or MySQL.
+    """
+    name = 'inverted'
+    GENERATION_CHECK_SECONDS = 1.0
+
+    def __init__(self, path):
+        self.path = path
+        self.inverted = None
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._generation_checked = 0.0
+        atexit.register(self._save_on_exit)
+
+    def exists(self, connection):
+        return inspect(connection).has_table('search_index_changes')
+
+    def setup(self, connection):
+        if not self.exists(connection):
+            changes_metadata.create_all(connection)
+        return False  # the index builds itself from the posts table on first use
+
+    def index(self, connection, kind, doc_id, title, body):
+        if kind == 'post':
+            connection.execute(search_index_changes.insert().values(post_id=doc_id))
+
+    def remove(self, connection, kind, doc_id):
+        if kind == 'post':
+            connection.execute(search_index_changes.insert().values(post_id=doc_id))
+
+    def _build(self, connection):
+        index = InvertedIndex()
+        index.watermark = connection.execute(select(func.max(search_index_changes.c.id))).scalar() or 0
+        table = Post.__table__
+        result = connection.execute(select(table.c.id, table.c._title, table.c._comment).execution_options(yield_per=2000))
+        for post_id, title, comment in result:
+            index.add(post_id, title, comment)
+        index.compact()
+        return index
+
+    def _catch_up(self, connection):
+        """Loads or builds the index if needed, then applies changes made by any worker."""
+        now = time.monotonic()
+        if self.inverted is not None and now - self._generation_checked > self.GENERATION_CHECK_SECONDS:
+            self._generation_checked = now
+            if InvertedIndex.file_generation(self.path) not in (None, self.inverted.generation):
+                self.inverted = None  # rebuilt by another process
+        if self.inverted is None:
+            self.inverted = InvertedIndex.load(self.path)
+            if self.inverted is None:
+                logging.warning("Building the search index from the posts table")
+                self.inverted = self._build(connection)
+                self.inverted.save(self.path)
+
+        rows = connection.execute(select(search_index_changes.c.id, search_index_changes.c.post_id)
+                                  .where(search_index_changes.c.id > self.inverted.watermark)
+                                  .order_by(search_index_changes.c.id)).all()
+        if not rows:
+            return
+        post_ids = {row.post_id for row in rows}
+        table = Post.__table__
+        current = {row.id: row for row in connection.execute(
+            select(table.c.id, table.c._title, table.c._comment).where(table.c.id.in_(post_ids)))}
+        for post_id in post_ids:
+            if post_id in current:
+                self.inverted.add(post_id, current[post_id]._title, current[post_id]._comment)
+            else:
+                self.inverted.remove(post_id)
+        self.inverted.watermark = rows[-1].id
+        self._unsaved += len(rows)
+        if self._unsaved >= SAVE_EVERY:
+            self._save()
+
+    def _save(self):
+        # A file with another generation was rebuilt by search_reindex, this copy is older
+        if InvertedIndex.file_generation(self.path) in (None, self.inverted.generation):
+            self.inverted.save(self.path)
+        self._unsaved = 0
+
+    def search(self, connection, query, kind=None, limit=20, offset=0):
+        if kind not in (None, 'post'):
+            return 0, []
+        with self._lock:
+            self._catch_up(connection)
+            total, ranked = self.inverted.search(query, limit=limit, offset=offset)
+        if not ranked:
+            return total, []
+        table = Post.__table__
+        rows = {row.id: row for row in connection.execute(
+            select(table.c.id, table.c._title, table.c._comment).where(table.c.id.in_([post_id for post_id, _ in ranked])))}
+        return total, [{'kind': 'post', 'id': post_id, 'title': rows[post_id]._title,
+                        'snippet': rows[post_id]._comment[:160], 'score': round(score, 4)}
+                       for post_id, score in ranked if post_id in rows]
+
+    def rebuild(self, connection):
+        with self._lock:
+            self.inverted = self._build(connection)
+            self.inverted.save(self.path)
+            self._unsaved = 0
+            # Every worker reloads the new file, which already includes these changes
+            connection.execute(search_index_changes.delete().where(search_index_changes.c.id <= self.inverted.watermark))
+            return len(self.inverted.doc_post)
+
+    def _save_on_exit(self):
+        if self.inverted is not None and self._unsaved:
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f"Could not save the search index: {e}")
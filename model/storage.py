@@ -0,0 +1,246 @@
+# storage.py
+import io
+import os
+import shutil
+import threading
+import uuid
+from __init__ import app
+
+"""
+Where uploaded files live, behind one small interface so the app does not depend on a shared volume.
+
+- filesystem: files under a local directory, served by the app, the default.
+- s3: objects in S3_BUCKET, or any S3 compatible store at S3_ENDPOINT_URL (MinIO, moto).
+  Browsers are redirected to presigned URLs, so image bytes never pass through the app.
+
+Files are grouped in namespaces: 'uploads' for pictures saved under <uid>/ by older code, 'blobs' for
+the content-addressed store in model/blobstore.py.  get_storage(namespace) returns the driver for one.
+"""
+
+class StorageDriver:
+    """
+    Interface of a storage driver.  Keys are '/' separated paths relative to the namespace.
+    """
+    def put(self, key, data, content_type=None, cache_control=None):
+        """
+        Stores a file, replacing any file with the same key.
+
+        Args:
+            data (bytes or file): The content, file objects are streamed.
+        """
+        raise NotImplementedError
+
+    def read(self, key):
+        """
+        Returns:
+            bytes: The content, or None if there is no such key.
+        """
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Deletes a file, a missing key is not an error."""
+        raise NotImplementedError
+
+    def rename_prefix(self, old_prefix, new_prefix):
+        """
+        Moves every file under old_prefix to new_prefix, files already under new_prefix win.
+
+        Returns:
+            bool: False if there was nothing to move.
+        """
+        raise NotImplementedError
+
+    def url(self, key):
+        """
+        Returns:
+            str: A URL the browser can fetch the file from directly, or None if the app must serve it.
+        """
+        return None
+
+    def local_path(self, key):
+        """
+        Returns:
+            str: The file's path for send_file, or None if the driver is not local.
+        """
+        return None
+
+
+class FilesystemStorage(StorageDriver):
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Key outside storage root: {key}")
+        return path
+
+    def put(self, key, data, content_type=None, cache_control=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename, readers never see a partial file
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as out:
+            if isinstance(data, (bytes, bytearray)):
+                out.write(data)
+            else:
+                shutil.copyfileobj(data, out)
+        os.replace(temp_path, path)
+
+    def read(self, key):
+        try:
+            with open(self._path(key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def rename_prefix(self, old_prefix, new_prefix):
+        old_path, new_path = self._path(old_prefix), self._path(new_prefix)
+        if old_path == new_path or not os.path.exists(old_path):
+            return False
+        if not os.path.exists(new_path):
+            os.rename(old_path, new_path)
+            return True
+        for name in os.listdir(old_path):
+            if not os.path.exists(os.path.join(new_path, name)):
+                os.replace(os.path.join(old_path, name), os.path.join(new_path, name))
+        shutil.rmtree(old_path, ignore_errors=True)
+        return True
+
+    def local_path(self, key):
+        return self._path(key)
+
+
+class S3Storage(StorageDriver):
+    """
+    Objects under a key prefix in an S3 bucket.
+
+    One boto3 client per process, shared by all threads, with a connection pool of S3_MAX_POOL_CONNECTIONS.
+    Uploads go through upload_fileobj, which streams the file and switches to a multipart upload with parallel
+    parts above S3_MULTIPART_THRESHOLD.
+    """
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def client(cls):
+        # A client's connections must not be shared with a forked child, e.g. jobs_worker --processes
+        if cls._client is None or cls._client_pid != os.getpid():
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != os.getpid():
+                    # Optional dependency, only needed with STORAGE_BACKEND=s3
+                    import boto3
+                    from botocore.config import Config
+                    cls._client = boto3.session.Session().client(
+                        's3',
+                        endpoint_url=app.config['S3_ENDPOINT_URL'],
+                        region_name=app.config['S3_REGION'],
+                        config=Config(max_pool_connections=app.config['S3_MAX_POOL_CONNECTIONS'],
+                                      retries={'max_attempts': 3, 'mode': 'standard'}))
+                    cls._client_pid = os.getpid()
+        return cls._client
+
+    @staticmethod
+    def _transfer_config():
+        from boto3.s3.transfer import TransferConfig
+        threshold = app.config['S3_MULTIPART_THRESHOLD']
+        return TransferConfig(multipart_threshold=threshold, multipart_chunksize=threshold, max_concurrency=4)
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    @staticmethod
+    def _missing(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def put(self, key, data, content_type=None, cache_control=None):
+        extra = {}
+        if content_type:
+            extra['ContentType'] = content_type
+        if cache_control:
+            extra['CacheControl'] = cache_control
+        fileobj = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        self.client().upload_fileobj(fileobj, self.bucket, self._key(key), ExtraArgs=extra or None,
+                                     Config=self._transfer_config())
+
+    def read(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client().get_object(Bucket=self.bucket, Key=self._key(key))['Body'].read()
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client().head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client().delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def rename_prefix(self, old_prefix, new_prefix):
+        # S3 has no rename, copy each object then delete the original
+        old_prefix, new_prefix = old_prefix.rstrip('/') + '/', new_prefix.rstrip('/') + '/'
+        client = self.client()
+        moved = False
+        for page in client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self._key(old_prefix)):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(self._key(old_prefix)):]
+                if not self.exists(new_prefix + name):
+                    client.copy({'Bucket': self.bucket, 'Key': obj['Key']}, self.bucket, self._key(new_prefix + name))
+                client.delete_object(Bucket=self.bucket, Key=obj['Key'])
+                moved = True
+        return moved
+
+    def url(self, key):
+        return self.client().generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._key(key)},
+            ExpiresIn=app.config['S3_PRESIGN_SECONDS'])
+
+
+_drivers = {}
+_drivers_lock = threading.Lock()
+
+def get_storage(namespace):
+    """
+    Returns the configured driver for a namespace, 'uploads' or 'blobs'.
+    """
+    driver = _drivers.get(namespace)
+    if driver is None:
+        with _drivers_lock:
+            driver = _drivers.get(namespace)
+            if driver is None:
+                backend = app.config['STORAGE_BACKEND']
+                if backend == 's3':
+                    driver = S3Storage(app.config['S3_BUCKET'], f"{app.config['S3_PREFIX']}{namespace}/")
+                elif backend == 'filesystem':
+                    roots = {'uploads': app.config['UPLOAD_FOLDER'], 'blobs': app.config['BLOB_FOLDER']}
+                    driver = FilesystemStorage(roots[namespace])
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND {backend}")
+                _drivers[namespace] = driver
+    return driver
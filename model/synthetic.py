@@ -0,0 +1,232 @@
+""" synthetic.py
+Generates large, referentially consistent datasets for profiling the list endpoints.
+
+One unit of scale is about 1,000 users, 20 groups, 100 channels, 20,000 posts and 100,000 votes, so
+--scale 50 gives 50k users, 1M posts and 5M votes. The same seed always gives the same data.
+
+Rows are written with bulk INSERT statements in chunks instead of one ORM object and commit per row,
+and every synthetic user shares one password hash computed up front, since pbkdf2 hashing is the slow
+part of creating a User.  Ids are assigned here, following the highest id already in each table, so
+foreign keys line up without reading the rows back.  Posts get their post_scores rows, vote totals
+and creation times here too, so listings rank them without a rebuild.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+from __init__ import app, db
+from model.user import User
+from model.section import Section
+from model.group import Group, group_moderators
+from model.channel import Channel
+from model.post import Post
+from model.vote import Vote
+from model.post_score import PostScore, hot_score
+
+# Rows generated per unit of --scale
+ROWS_PER_SCALE = {
+    'users': 1000,
+    'groups': 20,
+    'channels': 100,
+    'posts': 20000,
+    'votes': 100000,
+}
+CHUNK_SIZE = 5000  # rows per INSERT statement
+POST_DAYS = 90  # posts are spread over this many days before now
+
+FIRST_NAMES = ['Ava', 'Ben', 'Chloe', 'Daniel', 'Emma', 'Felix', 'Grace', 'Hiro', 'Isla', 'Jamal', 'Kai', 'Lena',
+               'Mateo', 'Nina', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tara', 'Uma', 'Victor', 'Wen', 'Yusuf', 'Zoe']
+LAST_NAMES = ['Nguyen', 'Garcia', 'Smith', 'Kim', 'Patel', 'Lopez', 'Chen', 'Johnson', 'Brown', 'Singh', 'Martinez',
+              'Lee', 'Davis', 'Wilson', 'Tanaka', 'Silva', 'Khan', 'Moore', 'Clark', 'Walker']
+TOPICS = ['Robotics', 'Chess', 'Music', 'Art', 'Cooking', 'Gaming', 'Hiking', 'Theater', 'Film', 'Soccer',
+          'Debate', 'Math', 'Physics', 'Writing', 'Photography', 'Coding', 'Drama', 'Biology', 'History', 'Astronomy']
+CHANNEL_KINDS = ['General', 'Announcements', 'Help', 'Projects', 'Off Topic', 'Events', 'Showcase', 'Questions']
+WORDS = ['project', 'idea', 'question', 'update', 'team', 'meeting', 'deadline', 'review', 'demo', 'design',
+         'feature', 'bug', 'fix', 'plan', 'result', 'practice', 'game', 'test', 'draft', 'feedback', 'event',
+         'schedule', 'help', 'share', 'build', 'learn', 'week', 'today', 'tomorrow', 'great', 'new', 'first']
+POST_TYPES = ['announcement', 'discussion', 'question', 'showcase']
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+def _insert_chunked(table, rows, label):
+    """
+    Inserts an iterable of row dicts in CHUNK_SIZE batches, committing after each batch.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(insert(table), chunk)
+            db.session.commit()
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(table), chunk)
+        db.session.commit()
+        count += len(chunk)
+    print(f"Inserted {count} {label}")
+    return count
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()[:255]
+
+def _skewed_weights(rng, n, alpha=1.5):
+    """
+    Pareto weights, so a few rows are very popular and most are not, like real channels and posts.
+    """
+    return [rng.paretovariate(alpha) for _ in range(n)]
+
+def generate_synthetic_data(scale=1.0, seed=42, counts=None):
+    """
+    Adds synthetic users, groups, channels, posts and votes on top of the existing data.
+
+    Args:
+        scale (float): Multiplier for ROWS_PER_SCALE.
+        seed (int): Random seed, the same seed and scale give the same rows.
+        counts (dict, optional): Exact row counts per table, overriding scale for the tables given.
+
+    Returns:
+        dict: Number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    target = {table: int(rows * scale) for table, rows in ROWS_PER_SCALE.items()}
+    target.update(counts or {})
+    inserted = {}
+    start = time.perf_counter()
+
+    with app.app_context():
+        db.create_all()
+        section_ids = [row[0] for row in db.session.query(Section.id).all()]
+        if not section_ids:
+            raise ValueError("No sections found, run initSections (custom generate_data) first")
+        # Rows need parents, from the database or generated here
+        for child, parent, model in (('channels', 'groups', Group), ('posts', 'channels', Channel), ('posts', 'users', User)):
+            if target[child] > 0 and target[parent] < 1 and db.session.query(model.id).first() is None:
+                raise ValueError(f"No {parent} found for the {child}, generate at least one ({parent} >= 1)")
+
+        # Users, all sharing one pre-computed password hash
+        password_hash = generate_password_hash(app.config['DEFAULT_PASSWORD'], "pbkdf2:sha256", salt_length=10)
+        first_user = _next_id(User)
+        inserted['users'] = _insert_chunked(User.__table__, ({
+            'id': user_id,
+            '_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            '_uid': f"synth{user_id}",
+            '_email': f"synth{user_id}@example.com",
+            '_password': password_hash,
+            '_role': 'User',
+            '_pfp': None,
+            '_car': None,
+        } for user_id in range(first_user, first_user + target['users'])), 'users')
+        user_ids = [row[0] for row in db.session.query(User.id).all()]
+
+        # Groups spread over the existing sections, each with a few moderators
+        first_group = _next_id(Group)
+        group_ids = list(range(first_group, first_group + target['groups']))
+        inserted['groups'] = _insert_chunked(Group.__table__, ({
+            'id': group_id,
+            '_name': f"{rng.choice(TOPICS)} Club {group_id}",
+            '_section_id': rng.choice(section_ids),
+        } for group_id in group_ids), 'groups')
+        _insert_chunked(group_moderators, ({'group_id': group_id, 'user_id': user_id}
+                                           for group_id in group_ids
+                                           for user_id in rng.sample(user_ids, min(len(user_ids), rng.randint(1, 3)))),
+                        'group moderators')
+        all_group_ids = [row[0] for row in db.session.query(Group.id).all()]
+
+        # Channels, new groups first so every synthetic group has some
+        first_channel = _next_id(Channel)
+        channel_groups = (group_ids or all_group_ids)
+        inserted['channels'] = _insert_chunked(Channel.__table__, ({
+            'id': channel_id,
+            '_name': f"{rng.choice(CHANNEL_KINDS)} {channel_id}",
+            '_attributes': {},
+            '_group_id': channel_groups[i % len(channel_groups)],
+        } for i, channel_id in enumerate(range(first_channel, first_channel + target['channels']))), 'channels')
+        channel_ids = [row[0] for row in db.session.query(Channel.id).all()]
+
+        # Posts, concentrated in popular channels and written by active users
+        first_post = _next_id(Post)
+        post_ids = list(range(first_post, first_post + target['posts']))
+        channel_weights = _skewed_weights(rng, len(channel_ids))
+        author_weights = _skewed_weights(rng, len(user_ids))
+
+        post_channels = []
+
+        def post_rows():
+            for offset in range(0, len(post_ids), CHUNK_SIZE):
+                batch = post_ids[offset:offset + CHUNK_SIZE]
+                channels = rng.choices(channel_ids, weights=channel_weights, k=len(batch))
+                authors = rng.choices(user_ids, weights=author_weights, k=len(batch))
+                for post_id, channel_id, user_id in zip(batch, channels, authors):
+                    post_channels.append((post_id, channel_id))
+                    yield {
+                        'id': post_id,
+                        '_title': _sentence(rng, 3, 8),
+                        '_comment': _sentence(rng, 8, 30),
+                        '_content': {'type': rng.choice(POST_TYPES)},
+                        '_user_id': user_id,
+                        '_channel_id': channel_id,
+                    }
+        inserted['posts'] = _insert_chunked(Post.__table__, post_rows(), 'posts')
+
+        # Votes, at most one per user and post, most of them on a few popular posts
+        def vote_counts():
+            """Votes per post, following the skew and adding up to the target where there are enough users."""
+            weights = _skewed_weights(rng, len(post_ids))
+            total_weight = sum(weights)
+            wanted = min(target['votes'], len(user_ids) * len(post_ids))
+            counts = [min(len(user_ids), int(wanted * weight / total_weight)) for weight in weights]
+            # Rounding down and the one vote per user cap leave a shortfall, the most popular posts with room take it
+            shortfall = wanted - sum(counts)
+            for i in sorted(range(len(post_ids)), key=lambda i: weights[i], reverse=True):
+                if not shortfall:
+                    break
+                extra = min(len(user_ids) - counts[i], shortfall)
+                counts[i] += extra
+                shortfall -= extra
+            return counts
+
+        tallies = {}  # post id -> [upvotes, downvotes]
+
+        def vote_rows():
+            if not post_ids:
+                return
+            for post_id, voters in zip(post_ids, vote_counts()):
+                tally = tallies[post_id] = [0, 0]
+                for user_id in rng.sample(user_ids, voters):
+                    upvote = rng.random() < 0.8
+                    tally[0 if upvote else 1] += 1
+                    yield {
+                        '_vote_type': 'upvote' if upvote else 'downvote',
+                        '_user_id': user_id,
+                        '_post_id': post_id,
+                    }
+        inserted['votes'] = _insert_chunked(Vote.__table__, vote_rows(), 'votes')
+
+        # Score rows with the totals above, posts have no timestamp of their own so post_scores records
+        # one, here spread over the last POST_DAYS days in id order
+        def score_rows():
+            now = datetime.utcnow()
+            for i, (post_id, channel_id) in enumerate(post_channels):
+                upvotes, downvotes = tallies.get(post_id, (0, 0))
+                created_at = now - timedelta(days=POST_DAYS) * (1 - (i + 1) / len(post_channels))
+                yield {
+                    'post_id': post_id,
+                    'channel_id': channel_id,
+                    'upvotes': upvotes,
+                    'downvotes': downvotes,
+                    'score': upvotes - downvotes,
+                    'hot': hot_score(upvotes, downvotes, created_at),
+                    'created_at': created_at,
+                }
+        _insert_chunked(PostScore.__table__, score_rows(), 'post scores')
+
+    print(f"Synthetic data generated in {time.perf_counter() - start:.1f} seconds")
+    return inserted
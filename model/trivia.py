@@ -0,0 +1,298 @@
+# trivia.py
+import logging
+import random
+import threading
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from __init__ import app
+
+""" Trivia Providers """
+
+class TriviaProvider:
+    """
+    TriviaProvider Base Class
+
+    A provider knows how to fetch trivia questions for a topic from some source. The TriviaPool only talks to
+    this interface, so the upstream API can be swapped for a local stub in tests or development.
+    """
+    def fetch(self, topic, count=1):
+        """
+        Fetches trivia questions for a topic.
+
+        Args:
+            topic (str): The trivia category, may be an empty string for any category.
+            count (int): The number of questions wanted.
+
+        Returns:
+            list: A list of question strings, possibly shorter than count.
+
+        Raises:
+            requests.RequestException: The upstream could not be reached or answered with an error.
+        """
+        raise NotImplementedError
+
+
+class ApiNinjasTriviaProvider(TriviaProvider):
+    """
+    Fetches trivia from the api-ninjas trivia endpoint.
+
+    A single requests.Session is kept for the life of the worker so TCP/TLS connections are pooled and reused,
+    and every call is bounded by a (connect, read) timeout so a slow upstream can never hold a worker for long.
+    """
+    def __init__(self, url, api_key, timeout, pool_size=4):
+        """
+        Args:
+            url (str): URL template with a {} placeholder for the topic.
+            api_key (str): The X-Api-Key header value, without one nothing is fetched.
+            timeout (tuple): (connect, read) timeout in seconds.
+            pool_size (int): Maximum pooled connections to the upstream host.
+        """
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['X-Api-Key'] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch(self, topic, count=1):
+        if not self.api_key:
+            return []  # warned about at startup
+        questions = []
+        # The free tier returns a single question per call
+        for _ in range(count):
+            response = self.session.get(self.url.format(topic), timeout=self.timeout)
+            response.raise_for_status()
+            questions += [item['question'] for item in response.json() if item.get('question')]
+        return questions
+
+
+class StubTriviaProvider(TriviaProvider):
+    """
+    Serves trivia from a local list, used for tests and offline development.
+    """
+    def __init__(self, questions=None):
+        """
+        Args:
+            questions (list, optional): Question strings to cycle through. Defaults to generated questions.
+        """
+        self.questions = questions
+        self.calls = 0
+
+    def fetch(self, topic, count=1):
+        questions = []
+        for _ in range(count):
+            self.calls += 1
+            if self.questions:
+                questions.append(self.questions[self.calls % len(self.questions)])
+            else:
+                questions.append(f"Stub trivia question #{self.calls} about {topic or 'anything'}?")
+        return questions
+
+
+# Provider names accepted by the TRIVIA_PROVIDER setting
+TRIVIA_PROVIDERS = {
+    'api-ninjas': lambda config: ApiNinjasTriviaProvider(
+        config['TRIVIA_API_URL'],
+        config['TRIVIA_API_KEY'],
+        (config['TRIVIA_CONNECT_TIMEOUT'], config['TRIVIA_READ_TIMEOUT'])),
+    'stub': lambda config: StubTriviaProvider(),
+}
+
+""" Prefetch Pool """
+
+class TriviaPool:
+    """
+    TriviaPool Class
+
+    Keeps a small per-topic buffer of trivia questions that a background thread refills, so a request normally
+    pops a question from memory instead of waiting on the upstream API.
+
+    - Topics become "wanted" the first time they are asked for; only the most recent TRIVIA_MAX_TOPICS are kept warm.
+    - When a topic's buffer is empty, a recently served (stale) question is returned and the refill thread is
+      woken to fetch more.
+    - A cold topic, with nothing buffered or stale, e.g. on its first request or after eviction, is fetched in
+      the request, one question bounded by the provider's timeout.  One request per topic fetches, others
+      asking for it meanwhile wait up to cold_wait seconds for its question.  None if that fails.
+
+    The refill thread is started lazily on first use, so each gunicorn worker starts its own after the fork.
+    """
+    STALE_SIZE = 20  # recently served questions remembered per topic
+
+    def __init__(self, provider, prefetch_size=5, refill_interval=30, max_topics=32, cold_wait=5):
+        self.provider = provider
+        self.prefetch_size = prefetch_size
+        self.refill_interval = refill_interval
+        self.max_topics = max_topics
+        self.cold_wait = cold_wait
+        self._buffers = OrderedDict()  # topic -> deque of fresh questions
+        self._stale = {}  # topic -> deque of recently served questions
+        self._cold = {}  # topic -> Event set when the request fetching the cold topic is done
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def get(self, topic):
+        """
+        Returns a question for the topic from the buffer, or a stale question when the buffer is empty.
+
+        Args:
+            topic (str): The trivia category.
+
+        Returns:
+            str: A question, or None when the topic is cold and the upstream gave none, try again shortly.
+        """
+        with self._lock:
+            buffer = self._want(topic)
+            question = buffer.popleft() if buffer else None
+        self._start_refiller()
+        self._wake.set()
+
+        if question is None:
+            return self._stale_question(topic) or self._fetch_cold(topic)
+        self._served(topic, question)
+        return question
+
+    def _served(self, topic, question):
+        with self._lock:
+            self._stale.setdefault(topic, deque(maxlen=self.STALE_SIZE)).append(question)
+
+    def _fetch_cold(self, topic):
+        """Fetches one question for a cold topic, once however many requests ask for it at the same time."""
+        with self._lock:
+            done = self._cold.get(topic)
+            if done is None:
+                done = self._cold[topic] = threading.Event()
+                fetching = True
+            else:
+                fetching = False
+        if not fetching:
+            done.wait(self.cold_wait)
+            with self._lock:
+                buffer = self._buffers.get(topic)
+                question = buffer.popleft() if buffer else None
+            if question is not None:
+                self._served(topic, question)
+                return question
+            return self._stale_question(topic)
+        try:
+            questions = self._fetch(topic, 1)
+            if questions:
+                self._served(topic, questions[0])
+                return questions[0]
+            return None
+        finally:
+            with self._lock:
+                self._cold.pop(topic, None)
+            done.set()
+
+    def refill(self):
+        """
+        Tops up every wanted topic's buffer to prefetch_size. Called by the refill thread.
+        """
+        with self._lock:
+            wanted = [(topic, self.prefetch_size - len(buffer)) for topic, buffer in self._buffers.items()]
+        for topic, missing in wanted:
+            if missing <= 0:
+                continue
+            questions = self._fetch(topic, missing)
+            if not questions:
+                continue  # upstream is unhappy, try again on the next interval
+            with self._lock:
+                if topic in self._buffers:
+                    self._buffers[topic].extend(questions)
+
+    def _want(self, topic):
+        # Mark topic as recently used, evicting the least recently used topic when over the limit
+        buffer = self._buffers.pop(topic, None)
+        if buffer is None:
+            buffer = deque(maxlen=self.prefetch_size)
+        self._buffers[topic] = buffer
+        while len(self._buffers) > self.max_topics:
+            evicted, _ = self._buffers.popitem(last=False)
+            self._stale.pop(evicted, None)
+        return buffer
+
+    def _fetch(self, topic, count):
+        try:
+            return self.provider.fetch(topic, count)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logging.warning(f"Trivia provider failed for topic '{topic}': {str(e)}")
+            return []
+
+    def _stale_question(self, topic):
+        with self._lock:
+            stale = self._stale.get(topic)
+            return random.choice(stale) if stale else None
+
+    def _start_refiller(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='trivia-refill', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+            self.refill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_trivia_pool():
+    """
+    Returns the process-wide TriviaPool, building it from app.config on first use.
+
+    Returns:
+        TriviaPool: The shared pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                provider = TRIVIA_PROVIDERS[app.config['TRIVIA_PROVIDER']](app.config)
+                _pool = TriviaPool(provider,
+                                   prefetch_size=app.config['TRIVIA_PREFETCH_SIZE'],
+                                   refill_interval=app.config['TRIVIA_REFILL_INTERVAL'],
+                                   max_topics=app.config['TRIVIA_MAX_TOPICS'],
+                                   cold_wait=app.config['TRIVIA_CONNECT_TIMEOUT'] + app.config['TRIVIA_READ_TIMEOUT'])
+    return _pool
+
+def set_trivia_provider(provider):
+    """
+    Replaces the trivia provider, e.g. with a StubTriviaProvider in tests.
+
+    Args:
+        provider (TriviaProvider): The provider to use from now on.
+
+    Returns:
+        TriviaPool: A fresh pool backed by the provider.
+    """
+    global _pool
+    with _pool_lock:
+        _pool = TriviaPool(provider,
+                           prefetch_size=app.config['TRIVIA_PREFETCH_SIZE'],
+                           refill_interval=app.config['TRIVIA_REFILL_INTERVAL'],
+                           max_topics=app.config['TRIVIA_MAX_TOPICS'],
+                           cold_wait=app.config['TRIVIA_CONNECT_TIMEOUT'] + app.config['TRIVIA_READ_TIMEOUT'])
+    return _pool
+
+def get_trivia_question(topic):
+    """
+    Returns a trivia question for the topic from the prefetch pool.
+
+    Args:
+        topic (str): The trivia category.
+
+    Returns:
+        str: The question, or None if none is available.
+    """
+    return get_trivia_pool().get(topic)
@@ -4,10 +4,16 @@ from flask_login import UserMixin
 from datetime import date
 from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import binascii
 import os
 import json
 
 from __init__ import app, db
+from model.jobs import JobError, enqueue, job_handler, job_progress, save_progress
+from model.blobstore import read_blob, store_blob, swap_reference
+from model.storage import get_storage
+from model.imaging import ImageError, reencode_image
 
 """ Helper Functions """
 
@@ -290,11 +296,12 @@ class User(db.Model, UserMixin):
     @pfp.setter
     def pfp(self, pfp):
         """
-        Sets the user's profile picture path.
+        Sets the user's profile picture path, or blob hash, moving the blob reference count.
         
         Args:
             pfp (str): The new profile picture path for the user.
         """
+        swap_reference(self._pfp, pfp)
         self._pfp = pfp
 
     @property
@@ -302,6 +309,7 @@ class User(db.Model, UserMixin):
         return self._car
     @car.setter
     def car(self, car):
+        swap_reference(self._car, car)
         self._car = car
     def create(self, inputs=None):
         """
@@ -358,6 +366,7 @@ class User(db.Model, UserMixin):
         uid = inputs.get("uid", "")
         password = inputs.get("password", "")
         pfp = inputs.get("pfp", None)
+        car = inputs.get("car", None)
 
         # Update table with new data
         if name:
@@ -368,6 +377,8 @@ class User(db.Model, UserMixin):
             self.set_password(password)
         if pfp is not None:
             self.pfp = pfp
+        if car is not None:
+            self.car = car
 
         # Check this on each update
         self.set_email()
@@ -387,29 +398,27 @@ class User(db.Model, UserMixin):
             None
         """
         try:
+            # Release the user's blobs for garbage collection
+            self.pfp = None
+            self.car = None
             db.session.delete(self)
             db.session.commit()
         except IntegrityError:
             db.session.rollback()
         return None   
     
-    def save_pfp(self, image_data, filename):
+    def save_pfp(self, image_data):
         """
-        Saves the user's profile picture.
+        Saves the user's profile picture in the blob store and points the user at it.
         
         Args:
             image_data (bytes): The image data of the profile picture.
-            filename (str): The filename of the profile picture.
         """
         try:
-            user_dir = os.path.join(app.config['UPLOAD_FOLDER'], self.uid)
-            if not os.path.exists(user_dir):
-                os.makedirs(user_dir)
-            file_path = os.path.join(user_dir, filename)
-            with open(file_path, 'wb') as img_file:
-                img_file.write(image_data)
-            self.update({"pfp": filename})
+            self.pfp = store_blob(image_data)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             raise e
         
     def delete_pfp(self):
@@ -419,23 +428,18 @@ class User(db.Model, UserMixin):
         self.pfp = None
         db.session.commit()
         
-    def save_car(self, image_data, filename):
+    def save_car(self, image_data):
         """
-        Saves the user's car picture.
+        Saves the user's car picture in the blob store and points the user at it.
         
         Args:
             image_data (bytes): The image data of the car picture.
-            filename (str): The filename of the car picture.
         """
         try:
-            user_dir = os.path.join(app.config['UPLOAD_FOLDER'], self.uid)
-            if not os.path.exists(user_dir):
-                os.makedirs(user_dir)
-            file_path = os.path.join(user_dir, filename)
-            with open(file_path, 'wb') as img_file:
-                img_file.write(image_data)
-            self.update({"car": filename})
+            self.car = store_blob(image_data)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             raise e
         
     def delete_car(self):
@@ -447,7 +451,7 @@ class User(db.Model, UserMixin):
         
     def set_uid(self, new_uid=None):
         """
-        Updates the user's directory based on the new UID provided.
+        Updates the user's UID and queues a job to move the user's upload directory to match.
 
         Args:
             new_uid (str, optional): The new UID to update the user's directory.
@@ -460,15 +464,8 @@ class User(db.Model, UserMixin):
         # Update the UID if a new one is provided
         if new_uid and new_uid != self._uid:
             self._uid = new_uid
-            # Commit the UID change to the database
-            db.session.commit()
-
-        # If the UID has changed, update the directory name
-        if old_uid != self._uid:
-            old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], old_uid)
-            new_path = os.path.join(current_app.config['UPLOAD_FOLDER'], self._uid)
-            if os.path.exists(old_path):
-                os.rename(old_path, new_path)
+            # Commits the UID change together with the job, the directory is renamed in the background
+            enqueue('user.move_uploads', {'user_id': self.id, 'old_uid': old_uid}, user_id=self.id)
                 
     @staticmethod
     def restore(data):
@@ -485,6 +482,107 @@ class User(db.Model, UserMixin):
         return users
 
 
+""" Background Jobs, see model/jobs.py """
+
+def stage_upload(base64_image):
+    """
+    Decodes an upload and stores it as is in the blob store, so the job that processes it is queued with
+    the hash rather than the image.  Nothing references the staged blob, blob_gc() removes it after the
+    grace period.  The caller commits, enqueue() does.
+
+    Raises:
+        ImageError: If the data is not base64.
+
+    Returns:
+        str: The staged blob's hash.
+    """
+    try:
+        data = base64.b64decode(base64_image, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise ImageError("Image data is not base64")
+    return store_blob(data)
+
+def prepare_image(upload):
+    """Reads a staged upload and re-encodes it for storage, see model/imaging.py."""
+    data = read_blob(upload)
+    if data is None:
+        raise JobError(f"Upload {upload} is no longer stored")
+    try:
+        image_data, _, _ = reencode_image(data)
+    except ImageError as e:
+        raise JobError(str(e))
+    return image_data
+
+def job_user(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise JobError(f"User {user_id} not found")
+    return user
+
+@job_handler('user.save_pfp')
+def save_pfp_job(user_id, upload):
+    """Re-encodes a staged profile picture and points the user at it."""
+    user = job_user(user_id)
+    user.save_pfp(prepare_image(upload))
+    return {'pfp': user.pfp}
+
+@job_handler('user.save_car')
+def save_car_job(user_id, upload):
+    """Re-encodes a staged car picture and points the user at it."""
+    user = job_user(user_id)
+    user.save_car(prepare_image(upload))
+    return {'car': user.car}
+
+@job_handler('user.move_uploads')
+def move_uploads_job(user_id, old_uid):
+    """
+    Moves a user's upload directory from an old UID to the user's current UID.  Only pictures saved
+    before the blob store live there.
+
+    Moving to the current UID rather than the one at the time of the rename keeps the result right
+    when two renames run out of order.
+    """
+    user = job_user(user_id)
+    if old_uid == user.uid or not get_storage('uploads').rename_prefix(old_uid, user.uid):
+        return {'moved': False}
+    return {'moved': True, 'uid': user.uid}
+
+@job_handler('users.bulk_create')
+def bulk_create_users_job(users):
+    """
+    Creates users from a list of user data, with the default password, as the bulk users API.
+
+    Each user is committed with the job's progress, so a retry, or a worker taking over the job, carries
+    on after the last user created instead of reporting the created ones as duplicates.
+
+    Returns:
+        dict: Counts of created and failed users and the error messages.
+    """
+    progress = job_progress() or {'done': 0, 'results': {'errors': [], 'success_count': 0, 'error_count': 0}}
+    results = progress['results']
+    for index in range(progress['done'], len(users)):
+        body = users[index]
+        name = body.get('name') if isinstance(body, dict) else None
+        uid = body.get('uid') if isinstance(body, dict) else None
+        if name is None or len(name) < 2:
+            error = 'Name is missing, or is less than 2 characters'
+        elif uid is None or len(uid) < 2:
+            error = 'User ID is missing, or is less than 2 characters'
+        else:
+            # The constructor sets the default password, the body's is ignored and not hashed a second time
+            user = User(name=name, uid=uid)
+            save_progress({'done': index + 1, 'results': {**results, 'success_count': results['success_count'] + 1}})
+            if user.create({key: value for key, value in body.items() if key != 'password'}) is not None:
+                results['success_count'] += 1
+                continue
+            error = f'Processed {name}, either a format error or User ID {uid} is duplicate'
+        results['errors'].append({'message': error})
+        results['error_count'] += 1
+        save_progress({'done': index + 1, 'results': results})
+        db.session.commit()
+    return results
+
+
 """Database Creation and Testing """
 
 def initUsers():
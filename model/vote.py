@@ -60,6 +60,24 @@ class Vote(db.Model):
             "post_id": self._post_id
         }
 
+    def update(self, vote_type):
+        """
+        Change the vote between "upvote" and "downvote" and commit the transaction.
+
+        Args:
+            vote_type (str): The new type of the vote.
+
+        Returns:
+            Vote: The updated vote.
+        """
+        self._vote_type = vote_type
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        return self
+
     def delete(self):
         """
         Remove the vote from the database and commit the transaction.
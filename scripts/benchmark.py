@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+""" benchmark.py
+Seeds a scratch SQLite database and measures the main REST endpoints in-process.
+
+Usage: Run from the root of the project:
+> scripts/benchmark.py --users 500 --posts 5000 --votes 20000 --requests 200 --concurrency 4 --output before.json
+
+Compare two runs:
+> scripts/benchmark.py --compare before.json after.json
+
+General Process outline:
+1. Point the app at a new SQLite file in a temporary directory, never the real database.
+2. Seed it with the init* generators, then add the requested volume of users, groups, channels, posts and votes
+   with model/synthetic.py.
+3. Drive each scenario through the Flask test client, from --concurrency threads each with its own client, logged
+   in before the clock starts.  A request is timed until its whole body is read, streamed bodies included, and
+   until its background job has finished for endpoints that answer 202.
+4. Report throughput, p50/p95/p99 latency and SQL statements per request as JSON.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Use a scratch database and keep the app quiet, both must be set before the app is imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix='flocker_bench_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'benchmark.db')}"
+os.environ['BLOB_FOLDER'] = os.path.join(SCRATCH_DIR, 'blobs')
+os.environ['SEARCH_INDEX_PATH'] = os.path.join(SCRATCH_DIR, 'search_index.bin')
+os.environ['CACHE_PATH'] = os.path.join(SCRATCH_DIR, 'cache.db')
+os.environ.setdefault('QUERY_COUNT_THRESHOLD', '0')
+
+# Add the directory containing main.py to the Python path
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_DIR)
+# Import application object
+from main import app, db, initUsers, initSections, initGroups, initChannels, initPosts, initNestPosts, initVotes
+from model.user import User
+from model.group import Group
+from model.channel import Channel
+from model.post import Post
+from model.vote import Vote
+from model.synthetic import generate_synthetic_data
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# The test client runs each request, and reads a streamed body, in the calling thread, so a per-thread
+# counter sees every statement of a request, including those run while the body streams
+_statements = threading.local()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _statements.count = getattr(_statements, 'count', 0) + 1
+
+def statement_count():
+    return getattr(_statements, 'count', 0)
+
+""" Seeding """
+
+def seed(users, groups, channels, posts, votes, seed_value):
+    """
+    Seeds the scratch database with the tester data plus the requested volume of extra rows.
+
+    Args:
+        users, groups, channels, posts, votes (int): Extra rows to add on top of the tester data.
+        seed_value (int): Random seed so runs are reproducible.
+
+    Returns:
+        dict: Row counts per table after seeding.
+    """
+    for init in [initUsers, initSections, initGroups, initChannels, initPosts, initNestPosts, initVotes]:
+        init()
+
+    generate_synthetic_data(seed=seed_value, counts={
+        'users': users, 'groups': groups, 'channels': channels, 'posts': posts, 'votes': votes})
+
+    with app.app_context():
+        # Give the benchmark user a real profile picture to read back
+        admin = User.query.filter_by(_uid=app.config['ADMIN_USER']).first()
+        with open(os.path.join(PROJECT_DIR, 'static', 'assets', 'flask.png'), 'rb') as img_file:
+            admin.save_pfp(img_file.read())
+
+        return {
+            'users': User.query.count(),
+            'groups': Group.query.count(),
+            'channels': Channel.query.count(),
+            'posts': Post.query.count(),
+            'votes': Vote.query.count(),
+        }
+
+""" Scenarios """
+
+def scenarios(rng):
+    """
+    Returns the benchmark scenarios as name -> function(client, n) that issues one request.
+    """
+    with app.app_context():
+        busiest_channel = db.session.query(Post._channel_id, db.func.count(Post.id)) \
+            .group_by(Post._channel_id).order_by(db.func.count(Post.id).desc()).first()[0]
+        post_ids = [row[0] for row in db.session.query(Post.id).all()]
+    credentials = {'uid': app.config['ADMIN_USER'], 'password': app.config['ADMIN_PASSWORD']}
+    run_id = int(time.time())
+
+    return {
+        'authenticate': lambda client, n: client.post('/api/authenticate', json=credentials),
+        'posts_filter': lambda client, n: client.post('/api/posts/filter', json={'channel_id': busiest_channel}),
+        'posts_list': lambda client, n: client.get('/api/posts'),
+        'groups_list': lambda client, n: client.get('/api/groups'),
+        'users_list': lambda client, n: client.get('/api/users'),
+        'vote_post': lambda client, n: client.get(f'/api/vote/post?post_id={rng.choice(post_ids)}'),
+        'vote_cast': lambda client, n: client.post('/api/vote', json={'post_id': rng.choice(post_ids),
+                                                                      'vote_type': rng.choice(['upvote', 'downvote'])}),
+        'pfp': lambda client, n: client.get('/api/id/pfp'),
+        'users_bulk_create': lambda client, n: client.post('/api/users', json=[
+            {'name': f'Bulk User {run_id}-{n}-{i}', 'uid': f'bulk{run_id}_{n}_{i}'} for i in range(10)]),
+    }
+
+def wait_for_job(client, response, timeout=300):
+    """
+    Polls the job of a 202 response until it is done or failed.
+
+    Returns:
+        Response: The last status response, with status 500 if the job failed.
+    """
+    if response.status_code != 202:
+        return response
+    deadline = time.perf_counter() + timeout
+    while True:
+        status = client.get(response.headers['Location'])
+        state = status.get_json().get('status') if status.status_code == 200 else None
+        if state in ('done', 'failed') or status.status_code != 200 or time.perf_counter() > deadline:
+            break
+        time.sleep(0.05)
+    if state != 'done':
+        status.status_code = 500  # counted as an error
+    return status
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_scenario(name, request_fn, requests, concurrency):
+    """
+    Issues requests for one scenario across concurrency threads.
+
+    Returns:
+        dict: throughput, latency percentiles in ms, SQL statements per request and error count.
+    """
+    credentials = {'uid': app.config['ADMIN_USER'], 'password': app.config['ADMIN_PASSWORD']}
+    per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    # Logging in costs a pbkdf2 hash, keep it out of the timed part
+    clients = []
+    for _ in range(concurrency):
+        client = app.test_client()
+        client.post('/api/authenticate', json=credentials)
+        clients.append(client)
+
+    def worker(thread_index):
+        client = clients[thread_index]
+        samples = []
+        for i in range(per_thread[thread_index]):
+            statements = statement_count()
+            start = time.perf_counter()
+            response = request_fn(client, thread_index * requests + i)
+            response.get_data()  # a streamed body is generated as it is read
+            response.close()  # runs the close hooks a WSGI server would
+            queries = statement_count() - statements  # the request's own, not the job's or the polling
+            response = wait_for_job(client, response)
+            elapsed = time.perf_counter() - start
+            samples.append((elapsed, queries, response.status_code))
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [sample for result in pool.map(worker, range(concurrency)) for sample in result]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[1] for sample in samples]
+    errors = sum(1 for sample in samples if sample[2] >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 1) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+""" Reporting """
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(before_path, after_path):
+    """
+    Prints the change in p50/p95 latency, throughput and queries per scenario between two reports.
+    """
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'scenario':<20} {'p50 ms':>16} {'p95 ms':>16} {'rps':>16} {'queries':>12}")
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if not old:
+            continue
+        def change(a, b):
+            return f"{a}->{b}" if a is not None and b is not None else "-"
+        print(f"{name:<20} {change(old['latency_ms']['p50'], new['latency_ms']['p50']):>16} "
+              f"{change(old['latency_ms']['p95'], new['latency_ms']['p95']):>16} "
+              f"{change(old['throughput_rps'], new['throughput_rps']):>16} "
+              f"{change(old['queries_per_request']['mean'], new['queries_per_request']['mean']):>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the REST API against a seeded scratch database.')
+    parser.add_argument('--users', type=int, default=200, help='extra users to seed')
+    parser.add_argument('--groups', type=int, default=20, help='extra groups to seed')
+    parser.add_argument('--channels', type=int, default=50, help='extra channels to seed')
+    parser.add_argument('--posts', type=int, default=2000, help='extra posts to seed')
+    parser.add_argument('--votes', type=int, default=5000, help='extra votes to seed')
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads per scenario')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario, may be repeated')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and request mix')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--keep-db', action='store_true', help='keep the scratch database and print its path')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two JSON reports')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+        return
+
+    app.config['UPLOAD_FOLDER'] = os.path.join(SCRATCH_DIR, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    seed_start = time.perf_counter()
+    # The init* generators print every record, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        counts = seed(args.users, args.groups, args.channels, args.posts, args.votes, args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    rng = random.Random(args.seed)
+    results = {}
+    for name, request_fn in scenarios(rng).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        print(f"Running {name} ...", file=sys.stderr)
+        results[name] = run_scenario(name, request_fn, args.requests, args.concurrency)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'database': 'sqlite',
+            'rows': counts,
+            'seed_seconds': round(seed_seconds, 2),
+            'requests_per_scenario': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.keep_db:
+        print(f"Scratch database kept in {SCRATCH_DIR}", file=sys.stderr)
+    else:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
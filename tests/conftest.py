@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its settings at import, point everything it writes at a scratch directory first
+SCRATCH_DIR = tempfile.mkdtemp(prefix='flocker_tests_')
+os.environ.update({
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}",
+    'SCHEDULER_ENABLED': '0',
+    'JOB_QUEUE_MODE': 'inline',
+    'IMAGE_POOL_SIZE': '0',
+    'CACHE_PATH': os.path.join(SCRATCH_DIR, 'cache.db'),
+    'BLOB_FOLDER': os.path.join(SCRATCH_DIR, 'blobs'),
+    'SEARCH_INDEX_PATH': os.path.join(SCRATCH_DIR, 'search_index.bin'),
+    'TRIVIA_PROVIDER': 'stub',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app as flask_app  # noqa: E402
+from __init__ import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """The app with empty tables and cache, inside an app context."""
+    from model.cache import get_cache
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        get_cache().clear()  # ids start over, so would the cached pages
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Creates users, returns the User."""
+    from model.user import User
+
+    def make(uid, role='User', password='pass123!'):
+        user = User(name=uid.title(), uid=uid, password=password, role=role)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_channel(app):
+    """Creates a channel in a new group and section, returns the Channel."""
+    from model.channel import Channel
+    from model.group import Group
+    from model.section import Section
+
+    def make(name='General'):
+        section = Section(f'{name} Section')
+        db.session.add(section)
+        db.session.commit()
+        group = Group(f'{name} Group', section.id)
+        db.session.add(group)
+        db.session.commit()
+        channel = Channel(name, group.id)
+        db.session.add(channel)
+        db.session.commit()
+        return channel
+    return make
+
+
+@pytest.fixture
+def login(client):
+    """Logs the test client in, sets the JWT cookie."""
+    def log_in(uid, password='pass123!'):
+        response = client.post('/api/authenticate', json={'uid': uid, 'password': password})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response
+    return log_in
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import pytest
+from __init__ import db
+from model.blobstore import Blob, blob_gc, read_blob, retain, store_blob
+
+
+def ref_count(blob_hash):
+    blob = db.session.get(Blob, blob_hash)
+    return blob and blob.refcount
+
+def age(*hashes):
+    """Moves the blobs past the grace period."""
+    for blob_hash in hashes:
+        db.session.get(Blob, blob_hash).touched_at = datetime.utcnow() - timedelta(days=1)
+    db.session.commit()
+
+
+def test_user_columns_count_references(make_user):
+    first, second = store_blob(b'first picture'), store_blob(b'second picture')
+    alice, bob = make_user('alice'), make_user('bob')
+    alice.pfp = first
+    bob.car = first
+    db.session.commit()
+    assert ref_count(first) == 2
+    assert store_blob(b'first picture') == first  # stored once
+
+    alice.pfp = second
+    db.session.commit()
+    assert (ref_count(first), ref_count(second)) == (1, 1)
+
+
+def test_gc_deletes_only_unreferenced_blobs_past_the_grace(app, make_user):
+    kept, dropped, fresh = store_blob(b'kept'), store_blob(b'dropped'), store_blob(b'fresh')
+    alice = make_user('alice')
+    alice.pfp = kept
+    db.session.commit()
+    age(kept, dropped)
+
+    assert blob_gc(grace_seconds=3600) == 1
+    assert db.session.get(Blob, dropped) is None
+    assert read_blob(dropped) is None
+    assert read_blob(kept) == b'kept'
+    assert read_blob(fresh) == b'fresh'
+
+
+def test_a_reference_the_counts_missed_is_not_collected(app, make_user):
+    blob_hash = store_blob(b'restored')
+    alice = make_user('alice')
+    alice._pfp = blob_hash  # bypassing the setter, as a restore would
+    db.session.commit()
+    age(blob_hash)
+    assert blob_gc(grace_seconds=3600) == 0
+    assert ref_count(blob_hash) == 1
+    assert read_blob(blob_hash) == b'restored'
+
+
+def test_a_collected_blob_is_not_retained_or_stored_half(app):
+    blob_hash = store_blob(b'collected')
+    age(blob_hash)
+    assert blob_gc(grace_seconds=3600) == 1
+
+    # A late reference finds no file, and counts nothing
+    retain(blob_hash)
+    db.session.commit()
+    assert db.session.get(Blob, blob_hash) is None
+    # Storing it again brings back both row and file
+    assert store_blob(b'collected') == blob_hash
+    db.session.commit()
+    assert read_blob(blob_hash) == b'collected'
+    assert ref_count(blob_hash) == 0
+
+
+def test_a_failed_delete_puts_the_file_back(app, monkeypatch):
+    blob_hash = store_blob(b'survivor')
+    age(blob_hash)
+    session = db.session()
+    commit = session.commit
+
+    def failing_commit():
+        if read_blob(blob_hash) is None:
+            raise RuntimeError('connection lost')
+        commit()
+    monkeypatch.setattr(session, 'commit', failing_commit)
+    with pytest.raises(RuntimeError):
+        blob_gc(grace_seconds=3600)
+    monkeypatch.undo()
+    assert db.session.get(Blob, blob_hash) is not None
+    assert read_blob(blob_hash) == b'survivor'
@@ -0,0 +1,119 @@
+import pytest
+from __init__ import db
+from model.cache import SqliteCache, cached, get_cache, invalidate
+from model.post import Post
+from model.post_score import PostScore, ranked_page
+from model.vote import Vote
+
+
+@pytest.fixture
+def posts(make_user, make_channel):
+    """Four posts, scored 100, 50, 0 and 0 without going through the votes."""
+    user, channel = make_user('alice'), make_channel()
+    posts = [Post(f'Post {i}', 'Body', user.id, channel.id) for i in range(4)]
+    db.session.add_all(posts)
+    db.session.commit()
+    for post, score in zip(posts, (100, 50, 0, 0)):
+        set_score(post, score)
+    db.session.commit()
+    get_cache().clear()
+    return user, channel, posts
+
+def set_score(post, score):
+    row = db.session.get(PostScore, post.id)
+    row.upvotes = row.score = score
+
+def is_cached(*args):
+    return get_cache().get(f"model.post_score.ranked_page:{':'.join(map(str, args))}") is not None
+
+def vote(user, post):
+    db.session.add(Vote('upvote', user.id, post.id))
+    db.session.commit()
+
+
+def test_a_vote_drops_only_the_pages_showing_the_post(posts):
+    user, channel, posts = posts
+    newest = ranked_page(channel.id, 'new', 1, 0)
+    oldest = ranked_page(channel.id, 'new', 1, 3)
+    assert (newest[0]['id'], oldest[0]['id']) == (posts[3].id, posts[0].id)
+
+    vote(user, posts[0])
+    assert is_cached(channel.id, 'new', 1, 0)
+    assert not is_cached(channel.id, 'new', 1, 3)
+    assert ranked_page(channel.id, 'new', 1, 3)[0]['upvotes'] == 101
+
+
+def test_a_vote_keeps_top_pages_it_does_not_move_past(posts):
+    user, channel, posts = posts
+    assert [post['score'] for post in ranked_page(channel.id, 'top', 2, 0)] == [100, 50]
+    assert [post['score'] for post in ranked_page(channel.id, 'top', 2, 2)] == [0, 0]
+
+    vote(user, posts[2])  # 0 to 1, far below the first page
+    assert is_cached(channel.id, 'top', 2, 0)
+    assert not is_cached(channel.id, 'top', 2, 2)
+    assert [post['score'] for post in ranked_page(channel.id, 'top', 2, 2)] == [1, 0]
+
+
+def test_a_vote_moving_a_post_up_drops_the_pages_it_passes(posts):
+    user, channel, posts = posts
+    set_score(posts[2], 49)
+    db.session.commit()
+    get_cache().clear()
+    ranked_page(channel.id, 'top', 2, 0)
+    ranked_page(channel.id, 'top', 2, 2)
+
+    vote(user, posts[2])  # 49 to 50, ties the last post of the first page
+    assert not is_cached(channel.id, 'top', 2, 0)
+    assert not is_cached(channel.id, 'top', 2, 2)
+
+
+def test_editing_a_post_drops_the_pages_showing_it(posts):
+    user, channel, posts = posts
+    ranked_page(channel.id, 'new', 1, 0)
+    ranked_page(channel.id, 'new', 1, 3)
+    posts[0]._title = 'Renamed'
+    db.session.commit()
+    assert is_cached(channel.id, 'new', 1, 0)
+    assert ranked_page(channel.id, 'new', 1, 3)[0]['title'] == 'Renamed'
+
+
+def test_a_new_post_drops_every_page_of_its_channel(posts):
+    user, channel, posts = posts
+    ranked_page(channel.id, 'top', 2, 0)
+    ranked_page(channel.id, 'new', 1, 3)
+    db.session.add(Post('Another', 'Body', user.id, channel.id))
+    db.session.commit()
+    assert not is_cached(channel.id, 'top', 2, 0)
+    assert not is_cached(channel.id, 'new', 1, 3)
+
+
+def test_a_result_invalidated_while_it_is_built_is_not_stored(app):
+    builds = []
+
+    @cached('{name}', tags=['thing:{name}'])
+    def build(name, racing):
+        builds.append(name)
+        if racing:
+            invalidate(f'thing:{name}')  # a commit landing after the read
+        return f'{name} v{len(builds)}'
+
+    assert build('a', racing=True) == 'a v1'
+    assert build('a', racing=False) == 'a v2'
+    assert build('a', racing=False) == 'a v2'
+    assert builds == ['a', 'a']
+
+
+def test_sqlite_sets_check_the_tag_versions(tmp_path):
+    cache = SqliteCache(str(tmp_path / 'cache.db'), max_entries=100, max_bytes=1 << 20)
+    since = cache.sequence()
+    cache.invalidate(['channel:1'])
+    assert not cache.set('page', b'stale', 60, ['channel:1', 'user:1'], since=since)
+    assert cache.set('other', b'fresh', 60, ['channel:2'], since=since)
+    assert cache.get('page') is None
+
+    since = cache.sequence()
+    assert cache.set('page', b'fresh', 60, ['channel:1'], since=since)
+    cache.clear()
+    assert not cache.set('page', b'stale', 60, ['channel:3'], since=since)
+    assert cache.set('page', b'fresh', 60, ['channel:3'], since=cache.sequence())
+    assert cache.get('page') == b'fresh'
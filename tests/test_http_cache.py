@@ -0,0 +1,37 @@
+import pytest
+from __init__ import db
+from model.post import Post
+
+
+@pytest.fixture
+def channel_id(make_user, make_channel):
+    user, channel = make_user('alice'), make_channel()
+    db.session.add_all([Post(f'Post {i}', 'Body', user.id, channel.id) for i in range(3)])
+    db.session.commit()
+    channel_id = channel.id
+    db.session.remove()  # the requests share this app context
+    return channel_id
+
+@pytest.mark.parametrize('query', ['channel_id={id}', 'channel_id={id}&sort=top', ''])
+def test_cacheable_listings_answer_if_none_match(client, channel_id, query):
+    url = f"/api/posts?{query.format(id=channel_id)}"
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'].startswith('public')
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+
+def test_a_new_post_changes_the_etag(client, channel_id, make_user):
+    url = f"/api/posts?channel_id={channel_id}"
+    etag = client.get(url).headers['ETag']
+    db.session.add(Post('Another', 'Body', make_user('bob').id, channel_id))
+    db.session.commit()
+    db.session.remove()
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 4
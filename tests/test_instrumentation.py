@@ -0,0 +1,33 @@
+def test_metrics_off_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_need_the_token(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    client.get('/api/channels').close()  # streamed, recorded when the body closes
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'flask_requests_total{method="GET",route="/api/channels",status="200"}' in response.get_data(as_text=True)
+
+
+def test_server_timing_counts_queries(client, make_user, make_channel):
+    from __init__ import db
+    from model.post import Post
+    user, channel = make_user('alice'), make_channel()
+    db.session.add(Post('Counted', 'Body', user.id, channel.id))
+    db.session.commit()
+    url = f'/api/posts?channel_id={channel.id}&sort=top'
+    # The page, then its authors and channels with selectinload
+    assert client.get(url).headers['Server-Timing'].endswith('desc="3 queries"')
+    # Then from the shared cache
+    assert client.get(url).headers['Server-Timing'].endswith('desc="0 queries"')
+
+
+def test_streamed_response_has_no_server_timing(client, make_user, login):
+    make_user('admin', role='Admin')
+    login('admin')
+    response = client.get('/api/groups')  # not cacheable, so still streamed
+    assert 'Server-Timing' not in response.headers
+    response.close()
@@ -0,0 +1,175 @@
+import base64
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from __init__ import db
+from model import jobs
+from model.jobs import DONE, FAILED, QUEUED, RUNNING, Job, JobError, claim_next, enqueue, job_handler, run_job
+
+
+@pytest.fixture
+def queued(app, monkeypatch):
+    """Jobs stay queued until a test claims them."""
+    monkeypatch.setitem(app.config, 'JOB_QUEUE_MODE', 'worker')
+    monkeypatch.setitem(app.config, 'JOB_RETRY_SECONDS', 10)
+    calls = []
+
+    @job_handler('test.flaky')
+    def flaky(fail_times, fatal=False):
+        calls.append(1)
+        if fatal:
+            raise JobError('not worth retrying')
+        if len(calls) <= fail_times:
+            raise RuntimeError('try again')
+        return {'calls': len(calls)}
+    yield calls
+    jobs.HANDLERS.pop('test.flaky')
+
+def make_due(job_id):
+    db.session.get(Job, job_id).run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_a_job_is_claimed_once(queued):
+    job = enqueue('test.flaky', {'fail_times': 0})
+    assert claim_next('worker-a') == job.id
+    assert claim_next('worker-b') is None
+    # A worker that lost the claim does not run it
+    run_job(job.id, 'worker-b')
+    assert queued == []
+    assert run_job(job.id, 'worker-a').status == DONE
+
+
+def test_failed_attempts_are_retried_with_backoff(queued):
+    job = enqueue('test.flaky', {'fail_times': 1})
+    job = run_job(claim_next('worker'), 'worker')
+    assert (job.status, job.attempts) == (QUEUED, 1)
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=5)
+    assert claim_next('worker') is None  # not due yet
+
+    make_due(job.id)
+    job = run_job(claim_next('worker'), 'worker')
+    assert (job.status, job.attempts) == (DONE, 2)
+    assert json.loads(job.result) == {'calls': 2}
+
+
+def test_a_job_fails_after_max_attempts(queued):
+    job = enqueue('test.flaky', {'fail_times': 5}, max_attempts=2)
+    run_job(claim_next('worker'), 'worker')
+    make_due(job.id)
+    job = run_job(claim_next('worker'), 'worker')
+    assert (job.status, job.attempts) == (FAILED, 2)
+    assert 'try again' in job.error
+
+
+def test_job_error_is_not_retried(queued):
+    job = enqueue('test.flaky', {'fail_times': 0, 'fatal': True})
+    job = run_job(claim_next('worker'), 'worker')
+    assert (job.status, job.attempts) == (FAILED, 1)
+
+
+def test_a_stale_lease_is_queued_again(app, queued):
+    job = enqueue('test.flaky', {'fail_times': 0})
+    claim_next('dead-worker')
+    db.session.get(Job, job.id).locked_at = datetime.utcnow() - timedelta(seconds=app.config['JOB_LEASE_SECONDS'] + 1)
+    db.session.commit()
+    assert db.session.get(Job, job.id).status == RUNNING
+    assert jobs.requeue_stale_jobs() == 1
+    assert claim_next('worker') == job.id
+
+
+def test_bulk_create_needs_a_login_and_its_job_is_visible_to_the_caller(client, make_user, login):
+    make_user('alice')
+    users = [{'name': 'Bulk One', 'uid': 'bulk1'}]
+    assert client.post('/api/users', json=users).status_code == 401
+    login('alice')
+    response = client.post('/api/users', json=users)
+    assert response.status_code == 202
+    status = client.get(response.headers['Location'])
+    assert status.status_code == 200
+    assert status.get_json()['result']['success_count'] == 1
+
+
+def test_upload_job_is_queued_with_a_blob_reference(app, client, make_user, login):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, format='PNG')
+    image = base64.b64encode(buffer.getvalue()).decode()
+    make_user('alice')
+    login('alice')
+    response = client.put('/api/id/pfp', json={'pfp': image})
+    assert response.status_code == 202
+    job = db.session.get(Job, response.get_json()['job']['id'])
+    assert image not in job.payload
+    assert len(json.loads(job.payload)['upload']) == 64
+    assert job.status == DONE
+
+
+def test_a_run_that_lost_its_lease_records_nothing(app, queued):
+    @job_handler('test.overrun')
+    def overrun():
+        # Runs past its lease, another worker takes the job over
+        db.session.get(Job, job.id).locked_at = datetime.utcnow() - timedelta(seconds=app.config['JOB_LEASE_SECONDS'] + 1)
+        db.session.commit()
+        jobs.requeue_stale_jobs()
+        assert claim_next('worker-b') == job.id
+        return {'by': 'worker-a'}
+    try:
+        job = enqueue('test.overrun', {})
+        job = run_job(claim_next('worker-a'), 'worker-a')
+        assert (job.status, job.locked_by, job.result) == (RUNNING, 'worker-b', None)
+    finally:
+        jobs.HANDLERS.pop('test.overrun')
+
+
+def test_saving_progress_renews_the_lease_or_stops_the_run(app, queued):
+    @job_handler('test.steps')
+    def steps(count):
+        done = jobs.job_progress() or 0
+        for step in range(done, count):
+            locked_at = db.session.get(Job, job.id).locked_at
+            jobs.save_progress(step + 1)
+            db.session.commit()
+            assert db.session.get(Job, job.id, populate_existing=True).locked_at >= locked_at
+            if step == 0:
+                db.session.execute(jobs.Job.__table__.update().values(locked_by='worker-b'))
+                db.session.commit()
+        return done
+    try:
+        job = enqueue('test.steps', {'count': 3})
+        job = run_job(claim_next('worker-a'), 'worker-a')
+        # Stopped at the second step, and left to worker-b
+        assert (job.status, job.locked_by, json.loads(job.result)) == (RUNNING, 'worker-b', 1)
+    finally:
+        jobs.HANDLERS.pop('test.steps')
+
+
+def test_a_retried_bulk_create_resumes(app, queued, monkeypatch):
+    from model.user import User
+    create = User.create
+
+    def failing_create(self, inputs=None):
+        if self.uid == 'bulk2':
+            raise RuntimeError('database went away')
+        return create(self, inputs)
+    monkeypatch.setattr(User, 'create', failing_create)
+    users = [{'name': f'Bulk {i}', 'uid': f'bulk{i}'} for i in range(1, 4)]
+    job = enqueue('users.bulk_create', {'users': users})
+    job = run_job(claim_next('worker'), 'worker')
+    assert (job.status, json.loads(job.result)['done']) == (QUEUED, 1)
+
+    monkeypatch.setattr(User, 'create', create)
+    make_due(job.id)
+    job = run_job(claim_next('worker'), 'worker')
+    assert job.status == DONE
+    assert json.loads(job.result) == {'errors': [], 'success_count': 3, 'error_count': 0}
+    assert User.query.filter(User._uid.like('bulk%')).count() == 3
+
+
+def test_bulk_create_is_capped(app, client, make_user, login, monkeypatch):
+    monkeypatch.setitem(app.config, 'BULK_USERS_MAX', 2)
+    make_user('alice')
+    login('alice')
+    users = [{'name': f'Bulk {i}', 'uid': f'bulk{i}'} for i in range(3)]
+    assert client.post('/api/users', json=users).status_code == 413
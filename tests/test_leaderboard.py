@@ -0,0 +1,100 @@
+import random
+import pytest
+from __init__ import db
+from model.leaderboard import FenwickTree, RiddleLeaderboardEntry, ScoreRanks, entry_for_user
+from model.riddle import Riddle
+from model.riddle_answers import riddle_answer_buffer
+
+
+def test_fenwick_prefix_sums_match_a_plain_sum():
+    rng = random.Random(7)
+    counts = [rng.randint(0, 5) for _ in range(200)]
+    fenwick = FenwickTree.from_counts(counts)
+    for _ in range(300):
+        slot = rng.randrange(len(counts))
+        delta = rng.randint(-2, 3)
+        counts[slot] += delta
+        fenwick.add(slot, delta)
+        probe = rng.randrange(len(counts))
+        assert fenwick.prefix_sum(probe) == sum(counts[:probe + 1])
+    assert fenwick.prefix_sum(len(counts) - 1) == sum(counts)
+
+
+def test_ranks_share_ties_and_follow_moves(app, make_user):
+    for uid, points in [('ann', 50), ('bob', 30), ('cat', 30), ('dan', 10)]:
+        user = make_user(uid)
+        db.session.add(RiddleLeaderboardEntry(user.id, points=points))
+    db.session.commit()
+    ranks = ScoreRanks(max_points=1000, refresh_seconds=60)
+    assert ranks.total() == 4
+    assert [ranks.rank(points) for points in (50, 30, 10)] == [1, 2, 4]
+    ranks.move(10, 60)
+    assert ranks.rank(60) == 1
+    assert ranks.rank(50) == 2
+
+
+def test_top_bucket_is_counted_in_the_table(app, make_user):
+    for uid, points in [('ann', 500), ('bob', 300), ('cat', 20)]:
+        user = make_user(uid)
+        db.session.add(RiddleLeaderboardEntry(user.id, points=points))
+    db.session.commit()
+    ranks = ScoreRanks(max_points=100, refresh_seconds=60)
+    assert [ranks.rank(points) for points in (500, 300, 20)] == [1, 2, 3]
+
+
+@pytest.fixture
+def riddle(app):
+    riddle = Riddle('What has keys but opens no locks?', 'A piano')
+    db.session.add(riddle)
+    db.session.commit()
+    return riddle
+
+
+def test_answers_are_checked_by_the_server(client, make_user, login, riddle):
+    user = make_user('alice')
+    login('alice')
+    url = '/api/leaderboard/riddles/answers'
+    assert client.post(url, json={'riddle_id': riddle.id, 'correct': True}).status_code == 400
+    assert client.post(url, json={'riddle_id': riddle.id + 1, 'answer': 'a piano'}).status_code == 404
+
+    response = client.post(url, json={'riddle_id': riddle.id, 'answer': 'a  PIANO!', 'correct': False})
+    assert response.status_code == 202
+    assert response.get_json()['correct'] is True
+    assert client.post(url, json={'riddle_id': riddle.id, 'answer': 'a piano'}).status_code == 409
+
+    riddle_answer_buffer.flush()
+    db.session.expire_all()
+    entry = entry_for_user(user.id)
+    assert (entry.correct_answers, entry.total_attempts) == (1, 1)
+
+
+def test_a_wrong_answer_is_an_attempt(client, make_user, login, riddle):
+    user = make_user('alice')
+    login('alice')
+    response = client.post('/api/leaderboard/riddles/answers', json={'riddle_id': riddle.id, 'answer': 'a keyboard'})
+    assert response.get_json()['correct'] is False
+    riddle_answer_buffer.flush()
+    db.session.expire_all()
+    entry = entry_for_user(user.id)
+    assert (entry.correct_answers, entry.total_attempts) == (0, 1)
+
+
+def test_a_flush_moves_ranks_without_reloading(client, make_user, login, riddle):
+    from model.leaderboard import riddle_ranks
+    ann, bob = make_user('ann'), make_user('bob')
+    db.session.add_all([RiddleLeaderboardEntry(ann.id, correct_answers=1, points=10),
+                        RiddleLeaderboardEntry(bob.id, correct_answers=1, points=10)])
+    db.session.commit()
+    riddle_ranks.invalidate()
+    assert riddle_ranks.rank(10) == 1
+    loaded_at = riddle_ranks._loaded_at
+
+    login('bob')
+    client.post('/api/leaderboard/riddles/answers', json={'riddle_id': riddle.id, 'answer': 'a piano'})
+    make_user('cat')
+    login('cat')
+    client.post('/api/leaderboard/riddles/answers', json={'riddle_id': riddle.id, 'answer': 'a piano'})
+    riddle_answer_buffer.flush()
+    assert [riddle_ranks.rank(points) for points in (20, 10)] == [1, 2]
+    assert riddle_ranks.total() == 3
+    assert riddle_ranks._loaded_at == loaded_at
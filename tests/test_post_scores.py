@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import pytest
+from __init__ import db
+from model.post import Post
+from model.post_score import PostScore, backfill_post_scores, ranked_posts, rebuild_post_scores
+from model.vote import Vote
+
+
+@pytest.fixture
+def channel(make_user, make_channel):
+    return make_user('alice'), make_channel()
+
+def insert_without_orm(post_id, user, channel):
+    db.session.execute(Post.__table__.insert().values(id=post_id, _title=f'Post {post_id}', _comment='Bulk loaded',
+                                                      _content={}, _user_id=user.id, _channel_id=channel.id))
+    db.session.commit()
+
+def ranked_ids(channel, sort='new'):
+    return [post.id for post, _ in ranked_posts(channel.id, sort)]
+
+
+def test_backfill_adds_posts_loaded_without_the_orm(channel):
+    user, channel = channel
+    insert_without_orm(1, user, channel)
+    newer = Post('Written later', 'Through the ORM', user.id, channel.id)
+    db.session.add(newer)
+    db.session.commit()
+    db.session.add(Vote('upvote', user.id, 1))
+    db.session.commit()
+    assert ranked_ids(channel) == [newer.id]
+
+    assert backfill_post_scores() == 1
+    assert backfill_post_scores() == 0
+    assert ranked_ids(channel) == [newer.id, 1]
+    assert ranked_ids(channel, 'top') == [1, newer.id]
+    # Dated by the newer post, not now
+    assert db.session.get(PostScore, 1).created_at == db.session.get(PostScore, newer.id).created_at
+
+
+def test_rebuild_keeps_recorded_times_and_dates_the_rest_by_newer_posts(channel):
+    user, channel = channel
+    insert_without_orm(1, user, channel)
+    post = Post('Recorded', 'Through the ORM', user.id, channel.id)
+    db.session.add(post)
+    db.session.commit()
+    recorded = datetime.utcnow() - timedelta(days=3)
+    db.session.get(PostScore, post.id).created_at = recorded
+    db.session.commit()
+
+    rebuild_post_scores()
+    assert db.session.get(PostScore, post.id).created_at == recorded
+    assert db.session.get(PostScore, 1).created_at == recorded
+
+
+def test_votes_move_the_score(channel):
+    user, channel = channel
+    post = Post('Voted on', 'Up then down', user.id, channel.id)
+    db.session.add(post)
+    db.session.commit()
+    vote = Vote('upvote', user.id, post.id)
+    db.session.add(vote)
+    db.session.commit()
+    assert (db.session.get(PostScore, post.id).upvotes, db.session.get(PostScore, post.id).score) == (1, 1)
+    vote.update('downvote')
+    score = db.session.get(PostScore, post.id)
+    db.session.refresh(score)
+    assert (score.upvotes, score.downvotes, score.score) == (0, 1, -1)
+
+
+def test_unknown_vote_type_is_refused(channel):
+    user, channel = channel
+    post = Post('Voted on', 'Sideways', user.id, channel.id)
+    db.session.add(post)
+    db.session.commit()
+    db.session.add(Vote('sideways', user.id, post.id))
+    with pytest.raises(ValueError):
+        db.session.commit()
+    db.session.rollback()
+    assert Vote.query.count() == 0
+    assert db.session.get(PostScore, post.id).score == 0
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import pytest
+from __init__ import db
+from model import scheduler
+from model.scheduler import LEADER_LOCK, ScheduledJob, Scheduler, SchedulerLock, acquire_lease, release_lease
+
+
+@pytest.fixture
+def runs(app, monkeypatch):
+    """Only a counting job is registered."""
+    runs = []
+    monkeypatch.setattr(scheduler, 'JOBS', {})
+    scheduler.scheduled_job('test.count', minutes=5)(lambda: runs.append(1))
+    return runs
+
+def make_scheduler(owner):
+    worker = Scheduler(tick_seconds=10)
+    worker.owner = owner
+    return worker
+
+
+def test_only_one_worker_holds_the_lease(app):
+    assert acquire_lease('lock', 'worker-a', 30)
+    assert not acquire_lease('lock', 'worker-b', 30)
+    assert acquire_lease('lock', 'worker-a', 30)  # renewing
+
+
+def test_an_expired_lease_is_taken_over(app):
+    assert acquire_lease('lock', 'worker-a', 30)
+    db.session.get(SchedulerLock, 'lock').expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert acquire_lease('lock', 'worker-b', 30)
+    assert not acquire_lease('lock', 'worker-a', 30)
+
+
+def test_a_released_lease_is_free(app):
+    assert acquire_lease('lock', 'worker-a', 30)
+    release_lease('lock', 'worker-b')  # not the holder, no effect
+    assert not acquire_lease('lock', 'worker-b', 30)
+    release_lease('lock', 'worker-a')
+    assert acquire_lease('lock', 'worker-b', 30)
+
+
+def test_only_the_leader_runs_jobs(runs):
+    leader, follower = make_scheduler('worker-a'), make_scheduler('worker-b')
+    leader.tick()
+    follower.tick()
+    assert (leader.is_leader, follower.is_leader) == (True, False)
+    assert runs == [1]
+    job = db.session.get(ScheduledJob, 'test.count')
+    assert (job.last_status, job.last_owner) == ('ok', 'worker-a')
+
+    leader.tick()  # not due again for five minutes
+    assert runs == [1]
+
+
+def test_a_new_leader_keeps_the_schedule(runs):
+    leader, follower = make_scheduler('worker-a'), make_scheduler('worker-b')
+    leader.tick()
+    release_lease(LEADER_LOCK, 'worker-a')
+    follower.tick()
+    assert follower.is_leader
+    assert runs == [1]
+
+    db.session.get(ScheduledJob, 'test.count').next_run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    follower.tick()
+    assert runs == [1, 1]
+    assert db.session.get(ScheduledJob, 'test.count').last_owner == 'worker-b'
+
+
+def test_a_failing_job_is_recorded(app, monkeypatch):
+    monkeypatch.setattr(scheduler, 'JOBS', {})
+    scheduler.scheduled_job('test.fail', minutes=5)(lambda: 1 / 0)
+    make_scheduler('worker-a').tick()
+    job = db.session.get(ScheduledJob, 'test.fail')
+    assert job.last_status == 'error'
+    assert 'ZeroDivisionError' in job.last_error
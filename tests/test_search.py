@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from __init__ import db
+from model import search as search_module
+from model.post import Post
+from model.search import MysqlSearchBackend, reindex, search, setup_search
+
+
+@pytest.fixture
+def channel(make_user, make_channel):
+    return make_user('alice'), make_channel()
+
+@pytest.fixture
+def fresh_index(app):
+    """No search index, as on a database search_setup has not run on."""
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS search_fts"))
+    yield
+    search_module._backend_ready = False
+
+def titles(query):
+    return [hit['title'] for hit in search(query)[1]]
+
+
+def test_setup_creates_the_index_once(fresh_index):
+    assert setup_search() is True
+    assert setup_search() is False
+    assert search_module.get_search_backend() is not None
+
+
+def test_rows_written_before_setup_are_found_after_reindex(fresh_index, channel):
+    user, channel = channel
+    db.session.add(Post('Gearbox notes', 'Planetary gears', user.id, channel.id))
+    db.session.commit()
+    setup_search()
+    assert titles('gearbox') == []
+    reindex()
+    assert titles('gearbox') == ['Gearbox notes']
+
+
+def test_the_index_follows_post_writes(fresh_index, channel):
+    setup_search()
+    user, channel = channel
+    post = Post('Servo wiring', 'Signal goes to pin nine', user.id, channel.id)
+    db.session.add(post)
+    db.session.commit()
+    assert titles('servo') == ['Servo wiring']
+    assert titles('ser') == ['Servo wiring']  # the last word is a prefix
+
+    post._title = 'Motor wiring'
+    db.session.commit()
+    assert titles('servo') == []
+    assert titles('motor wiring') == ['Motor wiring']
+
+    db.session.delete(post)
+    db.session.commit()
+    assert titles('motor') == []
+
+
+def test_mysql_setup_tolerates_a_concurrent_worker():
+    backend = MysqlSearchBackend()
+
+    class Connection:
+        def execute(self, statement):
+            raise OperationalError(str(statement), {}, Exception(MysqlSearchBackend.DUPLICATE_KEY_NAME, 'Duplicate key name'))
+    assert backend._tolerate(Connection(), 'ALTER TABLE', MysqlSearchBackend.DUPLICATE_KEY_NAME) is False
+    with pytest.raises(OperationalError):
+        backend._tolerate(Connection(), 'ALTER TABLE', MysqlSearchBackend.TABLE_EXISTS)
@@ -0,0 +1,70 @@
+import os
+import pytest
+from __init__ import db
+from model import search_index
+from model.search_index import InvertedIndex, InvertedIndexSearchBackend
+
+
+def make_index():
+    index = InvertedIndex()
+    index.add(1, 'Servo wiring', 'Signal goes to pin nine')
+    index.add(2, 'Gearbox notes', 'Planetary gears and servo mounts')
+    index.add(3, 'Old title', 'Removed later')
+    index.remove(3)
+    return index
+
+
+def test_saved_index_loads_with_the_same_results(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    index = make_index()
+    index.save(path)
+    loaded = InvertedIndex.load(path)
+    assert loaded.search('servo') == index.search('servo')
+    assert loaded.search('gea') == index.search('gea')
+    assert loaded.search('removed') == (0, [])
+    assert os.listdir(tmp_path) == ['index.bin']
+
+
+@pytest.mark.parametrize('size', [0, 10, 60, 100, -7])
+def test_a_truncated_file_is_not_loaded(tmp_path, size):
+    path = str(tmp_path / 'index.bin')
+    make_index().save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:size])
+    assert InvertedIndex.load(path) is None
+
+
+def test_a_failed_save_keeps_the_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'index.bin')
+    make_index().save(path)
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    def failing_replace(source, destination):
+        raise OSError('disk full')
+    monkeypatch.setattr(search_index.os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        InvertedIndex().save(path)
+    with open(path, 'rb') as f:
+        assert f.read() == before
+    assert os.listdir(tmp_path) == ['index.bin']
+
+
+def test_backend_rebuilds_a_damaged_file(app, tmp_path, make_user, make_channel):
+    from model.post import Post
+    path = str(tmp_path / 'index.bin')
+    with open(path, 'wb') as f:
+        f.write(search_index.MAGIC + b'\0' * 12)
+    backend = InvertedIndexSearchBackend(path)
+    with db.engine.begin() as connection:
+        backend.setup(connection)
+    user = make_user('alice')
+    channel = make_channel()
+    db.session.add(Post('Servo wiring', 'Signal goes to pin nine', user.id, channel.id))
+    db.session.commit()
+    with db.engine.begin() as connection:
+        total, hits = backend.search(connection, 'servo')
+    assert total == 1 and hits[0]['title'] == 'Servo wiring'
+    assert InvertedIndex.load(path) is not None
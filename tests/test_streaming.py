@@ -0,0 +1,73 @@
+import pytest
+from __init__ import db
+from api import streaming
+from api.instrumentation import route_metrics
+from model.group import Group
+from model.section import Section
+
+
+@pytest.fixture
+def groups(app, make_user):
+    admin = make_user('admin', role='Admin')
+    section = Section('General')
+    db.session.add(section)
+    db.session.commit()
+    for i in range(3):
+        db.session.add(Group(f'group{i}', section.id, moderators=[admin]))
+    db.session.commit()
+    db.session.remove()  # the requests share this app context, start them without a checked out connection
+    route_metrics.reset()
+
+
+def test_listing_returns_its_connection(client, login, groups):
+    login('admin')
+    pool = db.engine.pool
+    for _ in range(10):
+        response = client.get('/api/groups')
+        assert len(response.get_json()) == 3
+        response.close()
+    assert pool.checkedout() == 0
+
+
+def test_metrics_count_statements_run_while_streaming(client, login, groups):
+    login('admin')
+    response = client.get('/api/groups')
+    response.get_data()
+    response.close()
+    assert 'Server-Timing' not in response.headers
+    metrics = route_metrics.snapshot()[('GET', '/api/groups')]
+    # The groups, then their moderators, both read while the body streams
+    assert metrics['queries'][1] >= 2
+    assert metrics['statuses'] == {200: 1}
+
+
+def test_error_mid_stream_is_surfaced(client, login, groups, monkeypatch):
+    login('admin')
+    monkeypatch.setattr(streaming, 'BATCH_ITEMS', 1)
+    read = Group.read
+
+    def failing_read(self):
+        if self.name == 'group2':
+            raise RuntimeError('boom')
+        return read(self)
+    monkeypatch.setattr(Group, 'read', failing_read)
+
+    response = client.get('/api/groups?format=ndjson')
+    assert response.status_code == 200
+    with pytest.raises(RuntimeError):
+        response.get_data()
+    response.close()
+    metrics = route_metrics.snapshot()[('GET', '/api/groups')]
+    assert metrics['statuses'] == {500: 1}
+    assert db.engine.pool.checkedout() == 0
+
+
+def test_error_in_first_batch_is_an_error_response(client, login, groups, monkeypatch):
+    login('admin')
+    monkeypatch.setattr(Group, 'read', lambda self: 1 / 0)
+    client.application.testing = False
+    try:
+        response = client.get('/api/groups')
+    finally:
+        client.application.testing = True
+    assert response.status_code == 500
@@ -0,0 +1,27 @@
+import pytest
+from __init__ import db
+from model.section import Section
+from model.synthetic import generate_synthetic_data
+from model.vote import Vote
+
+
+@pytest.fixture
+def section(app):
+    db.session.add(Section('General'))
+    db.session.commit()
+
+
+def test_votes_reach_the_target(section):
+    inserted = generate_synthetic_data(counts={'users': 40, 'groups': 2, 'channels': 4, 'posts': 500, 'votes': 3000})
+    assert inserted['votes'] == 3000
+    assert Vote.query.count() == 3000
+
+
+def test_votes_are_capped_at_one_per_user_and_post(section):
+    inserted = generate_synthetic_data(counts={'users': 5, 'groups': 1, 'channels': 1, 'posts': 10, 'votes': 1000})
+    assert inserted['votes'] == 50
+
+
+def test_channels_need_a_group(section):
+    with pytest.raises(ValueError, match='groups >= 1'):
+        generate_synthetic_data(counts={'users': 5, 'groups': 0, 'channels': 2, 'posts': 0, 'votes': 0})
@@ -0,0 +1,65 @@
+import threading
+import time
+from model.trivia import ApiNinjasTriviaProvider, StubTriviaProvider, TriviaPool
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_cold_topic_is_fetched_once_in_the_request():
+    provider = StubTriviaProvider()
+    pool = TriviaPool(provider, prefetch_size=3, refill_interval=60)
+    assert pool.get('science').endswith('about science?')
+    # The refill thread fills the buffer behind it
+    wait_for(lambda: len(pool._buffers['science']) == 3)
+
+
+def test_concurrent_cold_requests_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    class SlowProvider(StubTriviaProvider):
+        def fetch(self, topic, count=1):
+            calls.append(count)
+            release.wait(2)
+            return super().fetch(topic, count)
+    pool = TriviaPool(SlowProvider(), prefetch_size=3, refill_interval=60)
+    pool._start_refiller = lambda: None  # only the requests fetch
+    answers = []
+    requests = [threading.Thread(target=lambda: answers.append(pool.get('maths'))) for _ in range(4)]
+    for request in requests:
+        request.start()
+    wait_for(lambda: calls)
+    release.set()
+    for request in requests:
+        request.join()
+    assert calls == [1]
+    assert len(answers) == 4 and all(answer and 'about maths' in answer for answer in answers)
+
+
+def test_cold_topic_without_an_upstream_is_none():
+    pool = TriviaPool(ApiNinjasTriviaProvider('http://localhost/{}', None, (1, 1)), refill_interval=60)
+    assert pool.get('history') is None
+
+
+def test_empty_buffer_serves_stale_question():
+    provider = StubTriviaProvider(questions=['Only question?'])
+    pool = TriviaPool(provider, prefetch_size=1, refill_interval=60)
+    pool.get('art')
+    wait_for(lambda: pool._buffers['art'])
+    assert pool.get('art') == 'Only question?'
+    pool.provider = StubTriviaProvider(questions=[])
+    pool.provider.fetch = lambda topic, count=1: []
+    assert pool.get('art') == 'Only question?'
+
+
+def test_endpoint_answers_503_for_a_cold_topic(client, monkeypatch):
+    from api import messages_api
+    monkeypatch.setattr(messages_api, 'get_trivia_question', lambda topic: None)
+    response = client.get('/api/trivia?topic=history')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
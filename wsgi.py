@@ -0,0 +1,13 @@
+""" wsgi.py
+Production entry point for WSGI servers.
+
+Usage: Run from the root of the project:
+> gunicorn -c gunicorn_config.py wsgi:app
+
+Gunicorn's gevent worker monkey patches the standard library before this module is imported, so the
+pure Python PyMySQL driver and the requests library cooperate with greenlets without changes here.
+"""
+from main import app
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port="8887")